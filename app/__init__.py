@@ -1,23 +1,62 @@
 import os
-from os import path
 from flask import Flask, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from .constants import APP_NAME, APP_VERSION, DB_NAME, DEFAULT_ADMIN, DEFAULT_PASS
+from .constants import APP_NAME, APP_VERSION, DEFAULT_ADMIN, DEFAULT_PASS
 
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'views.login'  
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'TheGodMustBeCrazy123!#')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # overrides, e.g. {'TESTING': True} from tests/conftest.py
+    app.config.update(config or {})
+
+    # Database URI, engine options and SQLite pragmas come from the environment
+    # unless the config above already sets them
+    from .storage import configure_storage, install_pragmas, close_read_session
+    configure_storage(app)
 
     db.init_app(app)
+    install_pragmas(app)
+    app.teardown_appcontext(close_read_session)
     login_manager.init_app(app)
 
+    # Query count / latency instrumentation (see /admin/metrics)
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # In-memory admin statistics kept current by model events
+    from .stats import init_stats
+    init_stats(app)
+
+    # Doctor/patient full-text search index (FTS5 on SQLite)
+    from .search import init_search
+    init_search(app)
+
+    # Typo-tolerant doctor directory behind the search box autocomplete
+    from .directory import init_directory
+    init_directory(app)
+
+    # Data version counters behind the ETag / Last-Modified headers
+    from .conditional import init_conditional
+    init_conditional(app)
+
+    # Short-lived slot holds and their background sweeper
+    from .holds import init_holds
+    init_holds(app)
+
+    # gzip/brotli for large JSON and other text responses (not HTML, see compression.py)
+    from .compression import init_compression
+    init_compression(app)
+
+    # Fingerprinted static assets from `flask build-assets` (see app/assets.py)
+    from .assets import init_assets
+    init_assets(app)
+
     # Register blueprints (views, main and api)
     from .views import views as views_bp
     from .routes import main as main_bp
@@ -28,6 +67,10 @@ def create_app():
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp)
 
+    # flask CLI maintenance commands (see app/cli.py)
+    from .cli import register_commands
+    register_commands(app)
+
     # Global constants into template context which shall be used in base.html
     @app.context_processor
     def inject_globals():
@@ -62,17 +105,23 @@ def create_app():
 
 
 def create_database(app):
-    if not path.exists(DB_NAME):
-        with app.app_context():  # Ensure we are in the app context to create the database
-            db.create_all()
-            from .models import User
-            if not User.query.filter_by(email=DEFAULT_ADMIN).first():
-                user = User(email=DEFAULT_ADMIN, name='Administrator', role='admin')
-                user.set_password(DEFAULT_PASS)
-                
-                db.session.add(user)
-                db.session.commit()
-                
-                print(f'Created default admin: {{DEFAULT_ADMIN}} / {{DEFAULT_PASS}}')
-            else:
-                print('Admin already exists')
+    from .models import User
+    with app.app_context():  # Ensure we are in the app context to create the database
+        # Creates missing tables, columns and indexes, so this is safe on every
+        # start and works for any backend (no check on a local SQLite file path)
+        from .schema import upgrade_schema
+        upgrade_schema()
+        from .search import ensure_index
+        ensure_index()
+        from .directory import build_directory
+        build_directory()
+        if not User.query.filter_by(email=DEFAULT_ADMIN).first():
+            user = User(email=DEFAULT_ADMIN, name='Administrator', role='admin')
+            user.set_password(DEFAULT_PASS)
+            
+            db.session.add(user)
+            db.session.commit()
+            
+            print(f'Created default admin: {{DEFAULT_ADMIN}} / {{DEFAULT_PASS}}')
+        else:
+            print('Admin already exists')
@@ -7,7 +7,10 @@ api = Api(api_bp)
 from .resources import (
     DoctorListResource, DoctorResource,
     PatientListResource, PatientResource,
-    AppointmentListResource, AppointmentResource
+    AppointmentListResource, AppointmentResource,
+    EarliestSlotsResource, AvailabilityBulkResource,
+    SlotHoldListResource, SlotHoldResource, AppointmentImportResource,
+    OnboardingResource, ExportResource
 )
 
 api.add_resource(DoctorListResource, '/doctors')
@@ -15,4 +18,11 @@ api.add_resource(DoctorResource, '/doctors/<int:doctor_id>')
 api.add_resource(PatientListResource, '/patients')
 api.add_resource(PatientResource, '/patients/<int:patient_id>')
 api.add_resource(AppointmentListResource, '/appointments')
+api.add_resource(AppointmentImportResource, '/appointments/import')
 api.add_resource(AppointmentResource, '/appointments/<int:appointment_id>')
+api.add_resource(EarliestSlotsResource, '/slots/earliest')
+api.add_resource(AvailabilityBulkResource, '/availability')
+api.add_resource(SlotHoldListResource, '/holds')
+api.add_resource(SlotHoldResource, '/holds/<int:hold_id>')
+api.add_resource(OnboardingResource, '/onboarding')
+api.add_resource(ExportResource, '/export/<string:kind>')
@@ -1,6 +1,18 @@
+from functools import wraps
 from flask_restful import Resource, reqparse, fields, marshal_with, abort
-from flask import request
-from ..models import db, DoctorProfile, PatientProfile, Appointment, User
+from flask import request, session, url_for
+from flask_login import current_user
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..models import db, DoctorProfile, PatientProfile, Appointment, Treatment, User
+from ..pagination import keyset_paginate, by_user_name
+from ..storage import read_session, icontains
+from .. import serializers, exports
+from ..conditional import conditional
+from ..slots import earliest_available, EARLIEST_MAX_RESULTS
+from ..schedules import parse_window, save_availability
+from .. import booking, holds, importer, onboarding
 from datetime import datetime
 
 doctor_fields = {
@@ -24,6 +36,14 @@ appointment_fields = {
     'status': fields.String
 }
 
+earliest_slot_fields = {
+    'doctor_id': fields.Integer,
+    'doctor_name': fields.String,
+    'specialization': fields.String,
+    'date': fields.String,
+    'time': fields.String
+}
+
 doctor_parser = reqparse.RequestParser()
 doctor_parser.add_argument('name', type=str, required=True)
 doctor_parser.add_argument('email', type=str, required=True)
@@ -41,10 +61,161 @@ appointment_parser.add_argument('date', type=lambda x: datetime.strptime(x, '%Y-
 appointment_parser.add_argument('time', type=lambda x: datetime.strptime(x, '%H:%M').time(), required=True)
 appointment_parser.add_argument('status', type=str, default='Booked')
 
+hold_parser = reqparse.RequestParser()
+hold_parser.add_argument('doctor_id', type=int, required=True)
+hold_parser.add_argument('date', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), required=True)
+hold_parser.add_argument('time', type=lambda x: datetime.strptime(x, '%H:%M').time(), required=True)
+
+# ----------------------
+# Writes that act for a user run on the browser session: the caller must be
+# logged in with one of `roles` and send the session's CSRF token in the
+# X-CSRF-Token header (or a csrf_token form field), like the HTML forms.
+# ----------------------
+def roles_required(*roles):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not current_user.is_authenticated:
+                abort(401, message='Login required')
+            if current_user.role not in roles:
+                abort(403, message='Access denied')
+            token = request.headers.get('X-CSRF-Token') or request.form.get('csrf_token')
+            if request.method not in ('GET', 'HEAD') and (not token or token != session.get('csrf_token')):
+                abort(403, message='Invalid or missing CSRF token')
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ----------------------
+# List endpoints: ?limit= (DEFAULT_PAGE_SIZE, at most MAX_PAGE_SIZE),
+# ?cursor= from the Link header of the previous page, ?sort=name,-id and
+# ?fields=id,name. Only the requested columns are selected and the rows are
+# encoded by serializers.py. The body stays a plain JSON array.
+# ----------------------
+def _date_arg(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, message=f'{name} must be YYYY-MM-DD')
+
+def _selected_fields(kind):
+    all_names = serializers.field_names(kind)
+    names = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    if not names:
+        return all_names
+    unknown = [n for n in names if n not in all_names]
+    if unknown:
+        abort(400, message=f"Unknown field(s): {', '.join(unknown)}")
+    return names
+
+def _list_query(kind):
+    """(column query of the ?fields= columns, their names) for a list endpoint."""
+    names = _selected_fields(kind)
+    return serializers.row_query(read_session(), kind, names), names
+
+def _sort_keys(sortable, tie_breaker, default):
+    """?sort=a,-b against {name: column or tuple of columns}; the unique tie_breaker goes last."""
+    raw = [f.strip() for f in request.args.get('sort', '').split(',') if f.strip()]
+    if not raw:
+        return default
+    keys = []
+    for name in raw:
+        desc = name.startswith('-')
+        name = name.lstrip('+-')
+        if name not in sortable:
+            abort(400, message=f"Cannot sort by {name}; use {', '.join(sortable)}")
+        columns = sortable[name] if isinstance(sortable[name], tuple) else (sortable[name],)
+        keys += [(col, desc) for col in columns]
+    if not any(col is tie_breaker for col, _ in keys):
+        keys.append((tie_breaker, False))
+    return tuple(keys)
+
+def _paged(query, sort_keys, names):
+    """One keyset page of the column query as JSON, with Link: rel=next/prev headers."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    page = keyset_paginate(query, sort_keys, request.args.get('cursor'), max(1, min(MAX_PAGE_SIZE, limit)))
+    links = []
+    for rel, cursor in (('next', page.next_cursor), ('prev', page.prev_cursor)):
+        if cursor:
+            args = request.args.to_dict(flat=False)
+            args['cursor'] = cursor
+            links.append(f'<{url_for(request.endpoint, _external=True, **(request.view_args or {}), **args)}>; rel="{rel}"')
+    headers = {'Link': ', '.join(links)} if links else {}
+    if page.next_cursor:
+        headers['X-Next-Cursor'] = page.next_cursor
+    rows = page.items if len(names) > 1 else [(item,) for item in page.items]
+    return serializers.json_response(serializers.rows_to_dicts(rows, names), 200, headers)
+
+def _blacklisted_filter(query, model):
+    raw = request.args.get('blacklisted')
+    if raw in ('0', 'false'):
+        query = query.filter(model.is_blacklisted == False)
+    elif raw in ('1', 'true'):
+        query = query.filter(model.is_blacklisted == True)
+    return query
+
+def _filter_doctors(query):
+    """?specialization= (substring), ?department_id=, ?blacklisted=0|1."""
+    if request.args.get('specialization'):
+        query = query.filter(icontains(DoctorProfile.specialization, request.args['specialization']))
+    if request.args.get('department_id', type=int):
+        query = query.filter(DoctorProfile.department_id == request.args.get('department_id', type=int))
+    return _blacklisted_filter(query, DoctorProfile)
+
+def _filter_patients(query):
+    """?blacklisted=0|1."""
+    return _blacklisted_filter(query, PatientProfile)
+
+def _filter_appointments(query):
+    """?doctor_id=, ?patient_id=, ?status=, ?date=, ?date_from=, ?date_to= (inclusive)."""
+    doctor_id = request.args.get('doctor_id', type=int)
+    patient_id = request.args.get('patient_id', type=int)
+    status = request.args.get('status')
+    on_date, date_from, date_to = _date_arg('date'), _date_arg('date_from'), _date_arg('date_to')
+    if doctor_id:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if patient_id:
+        query = query.filter(Appointment.patient_id == patient_id)
+    if status:
+        query = query.filter(Appointment.status == status)
+    if on_date:
+        query = query.filter(Appointment.date == on_date)
+    if date_from:
+        query = query.filter(Appointment.date >= date_from)
+    if date_to:
+        query = query.filter(Appointment.date <= date_to)
+    return query
+
+def _filter_treatments(query):
+    """?appointment_id=, and the appointment filters (doctor_id, patient_id, dates)."""
+    appointment_id = request.args.get('appointment_id', type=int)
+    if appointment_id:
+        query = query.filter(Treatment.appointment_id == appointment_id)
+    keys = ('doctor_id', 'patient_id', 'status', 'date', 'date_from', 'date_to')
+    if any(request.args.get(k) for k in keys):
+        query = _filter_appointments(query.join(Appointment, Appointment.id == Treatment.appointment_id))
+    return query
+
+earliest_parser = reqparse.RequestParser()
+earliest_parser.add_argument('department_id', type=int, location='args')
+earliest_parser.add_argument('specialization', type=str, location='args')
+earliest_parser.add_argument('start', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args')
+earliest_parser.add_argument('end', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args')
+earliest_parser.add_argument('limit', type=int, default=10, location='args')
+
 class DoctorListResource(Resource):
-    @marshal_with(doctor_fields)
+    @conditional('doctors')
     def get(self):
-        return DoctorProfile.query.all(), 200
+        """Filters: specialization (substring), department_id, blacklisted=0|1."""
+        query, names = _list_query('doctors')
+        query = _filter_doctors(query)
+        sortable = {'id': DoctorProfile.id, 'name': User.name,
+                    'specialization': func.coalesce(DoctorProfile.specialization, '')}
+        keys = _sort_keys(sortable, DoctorProfile.id, by_user_name(DoctorProfile))
+        return _paged(query, keys, names)
 
     def post(self):
         args = doctor_parser.parse_args()
@@ -52,14 +223,13 @@ class DoctorListResource(Resource):
             abort(400, message='Email already exists')
         user = User(email=args['email'], name=args['name'], role='doctor')
         user.set_password('Doctor@123')
-        db.session.add(user)
-        db.session.commit()
-        doc = DoctorProfile(user_id=user.id, specialization=args.get('specialization'))
-        db.session.add(doc)
+        doc = DoctorProfile(user=user, specialization=args.get('specialization'))
+        db.session.add_all([user, doc])
         db.session.commit()
         return {'id': doc.id}, 201
 
 class DoctorResource(Resource):
+    @conditional('doctors')
     @marshal_with(doctor_fields)
     def get(self, doctor_id):
         return DoctorProfile.query.get_or_404(doctor_id), 200
@@ -79,9 +249,13 @@ class DoctorResource(Resource):
         return {'message': 'Deactivated'}, 200
 
 class PatientListResource(Resource):
-    @marshal_with(patient_fields)
     def get(self):
-        return PatientProfile.query.all(), 200
+        """Filters: blacklisted=0|1."""
+        query, names = _list_query('patients')
+        query = _filter_patients(query)
+        sortable = {'id': PatientProfile.id, 'name': User.name}
+        keys = _sort_keys(sortable, PatientProfile.id, by_user_name(PatientProfile))
+        return _paged(query, keys, names)
 
     def post(self):
         args = patient_parser.parse_args()
@@ -89,10 +263,8 @@ class PatientListResource(Resource):
             abort(400, message='Email already exists')
         user = User(email=args['email'], name=args['name'], role='patient')
         user.set_password('Patient@123')
-        db.session.add(user)
-        db.session.commit()
-        pat = PatientProfile(user_id=user.id, contact=args.get('contact'))
-        db.session.add(pat)
+        pat = PatientProfile(user=user, contact=args.get('contact'))
+        db.session.add_all([user, pat])
         db.session.commit()
         return {'id': pat.id}, 201
 
@@ -116,30 +288,27 @@ class PatientResource(Resource):
         return {'message': 'Deactivated'}, 200
 
 class AppointmentListResource(Resource):
-    @marshal_with(appointment_fields)
     def get(self):
-        doctor_id = request.args.get('doctor_id', type=int)
-        patient_id = request.args.get('patient_id', type=int)
-        date_str = request.args.get('date')
-        q = Appointment.query
-        if doctor_id:
-            q = q.filter_by(doctor_id=doctor_id)
-        if patient_id:
-            q = q.filter_by(patient_id=patient_id)
-        if date_str:
-            d = datetime.strptime(date_str, '%Y-%m-%d').date()
-            q = q.filter_by(date=d)
-        return q.all(), 200
+        """Filters: doctor_id, patient_id, status, date, date_from, date_to (inclusive)."""
+        q, names = _list_query('appointments')
+        q = _filter_appointments(q)
+        sortable = {'id': Appointment.id, 'date': (Appointment.date, Appointment.time),
+                    'status': func.coalesce(Appointment.status, ''),
+                    'doctor_id': func.coalesce(Appointment.doctor_id, 0),
+                    'patient_id': func.coalesce(Appointment.patient_id, 0)}
+        keys = _sort_keys(sortable, Appointment.id, ((Appointment.id, False),))
+        return _paged(q, keys, names)
 
     def post(self):
         args = appointment_parser.parse_args()
-        conflict = Appointment.query.filter_by(doctor_id=args['doctor_id'], date=args['date'], time=args['time']).first()
-        if conflict:
+        result = booking.book(args['patient_id'], args['doctor_id'], args['date'], args['time'], args['status'])
+        if result.status == booking.CONFLICT:
             abort(400, message='Doctor already has appointment at that date/time')
-        appt = Appointment(patient_id=args['patient_id'], doctor_id=args['doctor_id'], date=args['date'], time=args['time'], status=args['status'])
-        db.session.add(appt)
-        db.session.commit()
-        return {'id': appt.id}, 201
+        if result.status == booking.ON_HOLD:
+            abort(409, message=result.message)
+        if not result.ok:
+            return result.as_dict(), 503
+        return {'id': result.appointment_id, 'status': result.status}, 201
 
 class AppointmentResource(Resource):
     @marshal_with(appointment_fields)
@@ -150,7 +319,9 @@ class AppointmentResource(Resource):
         args = appointment_parser.parse_args()
         appt = Appointment.query.get_or_404(appointment_id)
         if (appt.doctor_id != args['doctor_id']) or (appt.date != args['date']) or (appt.time != args['time']):
-            conflict = Appointment.query.filter_by(doctor_id=args['doctor_id'], date=args['date'], time=args['time']).first()
+            conflict = (Appointment.query
+                        .filter_by(doctor_id=args['doctor_id'], date=args['date'], time=args['time'])
+                        .filter(Appointment.status != 'Cancelled').first())
             if conflict and conflict.id != appt.id:
                 abort(400, message='Conflict with another appointment')
         appt.patient_id = args['patient_id']
@@ -158,7 +329,11 @@ class AppointmentResource(Resource):
         appt.date = args['date']
         appt.time = args['time']
         appt.status = args.get('status')
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:  # un-cancelled into a slot booked since
+            db.session.rollback()
+            abort(400, message='Conflict with another appointment')
         return {'message': 'Updated'}, 200
 
     def delete(self, appointment_id):
@@ -166,3 +341,171 @@ class AppointmentResource(Resource):
         appt.status = 'Cancelled'
         db.session.commit()
         return {'message': 'Cancelled'}, 200
+
+APPOINTMENT_IMPORT_MAX = 50000  # rows per request
+
+class AppointmentImportResource(Resource):
+    @roles_required('admin')
+    def post(self):
+        """
+        Create many appointments at once (admins only). The body is JSON
+        {"appointments": [{...}, ...]}, JSON Lines or CSV (by Content-Type),
+        or an uploaded `file`. ?dry_run=1 only validates. Returns per-row results.
+        """
+        upload = request.files.get('file')
+        if upload is not None:
+            rows = importer.parse_rows(upload.read().decode('utf-8-sig'),
+                                       importer.guess_format(upload.filename, upload.mimetype))
+        elif request.is_json:
+            rows = (request.get_json(silent=True) or {}).get('appointments')
+            if not isinstance(rows, list):
+                abort(400, message='appointments must be a list')
+        else:
+            rows = importer.parse_rows(request.get_data(as_text=True),
+                                       importer.guess_format(content_type=request.content_type))
+        if not rows:
+            abort(400, message='No appointments given')
+        if len(rows) > APPOINTMENT_IMPORT_MAX:
+            abort(400, message=f'At most {APPOINTMENT_IMPORT_MAX} appointments per request')
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        return importer.import_appointments(rows, dry_run=dry_run), 200
+
+ONBOARDING_MAX = 20000  # rows per request
+
+class OnboardingResource(Resource):
+    @roles_required('admin')
+    def post(self):
+        """
+        Create many doctors/patients at once (admins only). The body is JSON {"users": [...]},
+        JSON Lines or CSV (by Content-Type), or an uploaded `file`.
+        ?dry_run=1 only validates. Returns per-row results.
+        """
+        upload = request.files.get('file')
+        if upload is not None:
+            rows = importer.parse_rows(upload.read().decode('utf-8-sig'),
+                                       importer.guess_format(upload.filename, upload.mimetype))
+        elif request.is_json:
+            rows = (request.get_json(silent=True) or {}).get('users')
+            if not isinstance(rows, list):
+                abort(400, message='users must be a list')
+        else:
+            rows = importer.parse_rows(request.get_data(as_text=True),
+                                       importer.guess_format(content_type=request.content_type))
+        if not rows:
+            abort(400, message='No users given')
+        if len(rows) > ONBOARDING_MAX:
+            abort(400, message=f'At most {ONBOARDING_MAX} users per request')
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        return onboarding.onboard(rows, dry_run=dry_run), 200
+
+EXPORT_FILTERS = {
+    'doctors': _filter_doctors,
+    'patients': _filter_patients,
+    'appointments': _filter_appointments,
+    'treatments': _filter_treatments,
+}
+
+class ExportResource(Resource):
+    @roles_required('admin')
+    def get(self, kind):
+        """
+        Stream every matching row as ?format=ndjson (default) or csv, in id
+        order (admins only). Takes the same ?fields= and filters as the list endpoints.
+        """
+        if kind not in EXPORT_FILTERS:
+            abort(404, message=f"Unknown export {kind}; use {', '.join(EXPORT_FILTERS)}")
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in exports.FORMATS:
+            abort(400, message=f"format must be one of {', '.join(exports.FORMATS)}")
+        query, names = _list_query(kind)
+        query = EXPORT_FILTERS[kind](query).order_by(exports.ORDER[kind]())
+        return exports.export_response(query, names, fmt, kind)
+
+def _current_patient_id():
+    if not current_user.patient:
+        abort(403, message='Patient profile missing')
+    return current_user.patient.id
+
+class SlotHoldListResource(Resource):
+    @roles_required('patient')
+    def post(self):
+        """Hold a free slot for the current patient for SLOT_HOLD_SECONDS; booking it later consumes the hold."""
+        args = hold_parser.parse_args()
+        result = holds.place(_current_patient_id(), args['doctor_id'], args['date'], args['time'])
+        if result.status == holds.CONFLICT:
+            abort(409, message=result.message)
+        if not result.ok:
+            return result.as_dict(), 503
+        return result.as_dict(), 201
+
+class SlotHoldResource(Resource):
+    @roles_required('patient')
+    def delete(self, hold_id):
+        if not holds.release(hold_id, _current_patient_id()):
+            abort(404, message='Hold not found')
+        return {'message': 'Released'}, 200
+
+class EarliestSlotsResource(Resource):
+    @marshal_with(earliest_slot_fields)
+    def get(self):
+        args = earliest_parser.parse_args()
+        if not args['department_id'] and not args['specialization']:
+            abort(400, message='department_id or specialization is required')
+        limit = max(1, min(EARLIEST_MAX_RESULTS, args['limit']))
+        try:
+            # start/end default inside, and the range is checked after that
+            return earliest_available(args['department_id'], args['specialization'],
+                                      args['start'], args['end'], limit), 200
+        except ValueError as e:
+            abort(400, message=str(e))
+
+AVAILABILITY_BULK_MAX = 5000  # entries per request
+
+class AvailabilityBulkResource(Resource):
+    @roles_required('admin', 'doctor')
+    def post(self):
+        """
+        Save daily availability for many doctors at once. Body:
+        {"availability": [{"doctor_id": 1, "date": "YYYY-MM-DD", "start": "09:00", "end": "12:00"}, ...]}
+        Blank or missing start/end clears that day. All entries are validated
+        before anything is written. Admins may write any doctor's days; a
+        doctor only their own (doctor_id defaults to theirs).
+        """
+        body = request.get_json(silent=True) or {}
+        items = body.get('availability')
+        if not isinstance(items, list) or not items:
+            abort(400, message='availability must be a non-empty list')
+        if len(items) > AVAILABILITY_BULK_MAX:
+            abort(400, message=f'At most {AVAILABILITY_BULK_MAX} entries per request')
+
+        own_id = None
+        if current_user.role == 'doctor':
+            if not current_user.doctor:
+                abort(403, message='Doctor profile missing')
+            own_id = current_user.doctor.id
+
+        entries, positions, errors = [], [], []
+        for i, item in enumerate(items):
+            try:
+                doctor_id = int(item['doctor_id'] if own_id is None else item.get('doctor_id', own_id))
+                day = datetime.strptime(item['date'], '%Y-%m-%d').date()
+            except (AttributeError, KeyError, TypeError, ValueError):
+                errors.append({'index': i, 'error': 'doctor_id and date (YYYY-MM-DD) are required'})
+                continue
+            try:
+                entries.append((doctor_id, day, parse_window(day, item.get('start'), item.get('end'))))
+                positions.append(i)
+            except ValueError as e:
+                errors.append({'index': i, 'error': str(e)})
+
+        if own_id is not None and any(e[0] != own_id for e in entries):
+            abort(403, message='Doctors can only change their own availability')
+        doctor_ids = {e[0] for e in entries}
+        known = {d for (d,) in db.session.query(DoctorProfile.id).filter(DoctorProfile.id.in_(doctor_ids))}
+        errors += [{'index': i, 'error': f'Unknown doctor {e[0]}'} for i, e in zip(positions, entries) if e[0] not in known]
+        if errors:
+            return {'message': 'Validation failed', 'errors': errors}, 400
+
+        result = save_availability(entries)
+        db.session.commit()
+        return result, 200
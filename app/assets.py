@@ -0,0 +1,194 @@
+"""
+Static asset pipeline: `flask build-assets`.
+
+The build writes into app/static/dist/ (generated, not committed):
+
+  - css/*.css and js/*.js minified, images copied, each under a
+    content-hashed name (css/style.3f2a9c1e.css);
+  - resized JPEG variants of the hero image, HERO_WIDTHS wide
+    (images/hospital-480.<hash>.jpg), when Pillow is installed;
+  - .gz (and .br with the optional `brotli` package) next to every text asset;
+  - manifest.json: {"css/style.css": "dist/css/style.3f2a9c1e.css", ...}.
+
+With a manifest present, url_for('static', filename='css/style.css') points
+at the hashed file, hero_srcset() lists the image variants, and hashed files
+are served with far-future immutable cache headers (and precompressed when
+the client accepts it). Without one, static files are served as before.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, url_for
+
+from .compression import brotli, choose_encoding
+
+try:
+    from PIL import Image
+except ImportError:  # optional, only needed for the hero variants
+    Image = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HERO_IMAGE = 'images/hospital.jpg'
+HERO_WIDTHS = (480, 960, 1440)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+TEXT_EXTENSIONS = ('.css', '.js', '.svg')
+
+_manifest = {}
+
+
+# ----------------------
+# Minifiers (conservative: whitespace and comments only)
+# ----------------------
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    # ':' only inside declaration blocks; in a selector "a :hover" != "a:hover"
+    text = re.sub(r'\{[^{}]*\}', lambda m: re.sub(r'\s*:\s*', ':', m.group()), text)
+    return text.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(text):
+    # drops full-line // comments, indentation and blank lines; lines inside a
+    # multi-line `template literal` belong to the string and are kept as is
+    lines, in_template = [], False
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not in_template and (not line or line.startswith('//')):
+            continue
+        opens_or_closes = len(re.findall(r'(?<!\\)`', raw)) % 2 == 1
+        if in_template:
+            lines.append(raw)
+        elif opens_or_closes:
+            lines.append(raw.lstrip())
+        else:
+            lines.append(line)
+        in_template ^= opens_or_closes
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# ----------------------
+# Build
+# ----------------------
+def _hashed_name(rel_path, data):
+    root, ext = os.path.splitext(rel_path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:8]}{ext}'
+
+
+def _write(dist, rel_path, data):
+    path = os.path.join(dist, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if rel_path.endswith(TEXT_EXTENSIONS):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def _hero_variants(source, rel_path):
+    """[(variant logical name, jpeg bytes)] for the widths below the original's."""
+    if Image is None:
+        return []
+    root, ext = os.path.splitext(rel_path)
+    out = []
+    with Image.open(source) as img:
+        img = img.convert('RGB')
+        for width in HERO_WIDTHS:
+            if width >= img.width:
+                continue
+            height = round(img.height * width / img.width)
+            buf = io.BytesIO()
+            img.resize((width, height), Image.LANCZOS).save(buf, 'JPEG', quality=80, optimize=True, progressive=True)
+            out.append((f'{root}-{width}{ext}', buf.getvalue()))
+    return out
+
+
+def build_assets(static_folder):
+    """Rebuild static/dist and its manifest. Returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for folder, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(folder, d) != dist]
+        for name in sorted(files):
+            source = os.path.join(folder, name)
+            rel_path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            minify = MINIFIERS.get(os.path.splitext(name)[1])
+            if minify:
+                data = minify(data.decode('utf-8')).encode('utf-8')
+            entries = [(rel_path, data)]
+            if rel_path == HERO_IMAGE:
+                entries += _hero_variants(source, rel_path)
+            for logical, content in entries:
+                hashed = _hashed_name(logical, content)
+                _write(dist, hashed, content)
+                manifest[logical] = f'{DIST_DIR}/{hashed}'
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    _manifest.clear()
+    _manifest.update(manifest)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    _manifest.clear()
+    if os.path.exists(path):
+        with open(path) as f:
+            _manifest.update(json.load(f))
+    return _manifest
+
+
+# ----------------------
+# Serving
+# ----------------------
+def hero_srcset(filename=HERO_IMAGE):
+    """srcset value listing the built width variants of an image, or ''."""
+    root, ext = os.path.splitext(filename)
+    parts = [f"{url_for('static', filename=f'{root}-{w}{ext}')} {w}w"
+             for w in HERO_WIDTHS if f'{root}-{w}{ext}' in _manifest]
+    return ', '.join(parts)
+
+
+def init_assets(app):
+    load_manifest(app.static_folder)
+    send_static = app.view_functions['static']
+
+    @app.url_defaults
+    def hashed_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in _manifest:
+            values['filename'] = _manifest[values['filename']]
+
+    def static(filename):
+        if filename not in _manifest.values():
+            return send_static(filename=filename)
+        encoding = choose_encoding(request.accept_encodings)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+        if suffix and filename.endswith(TEXT_EXTENSIONS) \
+                and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+            response = send_static(filename=filename + suffix)
+            response.headers['Content-Encoding'] = encoding
+            response.mimetype = mimetypes.guess_type(filename)[0]
+        else:
+            response = send_static(filename=filename)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
+
+    app.view_functions['static'] = static
+    app.jinja_env.globals['hero_srcset'] = hero_srcset
@@ -0,0 +1,200 @@
+"""
+Booking service.
+
+book() claims a (doctor, date, time) slot with one conditional write against
+the uix_doctor_datetime partial unique index (slots of appointments that are
+not cancelled) instead of check-then-insert:
+
+    INSERT ... ON CONFLICT (doctor_id, date, time) WHERE status != 'Cancelled'
+    DO NOTHING RETURNING id
+
+books a free slot; no row back means the slot is really taken. A cancelled
+appointment on the slot does not block it and is kept as it is, together
+with its treatment history; the new booking is always a new row.
+
+A live slot hold of another patient (holds.py) turns the attempt away as
+ON_HOLD with one indexed read before any write; a successful booking deletes
+the hold on its slot. No IntegrityError to recover from. Lock timeouts
+("database is locked" on SQLite) are retried with a short backoff
+(BOOKING_RETRIES times). Every outcome comes back as a BookingResult.
+
+`flask bench-booking` races worker threads for a handful of slots with both
+this service and the old check-then-insert code.
+"""
+import random
+import threading
+import time as _time
+from datetime import date, time
+
+from flask import current_app
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from . import holds, stats
+from .models import db, Appointment, ACTIVE_SLOT
+from .storage import dialect_insert
+
+BOOKED = 'booked'
+CONFLICT = 'conflict'
+ON_HOLD = 'on_hold'
+ERROR = 'error'
+
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.05  # seconds, doubled on every retry
+
+
+class BookingResult:
+    def __init__(self, status, appointment_id=None, message=None):
+        self.status = status
+        self.appointment_id = appointment_id
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.status == BOOKED
+
+    def as_dict(self):
+        return {'status': self.status, 'appointment_id': self.appointment_id, 'message': self.message}
+
+    def __repr__(self):
+        return f'<BookingResult {self.status} {self.appointment_id}>'
+
+
+def _retries():
+    return current_app.config.get('BOOKING_RETRIES', DEFAULT_RETRIES)
+
+
+def _claim(patient_id, doctor_id, on_date, at_time, status):
+    """One attempt on db.session; returns a BookingResult (not committed)."""
+    table = Appointment.__table__
+    conn = db.session.connection()
+    held_by = holds.holder(conn, doctor_id, on_date, at_time)
+    if held_by is not None and held_by != patient_id:
+        return BookingResult(ON_HOLD, message='Slot is held by another patient, try again shortly')
+
+    stmt = (dialect_insert(table, conn)
+            .values(patient_id=patient_id, doctor_id=doctor_id, date=on_date, time=at_time,
+                    status=status, created_at=func.now())
+            .on_conflict_do_nothing(index_elements=[table.c.doctor_id, table.c.date, table.c.time],
+                                    index_where=text(ACTIVE_SLOT))
+            .returning(table.c.id))
+    row = conn.execute(stmt).first()
+    if row is not None:
+        holds.consume(conn, doctor_id, on_date, at_time)
+        stats.record_changes(db.session, [('appointments', 1), (status, 1)])
+        return BookingResult(BOOKED, row[0], 'Appointment booked')
+
+    return BookingResult(CONFLICT, message='Selected slot already booked')
+
+
+def book(patient_id, doctor_id, on_date, at_time, status='Booked'):
+    """Atomically book the slot for the patient and commit. Returns a BookingResult."""
+    retries = _retries()
+    for attempt in range(retries + 1):
+        try:
+            result = _claim(patient_id, doctor_id, on_date, at_time, status)
+            if result.ok:
+                db.session.commit()
+            else:
+                db.session.rollback()
+            return result
+        except OperationalError:
+            db.session.rollback()
+            if attempt == retries:
+                current_app.logger.exception('Booking failed after %d retries', retries)
+                return BookingResult(ERROR, message='The system is busy, please try again')
+            _time.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+
+def reschedule(appt, doctor_id, on_date, at_time):
+    """
+    Move `appt` to another slot (status back to Booked) and commit. A
+    cancelled appointment on the target slot stays as it is; an active one
+    makes this a CONFLICT, another patient's hold ON_HOLD.
+    """
+    if (appt.doctor_id, appt.date, appt.time) != (doctor_id, on_date, at_time):
+        held_by = holds.holder(db.session.connection(), doctor_id, on_date, at_time)
+        if held_by is not None and held_by != appt.patient_id:
+            db.session.rollback()
+            return BookingResult(ON_HOLD, appt.id, 'Slot is held by another patient, try again shortly')
+        holds.consume(db.session.connection(), doctor_id, on_date, at_time)
+        appt.doctor_id, appt.date, appt.time = doctor_id, on_date, at_time
+    appt.status = 'Booked'
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return BookingResult(CONFLICT, appt.id, 'Selected slot already booked')
+    except OperationalError:
+        db.session.rollback()
+        current_app.logger.exception('Reschedule failed')
+        return BookingResult(ERROR, appt.id, 'The system is busy, please try again')
+    return BookingResult(BOOKED, appt.id, 'Appointment rescheduled')
+
+
+# ----------------------
+# Benchmark
+# ----------------------
+BENCH_DATE = date(2999, 12, 31)
+
+
+def _check_then_insert(patient_id, doctor_id, on_date, at_time):
+    """The booking code this service replaced, for comparison."""
+    conflict = Appointment.query.filter_by(doctor_id=doctor_id, date=on_date, time=at_time).first()
+    if conflict:
+        return BookingResult(CONFLICT)
+    db.session.add(Appointment(patient_id=patient_id, doctor_id=doctor_id, date=on_date, time=at_time,
+                               status='Booked'))
+    try:
+        db.session.commit()
+        return BookingResult(BOOKED)
+    except IntegrityError:
+        db.session.rollback()
+        return BookingResult(CONFLICT, message='IntegrityError')
+    except OperationalError:
+        db.session.rollback()
+        return BookingResult(ERROR)
+
+
+def benchmark(app, patient_id, doctor_id, strategy='atomic', workers=8, attempts=400, n_slots=20):
+    """
+    `workers` threads make `attempts` booking attempts in total on `n_slots`
+    slots of BENCH_DATE, then the bench appointments are deleted again.
+    Returns {'strategy', 'elapsed_s', 'per_second', outcome counts...}.
+    """
+    book_fn = book if strategy == 'atomic' else _check_then_insert
+    slot_times = [time(m // 60, m % 60) for m in range(0, n_slots * 5, 5)]
+    counts = {}
+    lock = threading.Lock()
+
+    def worker(seed, count):
+        rng = random.Random(seed)
+        with app.app_context():
+            for _ in range(count):
+                try:
+                    result = book_fn(patient_id, doctor_id, BENCH_DATE, rng.choice(slot_times))
+                    outcome = result.status
+                    if result.message == 'IntegrityError':
+                        outcome = 'integrity_error'
+                except Exception:
+                    db.session.rollback()
+                    outcome = 'exception'
+                with lock:
+                    counts[outcome] = counts.get(outcome, 0) + 1
+            db.session.remove()
+
+    per_worker = [attempts // workers + (1 if i < attempts % workers else 0) for i in range(workers)]
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(per_worker)]
+    started = _time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = _time.perf_counter() - started
+
+    with app.app_context():
+        Appointment.query.filter_by(doctor_id=doctor_id, date=BENCH_DATE).delete(synchronize_session=False)
+        db.session.commit()
+        stats.invalidate()
+    return dict(strategy=strategy, workers=workers, attempts=attempts, elapsed_s=round(elapsed, 3),
+                per_second=round(attempts / elapsed, 1) if elapsed else None, **counts)
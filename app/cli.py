@@ -0,0 +1,205 @@
+"""
+Maintenance commands, available through the flask CLI:
+
+    flask --app main upgrade-db
+    flask --app main check-indexes
+    flask --app main recompute-stats
+    flask --app main rebuild-search
+    flask --app main materialize-availability [--days N] [--doctor ID ...]
+    flask --app main add-holiday YYYY-MM-DD [--reason TEXT]
+    flask --app main bench-booking [--workers N] [--attempts N] [--slots N]
+    flask --app main sweep-holds
+    flask --app main import-appointments FILE [--format jsonl|csv] [--chunk-size N] [--dry-run]
+    flask --app main bench-serializers [--rows N ...]
+    flask --app main onboard FILE [--format jsonl|csv] [--chunk-size N] [--workers N] [--dry-run]
+    flask --app main build-assets
+"""
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Add missing tables, columns and indexes to an existing database."""
+    from .schema import upgrade_schema
+    actions = upgrade_schema()
+    for action in actions:
+        click.echo(action)
+    click.echo('Schema up to date.' if not actions else f'{len(actions)} change(s) applied.')
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """Assert via EXPLAIN QUERY PLAN that hot-path queries use their indexes."""
+    from .schema import check_index_usage, HOT_PATH_QUERIES
+    failures = check_index_usage()
+    for desc, indexes, plan in failures:
+        click.echo(f'FAIL {desc}: expected {" or ".join(indexes)}, plan was:', err=True)
+        for line in plan:
+            click.echo(f'    {line}', err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo(f'All {len(HOT_PATH_QUERIES)} hot-path queries use their indexes.')
+
+
+@click.command('recompute-stats')
+@with_appcontext
+def recompute_stats_command():
+    """Recompute the admin dashboard statistics here and in every running worker."""
+    from .stats import invalidate, recompute
+    invalidate()
+    for key, value in recompute().items():
+        click.echo(f'{key}: {value}')
+
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Re-index every doctor and patient in the search index."""
+    from .search import rebuild_index, get_index
+    counts = rebuild_index()
+    click.echo(f'Search index ({get_index().name}): '
+               + ', '.join(f'{n} {kind}s' for kind, n in counts.items()))
+
+
+@click.command('materialize-availability')
+@click.option('--days', type=int, default=None, help='Horizon in days (default AVAILABILITY_HORIZON_DAYS).')
+@click.option('--doctor', 'doctor_ids', type=int, multiple=True, help='Only these doctor profile ids.')
+@with_appcontext
+def materialize_availability_command(days, doctor_ids):
+    """Write the weekly templates into daily availability rows."""
+    from . import db
+    from .schedules import materialize
+    result = materialize(list(doctor_ids) or None, days=days)
+    db.session.commit()
+    click.echo(f"{result['written']} day(s) written, {result['removed']} stale day(s) removed.")
+
+
+@click.command('add-holiday')
+@click.argument('day', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--reason', default=None)
+@with_appcontext
+def add_holiday_command(day, reason):
+    """Close the clinic on DAY for every doctor and re-materialize."""
+    from . import db
+    from .models import AvailabilityException
+    from .schedules import materialize
+    day = day.date()
+    if not AvailabilityException.query.filter(AvailabilityException.doctor_id.is_(None),
+                                              AvailabilityException.date == day).first():
+        db.session.add(AvailabilityException(doctor_id=None, date=day, reason=reason))
+        db.session.flush()
+    result = materialize()
+    db.session.commit()
+    click.echo(f"Holiday on {day.isoformat()}; {result['removed']} scheduled day(s) removed.")
+
+
+@click.command('bench-booking')
+@click.option('--workers', type=int, default=8)
+@click.option('--attempts', type=int, default=400)
+@click.option('--slots', 'n_slots', type=int, default=20, help='Slots the workers compete for.')
+@with_appcontext
+def bench_booking_command(workers, attempts, n_slots):
+    """Race concurrent bookings: atomic service vs. check-then-insert."""
+    from flask import current_app
+    from .booking import benchmark, BENCH_DATE
+    from .models import Appointment, DoctorProfile, PatientProfile
+    doctor, patient = DoctorProfile.query.first(), PatientProfile.query.first()
+    if not doctor or not patient:
+        raise click.ClickException('Needs at least one doctor and one patient.')
+    if Appointment.query.filter_by(doctor_id=doctor.id, date=BENCH_DATE).first():
+        raise click.ClickException(f'Doctor {doctor.id} already has appointments on {BENCH_DATE}.')
+    app = current_app._get_current_object()
+    for strategy in ('check-then-insert', 'atomic'):
+        result = benchmark(app, patient.id, doctor.id, strategy, workers, attempts, n_slots)
+        click.echo(', '.join(f'{k}={v}' for k, v in result.items()))
+
+
+@click.command('sweep-holds')
+@with_appcontext
+def sweep_holds_command():
+    """Delete expired slot holds."""
+    from .holds import sweep
+    click.echo(f'Deleted {sweep()} expired hold(s).')
+
+
+@click.command('import-appointments')
+@click.argument('file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Default: from the file name.')
+@click.option('--chunk-size', type=int, help='Rows per transaction (default IMPORT_CHUNK_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Validate only.')
+@with_appcontext
+def import_appointments_command(file, fmt, chunk_size, dry_run):
+    """Bulk-create appointments from JSON Lines or CSV; prints the rows that failed."""
+    import json
+    from .importer import guess_format, parse_rows, import_appointments
+    rows = parse_rows(file.read(), fmt or guess_format(file.name))
+    result = import_appointments(rows, chunk_size, dry_run)
+    for r in result.pop('results'):
+        if r['status'] == 'error':
+            click.echo(json.dumps(r))
+    click.echo(', '.join(f'{k}={v}' for k, v in result.items()))
+
+
+@click.command('onboard')
+@click.argument('file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Default: from the file name.')
+@click.option('--chunk-size', type=int, help='Users per transaction (default IMPORT_CHUNK_SIZE).')
+@click.option('--workers', type=int, help='Password hashing processes (default ONBOARDING_HASH_WORKERS).')
+@click.option('--dry-run', is_flag=True, help='Validate only.')
+@with_appcontext
+def onboard_command(file, fmt, chunk_size, workers, dry_run):
+    """Bulk-create doctors and patients from JSON Lines or CSV; prints the rows that failed."""
+    import json
+    from .importer import guess_format, parse_rows
+    from .onboarding import onboard
+    result = onboard(parse_rows(file.read(), fmt or guess_format(file.name)), chunk_size, workers, dry_run)
+    for r in result.pop('results'):
+        if r['status'] == 'error':
+            click.echo(json.dumps(r))
+    click.echo(', '.join(f'{k}={v}' for k, v in result.items()))
+
+
+@click.command('bench-serializers')
+@click.option('--rows', 'row_counts', type=int, multiple=True, help='Row counts to try (default 10000 and 100000).')
+@with_appcontext
+def bench_serializers_command(row_counts):
+    """Time list serialization: flask_restful marshal() vs. column rows + fast JSON."""
+    from .api.resources import doctor_fields, patient_fields, appointment_fields
+    from .serializers import benchmark
+    marshal_fields = {'doctors': doctor_fields, 'patients': patient_fields, 'appointments': appointment_fields}
+    for n in row_counts or (10000, 100000):
+        for kind, item_fields in marshal_fields.items():
+            result = benchmark(kind, item_fields, n)
+            click.echo(', '.join(f'{k}={v}' for k, v in result.items()))
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Minify and fingerprint static files into static/dist and write the manifest."""
+    from flask import current_app
+    from .assets import build_assets, Image
+    manifest = build_assets(current_app.static_folder)
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f'{name} -> {hashed}')
+    if Image is None:
+        click.echo('Pillow is not installed: hero image variants skipped.', err=True)
+    click.echo(f'{len(manifest)} asset(s) built.')
+
+
+def register_commands(app):
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(recompute_stats_command)
+    app.cli.add_command(rebuild_search_command)
+    app.cli.add_command(materialize_availability_command)
+    app.cli.add_command(add_holiday_command)
+    app.cli.add_command(bench_booking_command)
+    app.cli.add_command(sweep_holds_command)
+    app.cli.add_command(import_appointments_command)
+    app.cli.add_command(onboard_command)
+    app.cli.add_command(bench_serializers_command)
+    app.cli.add_command(build_assets_command)
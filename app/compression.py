@@ -0,0 +1,70 @@
+"""
+Response compression for JSON and other text responses.
+
+An after_request hook compresses a finished (non-streamed) 200 response of
+one of COMPRESS_MIMETYPES when it is at least COMPRESS_MIN_SIZE bytes and
+the client accepts it: brotli when the optional `brotli` package is
+installed and asked for, gzip otherwise. Streamed responses (exports,
+?stream=1 lists) and files sent by send_file are left alone; built static
+assets come precompressed from assets.py instead.
+
+text/html is not compressed by default: the pages carry the session's CSRF
+token next to text echoed from the request (search boxes, filters), which is
+what a BREACH attack needs to recover the token from compressed sizes. Add
+it to COMPRESS_MIMETYPES only for deployments without such pages.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024  # bytes; smaller bodies are not worth it
+DEFAULT_LEVEL = 6
+DEFAULT_MIMETYPES = (
+    'text/css', 'text/plain', 'text/csv',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+)
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a request's Accept-Encoding."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=DEFAULT_LEVEL):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    app.config.setdefault('COMPRESS_LEVEL', DEFAULT_LEVEL)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or (response.content_length or 0) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding, app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = encoding
+        # the compressed body is another representation: keep validators weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,129 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for rarely changing pages.
+
+Each version key counts the commits that changed its tables:
+
+    doctors      DoctorProfile, doctor Users, Department (shown on doctor pages)
+    departments  Department
+    stats        bumped by stats.invalidate(); admin statistics, not HTTP
+
+A flush that touches those rows bumps the DataVersion row in the same
+transaction, so a rolled back change bumps nothing and every worker sees the
+same numbers. @conditional('doctors') reads the versions with one primary-key
+SELECT (no ORM objects), derives a weak ETag and Last-Modified, and answers
+If-None-Match / If-Modified-Since with 304 before the view runs.
+
+Pages rendered per user (private=True) mix the user id and the session's
+CSRF token into the ETag, honour only If-None-Match, and are skipped while
+flashed messages are pending.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import after_this_request, current_app, request, session
+from flask_login import current_user
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .models import db, User, DoctorProfile, Department, DataVersion
+from .storage import dialect_insert
+
+
+def _keys_for(obj):
+    if isinstance(obj, DoctorProfile):
+        return ('doctors',)
+    if isinstance(obj, Department):
+        return ('doctors', 'departments')
+    if isinstance(obj, User) and obj.role == 'doctor':
+        return ('doctors',)
+    return ()
+
+
+def bump(conn, keys, now=None):
+    """Increment the version of each key (upsert), on `conn`."""
+    if not keys:
+        return
+    now = now or datetime.utcnow()
+    table = DataVersion.__table__
+    stmt = dialect_insert(table, conn)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at},
+    )
+    conn.execute(stmt, [{'name': k, 'version': 1, 'updated_at': now} for k in sorted(keys)])
+
+
+def current(keys):
+    """([version per key], last modified datetime or None), in one SELECT."""
+    table = DataVersion.__table__
+    rows = dict((r.name, r) for r in db.session.execute(
+        select(table.c.name, table.c.version, table.c.updated_at).where(table.c.name.in_(keys))))
+    versions = [rows[k].version if k in rows else 0 for k in keys]
+    stamps = [rows[k].updated_at for k in keys if k in rows]
+    return versions, (max(stamps) if stamps else None)
+
+
+def _etag(keys, versions, private):
+    parts = [request.path, request.query_string.decode(), *keys, *map(str, versions)]
+    if private:
+        user_id = current_user.get_id() if current_user.is_authenticated else ''
+        parts += [str(user_id), session.get('csrf_token', '')]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+
+
+def conditional(*keys, private=False):
+    """
+    Decorator for GET views and Resource.get methods whose output depends only
+    on the tables behind `keys` (and, with private=True, on the user).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or (private and session.get('_flashes')):
+                return fn(*args, **kwargs)
+            versions, last_modified = current(keys)
+            etag = _etag(keys, versions, private)
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+
+            def add_validators(response):
+                if response.status_code in (200, 304):
+                    response.set_etag(etag, weak=True)
+                    if last_modified is not None:
+                        response.last_modified = last_modified
+                    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+                return response
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif not private and request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since.replace(tzinfo=None)
+            if not_modified:
+                return add_validators(current_app.response_class(status=304))
+            after_this_request(add_validators)
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------------
+# Event hooks
+# ----------------------
+def _after_flush(session, flush_context):
+    keys = set()
+    for obj in session.new:
+        keys.update(_keys_for(obj))
+    for obj in session.deleted:
+        keys.update(_keys_for(obj))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            keys.update(_keys_for(obj))
+    if keys:
+        bump(session.connection(), keys)
+
+
+def init_conditional(app):
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
@@ -0,0 +1,172 @@
+"""
+Dashboard data services.
+
+Each function returns a compact view-model (a dict) for one dashboard
+template, built from a fixed number of queries regardless of how much
+appointment history the patient or doctor has.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select, and_, or_
+
+from .models import db, Appointment, DoctorAvailability
+from .loaders import with_profile
+from .pagination import APPOINTMENTS_RECENT_FIRST, sort_clauses, keyset_after, decode_cursor, encode_cursor
+
+STATUSES = ('Booked', 'Completed', 'Cancelled')
+UPCOMING_LIMIT = 20   # upcoming appointments listed on a dashboard
+PAST_PAGE_SIZE = 10   # past appointments per history page
+RECENT_COUNT = 5      # "Last 5 Appointments" panel
+CALENDAR_MAX_DAYS = 62  # widest range served by doctor_calendar
+
+
+def status_counts(*criteria):
+    """{'total': n, 'Booked': n, 'Completed': n, 'Cancelled': n} from one grouped COUNT."""
+    rows = (db.session.query(Appointment.status, func.count(Appointment.id))
+            .filter(*criteria)
+            .group_by(Appointment.status)
+            .all())
+    counts = dict.fromkeys(STATUSES, 0)
+    for status, n in rows:
+        counts[status] = n
+    counts['total'] = sum(n for _, n in rows)
+    return counts
+
+
+def _key(a):
+    return (a.date, a.time, a.id)
+
+
+def _future(today, now_time):
+    return or_(Appointment.date > today,
+               and_(Appointment.date == today, Appointment.time >= now_time))
+
+
+def _past(today, now_time):
+    return or_(Appointment.date < today,
+               and_(Appointment.date == today, Appointment.time < now_time))
+
+
+def patient_dashboard_data(patient_id, now=None, past_cursor=None):
+    """
+    View-model for patient_dashboard.html in two queries: the grouped status
+    counts, and one SELECT for the upcoming window, the recent panel and the
+    requested page of past history (ids picked by three LIMITed subqueries).
+    `past_cursor` is the 'older' token of a previous history page.
+    """
+    now = now or datetime.now()
+    today, now_time = now.date(), now.time()
+    mine = Appointment.patient_id == patient_id
+
+    counts = status_counts(mine)
+
+    upcoming_ids = (select(Appointment.id)
+                    .where(mine, Appointment.status != 'Cancelled', _future(today, now_time))
+                    .order_by(Appointment.date, Appointment.time, Appointment.id)
+                    .limit(UPCOMING_LIMIT + 1))
+    past_ids = select(Appointment.id).where(mine, _past(today, now_time))
+    recent_ids = past_ids.order_by(*sort_clauses(APPOINTMENTS_RECENT_FIRST)).limit(RECENT_COUNT)
+
+    direction, after = decode_cursor(past_cursor)
+    if direction != 'n' or after is None or len(after) != len(APPOINTMENTS_RECENT_FIRST):
+        after = None
+    page_ids = past_ids if after is None else past_ids.where(keyset_after(APPOINTMENTS_RECENT_FIRST, after))
+    page_ids = page_ids.order_by(*sort_clauses(APPOINTMENTS_RECENT_FIRST)).limit(PAST_PAGE_SIZE + 1)
+
+    rows = (with_profile(Appointment.query, 'appointment_row')
+            .filter(or_(Appointment.id.in_(upcoming_ids),
+                        Appointment.id.in_(recent_ids),
+                        Appointment.id.in_(page_ids)))
+            .all())
+
+    now_key = (today, now_time)
+    upcoming = sorted((a for a in rows if (a.date, a.time) >= now_key), key=_key)
+    past = sorted((a for a in rows if (a.date, a.time) < now_key), key=_key, reverse=True)
+
+    page = past if after is None else [a for a in past if _key(a) < tuple(after)]
+    has_older = len(page) > PAST_PAGE_SIZE
+    page = page[:PAST_PAGE_SIZE]
+
+    return {
+        'counts': counts,
+        'upcoming': upcoming[:UPCOMING_LIMIT],
+        'more_upcoming': len(upcoming) > UPCOMING_LIMIT,
+        'recent': past[:RECENT_COUNT],
+        'past': page,
+        'past_is_latest': after is None,
+        'past_older_cursor': encode_cursor('n', _key(page[-1])) if has_older else None,
+    }
+
+
+def doctor_dashboard_data(doctor_id, now=None):
+    """
+    View-model for doctor_dashboard.html: grouped status counts plus one
+    SELECT for the next UPCOMING_LIMIT booked visits and the last
+    RECENT_COUNT past ones (past = earlier than now, or already completed /
+    cancelled).
+    """
+    now = now or datetime.now()
+    today, now_time = now.date(), now.time()
+    mine = Appointment.doctor_id == doctor_id
+
+    counts = status_counts(mine)
+
+    upcoming_ids = (select(Appointment.id)
+                    .where(mine, Appointment.status == 'Booked', _future(today, now_time))
+                    .order_by(Appointment.date, Appointment.time, Appointment.id)
+                    .limit(UPCOMING_LIMIT + 1))
+    recent_ids = (select(Appointment.id)
+                  .where(mine, or_(_past(today, now_time), Appointment.status.in_(['Completed', 'Cancelled'])))
+                  .order_by(*sort_clauses(APPOINTMENTS_RECENT_FIRST))
+                  .limit(RECENT_COUNT))
+
+    rows = (with_profile(Appointment.query, 'appointment_row')
+            .filter(or_(Appointment.id.in_(upcoming_ids), Appointment.id.in_(recent_ids)))
+            .all())
+
+    now_key = (today, now_time)
+    is_upcoming = lambda a: a.status == 'Booked' and (a.date, a.time) >= now_key
+    upcoming = sorted((a for a in rows if is_upcoming(a)), key=_key)
+    recent = sorted((a for a in rows if not is_upcoming(a)), key=_key, reverse=True)
+
+    return {
+        'counts': counts,
+        'upcoming': upcoming[:UPCOMING_LIMIT],
+        'more_upcoming': len(upcoming) > UPCOMING_LIMIT,
+        'recent': recent,
+    }
+
+
+def doctor_calendar(doctor_id, start, end):
+    """
+    Appointments and availability windows of one doctor for start..end
+    (inclusive dates), as JSON-ready dicts. Both are single range scans on
+    (doctor_id, date) indexes.
+    """
+    appts = (with_profile(Appointment.query, 'appointment_row')
+             .filter(Appointment.doctor_id == doctor_id,
+                     Appointment.date >= start, Appointment.date <= end)
+             .order_by(Appointment.date, Appointment.time, Appointment.id)
+             .all())
+    windows = (DoctorAvailability.query
+               .filter(DoctorAvailability.doctor_id == doctor_id,
+                       DoctorAvailability.date >= start, DoctorAvailability.date <= end)
+               .order_by(DoctorAvailability.date)
+               .all())
+    return {
+        'doctor_id': doctor_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'appointments': [{
+            'id': a.id,
+            'date': a.date.isoformat(),
+            'time': a.time.strftime('%H:%M'),
+            'status': a.status,
+            'patient_name': a.patient.user.name if a.patient and a.patient.user else None,
+        } for a in appts],
+        'availability': [{
+            'date': w.date.isoformat(),
+            'start': w.start_time.strftime('%H:%M'),
+            'end': w.end_time.strftime('%H:%M'),
+        } for w in windows],
+    }
@@ -0,0 +1,264 @@
+"""
+In-memory doctor directory with a trigram index for typo-tolerant lookups.
+
+Every doctor's name, specialization, qualification and department name is
+split into words; each word is indexed by its trigrams (padded like pg_trgm,
+so "cardiology" -> "  c", " ca", "car", ..., "gy "). A query word matches an
+indexed word exactly, as a prefix (autocomplete) or by trigram similarity
+("cardiolgy" -> "cardiology"). Every query word has to match something.
+
+The directory is built at startup (create_database) and kept current by
+model events: changes are read during flush and applied when the session
+commits. DIRECTORY_TTL rebuilds it periodically so other workers' writes
+show up too.
+"""
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from . import db
+from .models import User, DoctorProfile, Department
+from .search import tokenize
+
+DEFAULT_TTL = 600  # seconds
+MIN_SIMILARITY = 0.3  # same default as pg_trgm
+MAX_SUGGESTIONS = 10
+
+# scores for one query word against one indexed word
+EXACT, PREFIX, FUZZY = 1.0, 0.8, 0.6
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _entries(conn, doctor_ids=None, user_ids=None, department_ids=None):
+    """{doctor id: entry dict} read straight from the tables."""
+    query = (select(DoctorProfile.id, User.name, DoctorProfile.specialization,
+                    DoctorProfile.qualification, Department.name, DoctorProfile.is_blacklisted)
+             .join(User, User.id == DoctorProfile.user_id)
+             .outerjoin(Department, Department.id == DoctorProfile.department_id))
+    if doctor_ids is not None or user_ids is not None or department_ids is not None:
+        query = query.where(DoctorProfile.id.in_(doctor_ids or [])
+                            | User.id.in_(user_ids or [])
+                            | DoctorProfile.department_id.in_(department_ids or []))
+    return {
+        row[0]: {
+            'id': row[0],
+            'name': row[1],
+            'specialization': row[2],
+            'qualification': row[3],
+            'department': row[4],
+            'is_blacklisted': bool(row[5]),
+        }
+        for row in conn.execute(query)
+    }
+
+
+class DoctorDirectory:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None    # doctor id -> entry
+        self._doc_words = {}    # doctor id -> set of words
+        self._word_docs = {}    # word -> set of doctor ids
+        self._gram_words = {}   # trigram -> set of words
+        self._words = []        # sorted vocabulary, for prefix lookups
+        self._loaded_at = 0.0
+
+    # ---- maintenance ----
+    def build(self, conn):
+        entries = _entries(conn)
+        with self._lock:
+            self._entries = {}
+            self._doc_words, self._word_docs, self._gram_words = {}, {}, {}
+            for doc_id, entry in entries.items():
+                self._add(doc_id, entry)
+            self._words = sorted(self._word_docs)
+            self._loaded_at = time.monotonic()
+        return len(entries)
+
+    def apply(self, changes):
+        """changes: {doctor id: entry, or None when the doctor is gone}."""
+        with self._lock:
+            if self._entries is None:
+                return
+            for doc_id, entry in changes.items():
+                self._remove(doc_id)
+                if entry is not None:
+                    self._add(doc_id, entry)
+            self._words = sorted(self._word_docs)
+
+    @staticmethod
+    def _entry_words(entry):
+        return {w for f in ('name', 'specialization', 'qualification', 'department')
+                for w in tokenize(entry[f])}
+
+    def _add(self, doc_id, entry):
+        words = self._entry_words(entry)
+        self._entries[doc_id] = entry
+        self._doc_words[doc_id] = words
+        for w in words:
+            if w not in self._word_docs:
+                self._word_docs[w] = set()
+                for g in trigrams(w):
+                    self._gram_words.setdefault(g, set()).add(w)
+            self._word_docs[w].add(doc_id)
+
+    def _remove(self, doc_id):
+        self._entries.pop(doc_id, None)
+        for w in self._doc_words.pop(doc_id, ()):
+            docs = self._word_docs.get(w)
+            if docs is None:
+                continue
+            docs.discard(doc_id)
+            if not docs:
+                del self._word_docs[w]
+                for g in trigrams(w):
+                    words = self._gram_words.get(g)
+                    if words is not None:
+                        words.discard(w)
+                        if not words:
+                            del self._gram_words[g]
+
+    def _ensure_loaded(self):
+        if self._entries is None or time.monotonic() - self._loaded_at >= self.ttl:
+            with db.engine.connect() as conn:
+                self.build(conn)
+
+    # ---- lookups ----
+    def _word_scores(self, term):
+        """{indexed word: score} for one query word."""
+        scores = {}
+        i = bisect.bisect_left(self._words, term)
+        while i < len(self._words) and self._words[i].startswith(term):
+            word = self._words[i]
+            scores[word] = EXACT if word == term else PREFIX
+            i += 1
+        grams = trigrams(term)
+        shared = {}
+        for g in grams:
+            for word in self._gram_words.get(g, ()):
+                shared[word] = shared.get(word, 0) + 1
+        for word, n in shared.items():
+            if word in scores:
+                continue
+            similarity = n / (len(grams) + len(trigrams(word)) - n)
+            if similarity >= MIN_SIMILARITY:
+                scores[word] = FUZZY * similarity
+        return scores
+
+    def lookup(self, q, limit=MAX_SUGGESTIONS, include_blacklisted=False):
+        """Matching entries, best first: [(score, entry)]."""
+        terms = tokenize(q)
+        if not terms:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            totals = None
+            for term in terms:
+                best = {}
+                for word, score in self._word_scores(term).items():
+                    for doc_id in self._word_docs[word]:
+                        if score > best.get(doc_id, 0):
+                            best[doc_id] = score
+                if totals is None:
+                    totals = best
+                else:
+                    totals = {d: s + best[d] for d, s in totals.items() if d in best}
+                if not totals:
+                    return []
+            hits = [(score / len(terms), self._entries[d]) for d, score in totals.items()
+                    if include_blacklisted or not self._entries[d]['is_blacklisted']]
+        hits.sort(key=lambda h: (-h[0], h[1]['name'] or '', h[1]['id']))
+        return hits[:limit] if limit else hits
+
+
+_directory = DoctorDirectory()
+
+
+def get_directory():
+    return _directory
+
+
+def build_directory(engine=None):
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        return _directory.build(conn)
+
+
+def suggest(q, limit=MAX_SUGGESTIONS):
+    """Autocomplete rows for the search box."""
+    return [dict(entry, score=round(score, 3)) for score, entry in _directory.lookup(q, limit)]
+
+
+def fuzzy_doctor_ids(q, limit=None, include_blacklisted=False):
+    return [entry['id'] for _, entry in _directory.lookup(q, limit, include_blacklisted)]
+
+
+# ----------------------
+# Event hooks
+# ----------------------
+def _pending(target):
+    sess = object_session(target)
+    if sess is None:
+        return None
+    return sess.info.setdefault('directory_dirty', {'doctors': set(), 'users': set(), 'departments': set()})
+
+
+def _doctor_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['doctors'].add(target.id)
+
+
+def _user_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['users'].add(target.id)
+
+
+def _department_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['departments'].add(target.id)
+
+
+def _after_flush(session, flush_context):
+    dirty = session.info.pop('directory_dirty', None)
+    if not dirty:
+        return
+    entries = _entries(session.connection(), dirty['doctors'], dirty['users'], dirty['departments'])
+    changes = session.info.setdefault('directory_changes', {})
+    changes.update(entries)
+    for doc_id in dirty['doctors']:
+        if doc_id not in entries:
+            changes[doc_id] = None  # deleted, or no longer linked to a user
+
+
+def _after_commit(session):
+    changes = session.info.pop('directory_changes', None)
+    if changes:
+        _directory.apply(changes)
+
+
+def _after_rollback(session):
+    session.info.pop('directory_dirty', None)
+    session.info.pop('directory_changes', None)
+
+
+def init_directory(app):
+    _directory.ttl = app.config.setdefault('DIRECTORY_TTL', DEFAULT_TTL)
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(DoctorProfile, name, _doctor_changed)
+    event.listen(User, 'after_update', _user_changed)
+    event.listen(Department, 'after_update', _department_changed)
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,188 @@
+"""
+Slot holds: a patient reserves a free slot for SLOT_HOLD_SECONDS (120 by
+default) while finishing the booking form, so other patients stop racing
+for it and get turned away before they ever reach the appointment insert.
+
+A hold is one SlotHold row, unique per (doctor, date, time), placed with
+
+    INSERT ... ON CONFLICT (doctor_id, date, time) DO UPDATE ...
+    WHERE slot_hold.expires_at <= now OR slot_hold.patient_id = <patient>
+
+so taking over an expired hold or refreshing one's own is the same single
+statement, and a live hold of someone else returns no row. A patient keeps
+at most one hold; placing a new one drops the old one.
+
+Holds are advisory: the appointment unique key stays the authority.
+booking.book() refuses a slot held by another patient and deletes the hold
+once the appointment is in. Expired rows are ignored by every query; a
+daemon thread (SLOT_HOLD_SWEEP_INTERVAL seconds, 0 = off) and
+`flask sweep-holds` delete them in bulk. The thread is started by the first
+request each process serves, not by create_app(), so workers forked from a
+preloaded app (gunicorn --preload) each get their own; threads do not
+survive fork(). With the interval at 0, run `flask sweep-holds` from cron.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from . import slots
+from .models import db, SlotHold
+from .storage import dialect_insert
+
+HELD = 'held'
+CONFLICT = 'conflict'
+ERROR = 'error'
+
+DEFAULT_HOLD_SECONDS = 120
+DEFAULT_SWEEP_INTERVAL = 60  # seconds
+
+_sweeper = None
+_sweeper_pid = None  # process the sweeper was started in
+_sweeper_lock = threading.Lock()
+
+
+class HoldResult:
+    def __init__(self, status, hold_id=None, expires_at=None, message=None):
+        self.status = status
+        self.hold_id = hold_id
+        self.expires_at = expires_at
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.status == HELD
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'hold_id': self.hold_id,
+            'expires_at': self.expires_at.isoformat() + 'Z' if self.expires_at else None,
+            'message': self.message,
+        }
+
+    def __repr__(self):
+        return f'<HoldResult {self.status} {self.hold_id}>'
+
+
+def hold_seconds():
+    return current_app.config.get('SLOT_HOLD_SECONDS', DEFAULT_HOLD_SECONDS)
+
+
+def place(patient_id, doctor_id, on_date, at_time):
+    """Hold the slot for the patient and commit. Returns a HoldResult."""
+    if not slots.is_free(doctor_id, on_date, at_time, patient_id=patient_id):
+        return HoldResult(CONFLICT, message='Selected slot is not available')
+
+    table = SlotHold.__table__
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=hold_seconds())
+    try:
+        conn = db.session.connection()
+        conn.execute(table.delete().where(
+            table.c.patient_id == patient_id,
+            ~((table.c.doctor_id == doctor_id) & (table.c.date == on_date) & (table.c.time == at_time))))
+        stmt = dialect_insert(table, conn).values(
+            doctor_id=doctor_id, patient_id=patient_id, date=on_date, time=at_time,
+            expires_at=expires_at, created_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.doctor_id, table.c.date, table.c.time],
+            set_={
+                'patient_id': stmt.excluded.patient_id,
+                'expires_at': stmt.excluded.expires_at,
+                'created_at': stmt.excluded.created_at,
+            },
+            where=(table.c.expires_at <= now) | (table.c.patient_id == patient_id),
+        ).returning(table.c.id)
+        row = conn.execute(stmt).first()
+        if row is None:
+            db.session.rollback()
+            return HoldResult(CONFLICT, message='Slot is held by another patient, try again shortly')
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        current_app.logger.exception('Slot hold failed')
+        return HoldResult(ERROR, message='The system is busy, please try again')
+    return HoldResult(HELD, row[0], expires_at, 'Slot held')
+
+
+def release(hold_id, patient_id=None):
+    """Drop a hold (only the patient's own when patient_id is given) and commit. Returns True if one was deleted."""
+    table = SlotHold.__table__
+    stmt = table.delete().where(table.c.id == hold_id)
+    if patient_id is not None:
+        stmt = stmt.where(table.c.patient_id == patient_id)
+    deleted = db.session.execute(stmt).rowcount
+    db.session.commit()
+    return bool(deleted)
+
+
+def holder(conn, doctor_id, on_date, at_time):
+    """Patient id of the live hold on the slot, or None."""
+    table = SlotHold.__table__
+    return conn.execute(
+        table.select().with_only_columns(table.c.patient_id)
+        .where(table.c.doctor_id == doctor_id, table.c.date == on_date, table.c.time == at_time,
+               table.c.expires_at > datetime.utcnow())
+    ).scalar()
+
+
+def consume(conn, doctor_id, on_date, at_time):
+    """Delete the hold on a slot that has just been booked (not committed)."""
+    table = SlotHold.__table__
+    conn.execute(table.delete().where(table.c.doctor_id == doctor_id, table.c.date == on_date,
+                                      table.c.time == at_time))
+
+
+def sweep(engine=None):
+    """Delete every expired hold in one statement. Returns the number deleted."""
+    table = SlotHold.__table__
+    with (engine or db.engine).begin() as conn:
+        return conn.execute(table.delete().where(table.c.expires_at <= datetime.utcnow())).rowcount
+
+
+# ----------------------
+# Background sweeper
+# ----------------------
+class HoldSweeper(threading.Thread):
+    def __init__(self, app, interval):
+        super().__init__(name='slot-hold-sweeper', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    sweep()
+            except Exception:
+                self.app.logger.exception('Slot hold sweep failed')
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_sweeper(app, interval):
+    """Start this process's sweeper unless it is already running. Returns it."""
+    global _sweeper, _sweeper_pid
+    with _sweeper_lock:
+        if _sweeper_pid != os.getpid():  # none yet, or only the parent's before a fork
+            _sweeper = HoldSweeper(app, interval)
+            _sweeper.start()
+            _sweeper_pid = os.getpid()
+    return _sweeper
+
+
+def init_holds(app):
+    app.config.setdefault('SLOT_HOLD_SECONDS', DEFAULT_HOLD_SECONDS)
+    interval = app.config.setdefault('SLOT_HOLD_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    if not interval or app.testing:
+        return
+
+    @app.before_request
+    def start_hold_sweeper():
+        if _sweeper_pid != os.getpid():
+            start_sweeper(app, interval)
@@ -0,0 +1,202 @@
+"""
+Bulk appointment import (clinic migrations, vaccination drives).
+
+Rows come from JSON Lines, CSV or an already parsed list of dicts, each with
+patient_id, doctor_id, date (YYYY-MM-DD), time (HH:MM) and an optional status
+(Booked by default). import_appointments() validates all of them with
+set-based queries before writing anything:
+
+    1 SELECT of the known doctors, 1 SELECT of the known patients,
+    1 SELECT of the existing appointments on those doctors' dates,
+
+then writes in chunks of IMPORT_CHUNK_SIZE rows, one transaction per chunk:
+an executemany INSERT ... ON CONFLICT (doctor_id, date, time) WHERE status !=
+'Cancelled' DO NOTHING RETURNING, against the same partial unique index as
+booking.book(); cancelled appointments on a slot are kept and do not block
+it. A slot booked by somebody else between validation and insert comes back
+as a conflict instead of failing the chunk. Imported slots win over slot holds.
+A chunk the database rejects anyway (locked, constraint error) is rolled back
+on its own: its rows are reported as errors and the next chunk still runs.
+
+Every input row gets a result: {'row': n, 'status': 'created' | 'error',
+'id' or 'error'}. Rows are numbered from 1 in input order.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import text, tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from . import stats
+from .models import db, Appointment, ACTIVE_SLOT, DoctorProfile, PatientProfile, SlotHold
+from .stats import STATUSES
+from .storage import dialect_insert
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('patient_id', 'doctor_id', 'date', 'time', 'status')
+CHUNK_FAILED = 'Not written: its chunk was rolled back after a database error'
+
+
+def chunk_size():
+    return current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def guess_format(filename=None, content_type=None):
+    """'csv' or 'jsonl' from a file name or content type (jsonl by default)."""
+    name, ctype = (filename or '').lower(), (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in ctype:
+        return 'csv'
+    return 'jsonl'
+
+
+def parse_rows(text, fmt='jsonl'):
+    """
+    Rows from JSON Lines or CSV text. A line that is not a JSON object comes
+    back as a string (the error message) so its row number is kept.
+    """
+    if fmt == 'csv':
+        return [dict(r) for r in csv.DictReader(io.StringIO(text))]
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = 'Invalid JSON'
+        rows.append(row if isinstance(row, (dict, str)) else 'Expected a JSON object')
+    return rows
+
+
+def _parse(row):
+    """(patient_id, doctor_id, date, time, status) or raises ValueError."""
+    if isinstance(row, str):
+        raise ValueError(row)
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object')
+    try:
+        patient_id, doctor_id = int(row['patient_id']), int(row['doctor_id'])
+        on_date = datetime.strptime(str(row['date']).strip(), '%Y-%m-%d').date()
+        at_time = datetime.strptime(str(row['time']).strip(), '%H:%M').time()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('patient_id, doctor_id, date (YYYY-MM-DD) and time (HH:MM) are required')
+    status = str(row.get('status') or 'Booked').strip()
+    if status not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    return patient_id, doctor_id, on_date, at_time, status
+
+
+def validate(rows):
+    """
+    Split rows into (inserts, results). inserts is a list of (row number,
+    values dict); results holds the errors so far, by row number.
+    """
+    parsed, results = [], {}
+    for n, row in enumerate(rows, 1):
+        try:
+            parsed.append((n, _parse(row)))
+        except ValueError as e:
+            results[n] = {'row': n, 'status': 'error', 'error': str(e)}
+    if not parsed:
+        return [], results
+
+    doctor_ids = {p[1] for _, p in parsed}
+    patient_ids = {p[0] for _, p in parsed}
+    known_doctors = {d for (d,) in db.session.query(DoctorProfile.id).filter(DoctorProfile.id.in_(doctor_ids))}
+    known_patients = {p for (p,) in db.session.query(PatientProfile.id).filter(PatientProfile.id.in_(patient_ids))}
+    dates = [p[2] for _, p in parsed]
+    existing = set(
+        db.session.query(Appointment.doctor_id, Appointment.date, Appointment.time)
+        .filter(Appointment.doctor_id.in_(known_doctors), Appointment.status != 'Cancelled',
+                Appointment.date >= min(dates), Appointment.date <= max(dates))
+    )
+
+    inserts, seen = [], set()
+    for n, (patient_id, doctor_id, on_date, at_time, status) in parsed:
+        key = (doctor_id, on_date, at_time)
+        error = None
+        if doctor_id not in known_doctors:
+            error = f'Unknown doctor {doctor_id}'
+        elif patient_id not in known_patients:
+            error = f'Unknown patient {patient_id}'
+        elif key in seen:
+            error = 'Slot appears more than once in this import'
+        elif key in existing:
+            error = 'Doctor already has appointment at that date/time'
+        if error:
+            results[n] = {'row': n, 'status': 'error', 'error': error}
+            continue
+        seen.add(key)
+        inserts.append((n, {'patient_id': patient_id, 'doctor_id': doctor_id, 'date': on_date,
+                            'time': at_time, 'status': status}))
+    return inserts, results
+
+
+def _write_chunk(inserts, stamp):
+    """One transaction: executemany insert. Returns {row number: result}."""
+    table = Appointment.__table__
+    conn = db.session.connection()
+    results, deltas = {}, {}
+
+    if inserts:
+        stmt = (dialect_insert(table, conn)
+                .on_conflict_do_nothing(index_elements=[table.c.doctor_id, table.c.date, table.c.time],
+                                        index_where=text(ACTIVE_SLOT))
+                .returning(table.c.id, table.c.doctor_id, table.c.date, table.c.time))
+        by_key = {(v['doctor_id'], v['date'], v['time']): n for n, v in inserts}
+        for r in conn.execute(stmt, [dict(v, created_at=stamp) for _, v in inserts]):
+            results[by_key[(r.doctor_id, r.date, r.time)]] = {'status': 'created', 'id': r.id}
+        for n, v in inserts:
+            if n in results:
+                deltas['appointments'] = deltas.get('appointments', 0) + 1
+                deltas[v['status']] = deltas.get(v['status'], 0) + 1
+
+    done = [(v['doctor_id'], v['date'], v['time']) for n, v in inserts if n in results]
+    if done:
+        holds = SlotHold.__table__
+        conn.execute(holds.delete().where(tuple_(holds.c.doctor_id, holds.c.date, holds.c.time).in_(done)))
+    stats.record_changes(db.session, deltas.items())
+    return results
+
+
+def import_appointments(rows, chunk=None, dry_run=False):
+    """
+    Validate and insert appointment rows (dicts, or strings for rows that
+    failed to parse). Returns {'created', 'failed', 'results'}.
+    """
+    chunk = chunk or chunk_size()
+    inserts, results = validate(rows)
+    for n, _ in inserts:
+        results[n] = {'row': n, 'status': 'valid'}
+
+    if not dry_run:
+        stamp = datetime.utcnow()
+        for i in range(0, len(inserts), chunk):
+            part = inserts[i:i + chunk]
+            try:
+                written = _write_chunk(part, stamp)
+                db.session.commit()
+            except (IntegrityError, OperationalError):
+                db.session.rollback()
+                current_app.logger.exception('Import chunk starting at row %d failed', part[0][0])
+                for n, _ in part:
+                    results[n] = {'row': n, 'status': 'error', 'error': CHUNK_FAILED}
+                continue
+            for n, _ in part:
+                outcome = written.get(n, {'status': 'error',
+                                          'error': 'Doctor already has appointment at that date/time'})
+                results[n] = dict(row=n, **outcome)
+
+    ordered = [results[n] for n in sorted(results)]
+    counts = {'created': 0, 'valid': 0, 'error': 0}
+    for r in ordered:
+        counts[r['status']] += 1
+    summary = {'created': counts['created'], 'failed': counts['error']}
+    if dry_run:
+        summary['valid'] = counts['valid']
+    summary['results'] = ordered
+    return summary
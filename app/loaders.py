@@ -0,0 +1,53 @@
+"""
+Named eager-load profiles.
+
+Each profile lists the relationships a template walks for every row, so list
+pages load them up-front (JOINs on the same SELECT) instead of issuing one lazy
+load per row. Apply with `with_profile(query, 'appointment_row')`.
+
+Profiles are built on call because most relationships are backrefs, which
+only exist once the mappers are configured.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from .models import db, DoctorProfile, PatientProfile, Appointment
+
+PROFILES = {
+    # appointment_list.html / profile history: patient, doctor and department names
+    'appointment_row': lambda: (
+        joinedload(Appointment.patient).joinedload(PatientProfile.user),
+        joinedload(Appointment.doctor).joinedload(DoctorProfile.user),
+        joinedload(Appointment.doctor).joinedload(DoctorProfile.department),
+    ),
+    # doctors_list.html / appointment_form.html: name only
+    'doctor_row': lambda: (
+        joinedload(DoctorProfile.user),
+    ),
+    # admin_dashboard.html: name plus department
+    'doctor_card': lambda: (
+        joinedload(DoctorProfile.user),
+        joinedload(DoctorProfile.department),
+    ),
+    'patient_row': lambda: (
+        joinedload(PatientProfile.user),
+    ),
+}
+
+
+def with_profile(query, name):
+    """Apply the eager-load profile `name` to a query."""
+    try:
+        build = PROFILES[name]
+    except KeyError:
+        raise ValueError(f'Unknown eager-load profile: {name}')
+    return query.options(*build())
+
+
+def doctor_counts_by_department():
+    """{department_id: number of doctors} in one grouped query."""
+    rows = (db.session.query(DoctorProfile.department_id, func.count(DoctorProfile.id))
+            .filter(DoctorProfile.department_id.isnot(None))
+            .group_by(DoctorProfile.department_id)
+            .all())
+    return {dept_id: n for dept_id, n in rows}
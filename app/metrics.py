@@ -0,0 +1,189 @@
+"""
+Per-request query and latency instrumentation.
+
+For every request this records the number of SQL statements, time spent in
+SQL, template render time and ORM rows loaded. Totals are aggregated per
+endpoint (shown on /admin/metrics) and sent back in a Server-Timing header.
+
+Query budgets: QUERY_BUDGETS maps an endpoint name to the maximum number of
+statements it may issue (QUERY_BUDGET_DEFAULT applies to the rest). Going over
+budget is logged; with QUERY_BUDGET_STRICT (on by default when TESTING) it
+raises QueryBudgetExceeded, which fails the request in tests.
+"""
+import threading
+import time
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import db
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.rows = 0
+        self._render_started = None
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.rows = 0
+        self.over_budget = 0
+
+    def add(self, m, total_time, over_budget):
+        self.requests += 1
+        self.queries += m.queries
+        self.max_queries = max(self.max_queries, m.queries)
+        self.sql_time += m.sql_time
+        self.render_time += m.render_time
+        self.total_time += total_time
+        self.rows += m.rows
+        if over_budget:
+            self.over_budget += 1
+
+    def as_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'avg_queries': self.queries / n,
+            'max_queries': self.max_queries,
+            'avg_sql_ms': self.sql_time * 1000 / n,
+            'avg_render_ms': self.render_time * 1000 / n,
+            'avg_total_ms': self.total_time * 1000 / n,
+            'avg_rows': self.rows / n,
+            'over_budget': self.over_budget,
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def _current():
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+
+# ----------------------
+# SQLAlchemy hooks
+# ----------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, started = conn.info['_query_start'].pop()
+    m = _current()
+    if m is not None:
+        m.queries += 1
+        m.sql_time += time.perf_counter() - started
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute: drop its start time
+    conn = context.connection
+    stack = conn.info.get('_query_start') if conn is not None else None
+    if stack and stack[-1][0] is context.execution_context:
+        stack.pop()
+
+
+def _on_load(target, context):
+    m = _current()
+    if m is not None:
+        m.rows += 1
+
+
+# ----------------------
+# Template hooks
+# ----------------------
+def _before_render(sender, template, context, **extra):
+    m = _current()
+    if m is not None and m._render_started is None:
+        m._render_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    m = _current()
+    if m is not None and m._render_started is not None:
+        m.render_time += time.perf_counter() - m._render_started
+        m._render_started = None
+
+
+def query_budget(app, endpoint):
+    budgets = app.config.get('QUERY_BUDGETS') or {}
+    return budgets.get(endpoint, app.config.get('QUERY_BUDGET_DEFAULT'))
+
+
+def snapshot():
+    """{endpoint: aggregated stats dict}, sorted by endpoint."""
+    with _lock:
+        return {k: _stats[k].as_dict() for k in sorted(_stats)}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def init_metrics(app):
+    app.config.setdefault('QUERY_BUDGETS', {})
+    app.config.setdefault('QUERY_BUDGET_DEFAULT', None)
+    app.config.setdefault('QUERY_BUDGET_STRICT', None)
+
+    # Engine class level, so every engine (including extra binds) is covered
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        event.listen(db.Model, 'load', _on_load, propagate=True)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics = RequestMetrics()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        m = g.pop('_metrics', None)
+        if m is None:
+            return response
+        total = time.perf_counter() - m.started
+        endpoint = request.endpoint or 'unknown'
+        budget = query_budget(app, endpoint)
+        over = budget is not None and m.queries > budget
+
+        with _lock:
+            _stats.setdefault(endpoint, EndpointStats()).add(m, total, over)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={m.sql_time * 1000:.1f};desc="{m.queries} queries, {m.rows} rows"',
+            f'render;dur={m.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        if over:
+            msg = f'{endpoint} issued {m.queries} queries (budget {budget})'
+            strict = app.config['QUERY_BUDGET_STRICT']
+            if strict is None:
+                strict = app.testing
+            if strict:
+                raise QueryBudgetExceeded(msg)
+            app.logger.warning('Query budget exceeded: %s', msg)
+        return response
@@ -8,12 +8,13 @@ from datetime import datetime
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    name = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)  # sorted and searched everywhere
     password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
+    role = db.Column(db.String(20), nullable=False, index=True)
     active = db.Column(db.Boolean, default=True)
     reason= db.Column(db.String(255)) 
     created_at = db.Column(db.DateTime, default=func.now()) 
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     doctor = db.relationship('DoctorProfile', backref='user', uselist=False)
     patient = db.relationship('PatientProfile', backref='user', uselist=False)
 
@@ -27,15 +28,16 @@ class Department(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
     description = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     doctors = db.relationship('DoctorProfile', backref='department', lazy='dynamic')
 
 class DoctorProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     specialization = db.Column(db.String(120))
     experience = db.Column(db.String(120))
     qualification = db.Column(db.String(120))
-    department_id = db.Column(db.Integer, db.ForeignKey('department.id'))
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), index=True)
     contact = db.Column(db.String(40))
     is_blacklisted = db.Column(db.Boolean, default=False, nullable=False)   
     blacklist_reason = db.Column(db.Text, nullable=True)
@@ -43,6 +45,7 @@ class DoctorProfile(db.Model):
     blacklisted_by = db.Column(db.Integer, nullable=True)  # Admin who blacklisted
     availability_json = db.Column(db.Text)
     bio = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     appointments = db.relationship('Appointment', backref='doctor', lazy='dynamic')
 
 # Model to represent Doctor's daily availability for one week => can be configured for next N days 
@@ -55,6 +58,9 @@ class DoctorAvailability(db.Model):
 
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=True, onupdate=datetime.utcnow)
+    # 'manual' (edited by the doctor) or 'template' (materialized from the weekly
+    # template, see app/schedules.py); NULL on rows from before templates = manual
+    source = db.Column(db.String(10), default='manual')
     doctor = db.relationship('DoctorProfile', backref=db.backref('availabilities', cascade='all, delete-orphan', lazy='dynamic'))
 
 
@@ -63,9 +69,51 @@ class DoctorAvailability(db.Model):
         db.Index('ix_doc_daily_date_time', 'date', 'start_time', 'end_time'),
     )
 
+# Recurring weekly availability: one window per doctor and weekday (0 = Monday)
+class AvailabilityTemplate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_profile.id', ondelete='CASCADE'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'weekday', name='uq_template_doctor_weekday'),
+    )
+
+# Days the weekly template does not apply: a doctor's day off, or a holiday for
+# every doctor when doctor_id is NULL
+class AvailabilityException(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_profile.id', ondelete='CASCADE'), nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    reason = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'date', name='uq_exception_doctor_date'),
+    )
+
+# Short-lived reservation of a free slot while a patient completes the booking.
+# A hold only counts until expires_at (UTC); the sweeper deletes expired rows in bulk.
+class SlotHold(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_profile.id', ondelete='CASCADE'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_profile.id', ondelete='CASCADE'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'date', 'time', name='uq_hold_doctor_datetime'),
+    )
+
 class PatientProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     contact = db.Column(db.String(40))
     is_blacklisted = db.Column(db.Boolean, default=False, nullable=False)   
     blacklist_reason = db.Column(db.Text, nullable=True)
@@ -75,6 +123,9 @@ class PatientProfile(db.Model):
     address = db.Column(db.Text)
     appointments = db.relationship('Appointment', backref='patient', lazy='dynamic')
 
+# The appointments uix_doctor_datetime covers; ON CONFLICT clauses against it repeat this.
+ACTIVE_SLOT = "status != 'Cancelled'"
+
 class Appointment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient_profile.id'))
@@ -83,16 +134,33 @@ class Appointment(db.Model):
     time = db.Column(db.Time, nullable=False)
     status = db.Column(db.String(20), default='Booked')  # Booked/Completed/Cancelled
     created_at = db.Column(db.DateTime, default=func.now()) # Timestamp of appointment creation from database
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     treatment = db.relationship('Treatment', backref='appointment', uselist=False)
 
-    # Create constraint to prevent double booking of appointments for the same doctor at the same date and time
+    # Prevent double booking: one active (not cancelled) appointment per doctor,
+    # date and time. Partial, so cancelled rows stay as history and the slot can
+    # be booked again with a new row. The other indexes cover doctor_id + date
+    # range lookups, the patient dashboard, the admin status/date filters and
+    # the recent-first listing.
     __table_args__ = (
-        db.UniqueConstraint('doctor_id', 'date', 'time', name='uix_doctor_datetime'),
+        db.Index('uix_doctor_datetime', 'doctor_id', 'date', 'time', unique=True,
+                 sqlite_where=db.text(ACTIVE_SLOT), postgresql_where=db.text(ACTIVE_SLOT)),
+        db.Index('ix_appt_doctor_date_time', 'doctor_id', 'date', 'time'),
+        db.Index('ix_appt_patient_date_time', 'patient_id', 'date', 'time'),
+        db.Index('ix_appt_status_date', 'status', 'date'),
+        db.Index('ix_appt_date_time', 'date', 'time'),
     )
 
+# Version counter per group of tables (see conditional.py), bumped in the
+# transaction that changes them; ETags and Last-Modified come from here.
+class DataVersion(db.Model):
+    name = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Treatment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'))
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), index=True)
     diagnosis = db.Column(db.Text)
     prescription = db.Column(db.Text)
     notes = db.Column(db.Text)
@@ -0,0 +1,169 @@
+"""
+Bulk onboarding of doctors and patients (staff rosters, patient lists).
+
+Each row has role (doctor or patient), name, email and optionally password
+(the usual default password otherwise), plus profile fields: specialization,
+qualification, experience, bio and department (name) or department_id for
+doctors; contact, dob (YYYY-MM-DD) and address for patients.
+onboard() validates all rows with set-based queries first:
+
+    1 SELECT of the emails that already exist, 1 SELECT of the departments,
+
+then hashes the passwords across a process pool (ONBOARDING_HASH_WORKERS,
+default: every CPU; werkzeug's scrypt/pbkdf2 hashing is CPU bound and takes
+tens of milliseconds per password) and adds users with their profiles in
+chunks of IMPORT_CHUNK_SIZE, one flush and one commit per chunk. The ORM
+batches the INSERTs, and the stats, search and directory hooks see every row.
+A chunk that fails in the database (e.g. an email taken meanwhile) is rolled
+back alone and its rows are reported as errors.
+
+Rows are reported like importer.py: {'row': n, 'status': 'created' | 'valid'
+| 'error', 'user_id'/'id' or 'error'}.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, OperationalError
+from werkzeug.security import generate_password_hash
+
+from .importer import chunk_size, CHUNK_FAILED
+from .models import db, User, Department, DoctorProfile, PatientProfile
+
+DEFAULT_PASSWORDS = {'doctor': 'Doctor@123', 'patient': 'Patient@123'}
+POOL_MIN_PASSWORDS = 32  # fewer than this are hashed in-process
+MIN_PASSWORD_LENGTH = 6
+
+
+def hash_workers():
+    return current_app.config.get('ONBOARDING_HASH_WORKERS') or os.cpu_count() or 1
+
+
+def hash_passwords(passwords, workers=None):
+    """generate_password_hash() of every password, in order, on a process pool."""
+    workers = workers or hash_workers()
+    if workers <= 1 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [generate_password_hash(p) for p in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate_password_hash, passwords,
+                             chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value not in (None, '') else None
+
+
+def _parse(row, departments):
+    """Cleaned row dict, or raises ValueError."""
+    if isinstance(row, str):
+        raise ValueError(row)
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object')
+    role = (_text(row, 'role') or '').lower()
+    if role not in DEFAULT_PASSWORDS:
+        raise ValueError('role must be doctor or patient')
+    name, email = _text(row, 'name'), (_text(row, 'email') or '').lower()
+    if not name or not email or '@' not in email:
+        raise ValueError('name and a valid email are required')
+    password = row.get('password') or DEFAULT_PASSWORDS[role]
+    if not isinstance(password, str):
+        raise ValueError('password must be a string')
+    if len(password) < MIN_PASSWORD_LENGTH:
+        raise ValueError(f'Password must be at least {MIN_PASSWORD_LENGTH} characters')
+    clean = {'role': role, 'name': name, 'email': email, 'password': password}
+
+    if role == 'doctor':
+        department_id = None
+        if _text(row, 'department_id'):
+            try:
+                department_id = int(row['department_id'])
+            except (TypeError, ValueError):
+                raise ValueError('department_id must be an integer')
+            if department_id not in departments.values():
+                raise ValueError(f'Unknown department {department_id}')
+        elif _text(row, 'department'):
+            department_id = departments.get(_text(row, 'department').lower())
+            if department_id is None:
+                raise ValueError(f"Unknown department {_text(row, 'department')}")
+        clean['profile'] = {
+            'specialization': _text(row, 'specialization'),
+            'qualification': _text(row, 'qualification'),
+            'experience': _text(row, 'experience'),
+            'bio': _text(row, 'bio'),
+            'department_id': department_id,
+        }
+    else:
+        dob = None
+        if _text(row, 'dob'):
+            try:
+                dob = datetime.strptime(_text(row, 'dob'), '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError('Invalid date of birth format')
+        clean['profile'] = {'contact': _text(row, 'contact'), 'dob': dob, 'address': _text(row, 'address')}
+    return clean
+
+
+def validate(rows):
+    """([(row number, clean row)], {row number: error result})."""
+    departments = {name.lower(): dept_id for dept_id, name in db.session.query(Department.id, Department.name)}
+    parsed, results = [], {}
+    for n, row in enumerate(rows, 1):
+        try:
+            parsed.append((n, _parse(row, departments)))
+        except ValueError as e:
+            results[n] = {'row': n, 'status': 'error', 'error': str(e)}
+
+    emails = {r['email'] for _, r in parsed}
+    taken = {e for (e,) in db.session.query(User.email).filter(User.email.in_(emails))} if emails else set()
+    valid, seen = [], set()
+    for n, r in parsed:
+        if r['email'] in taken:
+            results[n] = {'row': n, 'status': 'error', 'error': 'Email already exists'}
+        elif r['email'] in seen:
+            results[n] = {'row': n, 'status': 'error', 'error': 'Email appears more than once in this import'}
+        else:
+            seen.add(r['email'])
+            valid.append((n, r))
+    return valid, results
+
+
+def onboard(rows, chunk=None, workers=None, dry_run=False):
+    """
+    Validate and create users with their profiles. Returns
+    {'created', 'failed', 'results'} ('valid' instead of 'created' on a dry run).
+    """
+    chunk = chunk or chunk_size()
+    valid, results = validate(rows)
+    if dry_run:
+        for n, _ in valid:
+            results[n] = {'row': n, 'status': 'valid'}
+    else:
+        hashes = hash_passwords([r['password'] for _, r in valid], workers)
+        for i in range(0, len(valid), chunk):
+            created = []
+            try:
+                for (n, r), password_hash in zip(valid[i:i + chunk], hashes[i:i + chunk]):
+                    user = User(email=r['email'], name=r['name'], role=r['role'], password_hash=password_hash)
+                    model = DoctorProfile if r['role'] == 'doctor' else PatientProfile
+                    profile = model(user=user, **r['profile'])
+                    db.session.add(user)
+                    db.session.add(profile)
+                    created.append((n, user, profile))
+                db.session.flush()
+                ids = [(n, user.id, profile.id) for n, user, profile in created]
+                db.session.commit()
+            except (IntegrityError, OperationalError):
+                db.session.rollback()
+                current_app.logger.exception('Onboarding chunk starting at row %d failed', valid[i][0])
+                for n, _ in valid[i:i + chunk]:
+                    results[n] = {'row': n, 'status': 'error', 'error': CHUNK_FAILED}
+                continue
+            for n, user_id, profile_id in ids:
+                results[n] = {'row': n, 'status': 'created', 'user_id': user_id, 'id': profile_id}
+
+    ordered = [results[n] for n in sorted(results)]
+    failed = sum(1 for r in ordered if r['status'] == 'error')
+    key = 'valid' if dry_run else 'created'
+    return {key: len(ordered) - failed, 'failed': failed, 'results': ordered}
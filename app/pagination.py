@@ -0,0 +1,198 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET/COUNT, each page is addressed by an opaque cursor that holds
+the sort key of the row at the page boundary. Fetching the next page is then a
+plain indexed range scan ("rows after this key"), so deep pages cost the same
+as the first one.
+"""
+from datetime import date, time, datetime
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_, func, select
+
+from .models import User, Appointment
+
+CURSOR_SALT = 'keyset-cursor'
+ESTIMATE_CAP = 1000  # 'estimate' mode counts at most this many rows
+
+# Sort keys: sequence of (column, descending). The last column must be unique
+# so every row has a distinct key.
+APPOINTMENTS_RECENT_FIRST = (
+    (Appointment.date, True),
+    (Appointment.time, True),
+    (Appointment.id, True),
+)
+
+
+def by_user_name(profile_model):
+    """Sort key for DoctorProfile/PatientProfile listings ordered by User.name."""
+    return ((User.name, False), (profile_model.id, False))
+
+
+class KeysetPagination:
+    """Page state handed to templates (see templates/_pager.html)."""
+
+    def __init__(self, items, per_page, has_prev, has_next, prev_cursor, next_cursor,
+                 total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def total_display(self):
+        if self.total is None:
+            return ''
+        return f'{self.total}+' if self.total_is_estimate else str(self.total)
+
+
+# ----------------------
+# Cursor encoding
+# ----------------------
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=CURSOR_SALT)
+
+
+def _dump_value(v):
+    # JSON has no date/time types, so tag them
+    if isinstance(v, datetime):
+        return ['dt', v.isoformat()]
+    if isinstance(v, date):
+        return ['d', v.isoformat()]
+    if isinstance(v, time):
+        return ['t', v.isoformat()]
+    return ['v', v]
+
+
+def _load_value(pair):
+    tag, v = pair
+    if tag == 'dt':
+        return datetime.fromisoformat(v)
+    if tag == 'd':
+        return date.fromisoformat(v)
+    if tag == 't':
+        return time.fromisoformat(v)
+    return v
+
+
+def encode_cursor(direction, values):
+    return _serializer().dumps({'d': direction, 'k': [_dump_value(v) for v in values]})
+
+
+def decode_cursor(token):
+    """Return (direction, values) or (None, None) for a missing/tampered token."""
+    if not token:
+        return None, None
+    try:
+        data = _serializer().loads(token)
+        direction = data['d']
+        if direction not in ('n', 'p'):
+            return None, None
+        return direction, [_load_value(p) for p in data['k']]
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None, None
+
+
+# ----------------------
+# Query building
+# ----------------------
+def _beyond(sort_keys, values, forward):
+    """
+    WHERE clause selecting rows strictly after (forward=True) or before the
+    given key in sort order. Expanded as (a > x) OR (a = x AND b > y) ... so it
+    works for mixed asc/desc keys and on every backend.
+    """
+    clauses = []
+    for i, (col, desc) in enumerate(sort_keys):
+        later = (col < values[i]) if (desc == forward) else (col > values[i])
+        eqs = [sort_keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*eqs, later) if eqs else later)
+    return or_(*clauses)
+
+
+def keyset_after(sort_keys, values):
+    """WHERE clause for rows after the key `values` in `sort_keys` order."""
+    return _beyond(sort_keys, values, True)
+
+
+def _ordering(sort_keys, forward):
+    out = []
+    for col, desc in sort_keys:
+        out.append(col.desc() if (desc == forward) else col.asc())
+    return out
+
+
+def sort_clauses(sort_keys):
+    """ORDER BY clauses for `sort_keys` in their natural direction."""
+    return _ordering(sort_keys, True)
+
+
+def count_rows(query, mode):
+    """
+    Count for the pager: 'exact' runs a full COUNT, 'estimate' stops counting at
+    ESTIMATE_CAP rows. Returns (total, is_estimate).
+    """
+    if mode == 'exact':
+        return query.order_by(None).count(), False
+    if mode == 'estimate':
+        sub = query.order_by(None).limit(ESTIMATE_CAP + 1).subquery()
+        n = query.session.execute(select(func.count()).select_from(sub)).scalar() or 0
+        if n > ESTIMATE_CAP:
+            return ESTIMATE_CAP, True
+        return n, False
+    return None, False
+
+
+def keyset_paginate(query, sort_keys, cursor=None, per_page=10, total_mode=None):
+    """
+    Return a KeysetPagination for `query` ordered by `sort_keys`.
+    `cursor` is a token from a previous page's next_cursor/prev_cursor.
+    `total_mode` is None (no count), 'estimate' or 'exact'.
+    """
+    per_page = max(1, int(per_page))
+    direction, values = decode_cursor(cursor)
+    if values is not None and len(values) != len(sort_keys):
+        direction, values = None, None
+    forward = direction != 'p'
+
+    total, total_is_estimate = count_rows(query, total_mode)
+
+    q = query.add_columns(*[col for col, _ in sort_keys]).order_by(None)
+    if values is not None:
+        q = q.filter(_beyond(sort_keys, values, forward))
+    rows = q.order_by(*_ordering(sort_keys, forward)).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    # entity queries give one leading item per row; column queries give a tuple
+    width = len(query.column_descriptions)
+    if width == 1:
+        items = [r[0] for r in rows]
+    else:
+        items = [tuple(r[:width]) for r in rows]
+    keys = [tuple(r[width:]) for r in rows]
+
+    if forward:
+        has_prev, has_next = values is not None, more
+    else:
+        has_prev, has_next = more, True
+
+    return KeysetPagination(
+        items=items,
+        per_page=per_page,
+        has_prev=has_prev and bool(keys),
+        has_next=has_next and bool(keys),
+        prev_cursor=encode_cursor('p', keys[0]) if (has_prev and keys) else None,
+        next_cursor=encode_cursor('n', keys[-1]) if (has_next and keys) else None,
+        total=total,
+        total_is_estimate=total_is_estimate,
+    )
@@ -1,15 +1,20 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, g
 from flask_login import login_user, logout_user, login_required, current_user
-from math import ceil
 from datetime import time, datetime, date, timedelta
-import json, re
+import json
 
 from sqlalchemy import func, and_, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, contains_eager
 
-from .models import db, User, DoctorProfile, PatientProfile, Department, Appointment, Treatment, DoctorAvailability
+from .models import db, User, DoctorProfile, PatientProfile, Department, Appointment, Treatment, DoctorAvailability, AvailabilityTemplate, AvailabilityException
 
-from .utils import validate_csrf
+from .utils import validate_csrf, stream_template
+from .conditional import conditional
+from . import metrics, stats, search as search_index, directory, slots, schedules, booking, holds
+from .dashboards import patient_dashboard_data, doctor_dashboard_data, doctor_calendar, CALENDAR_MAX_DAYS
+from .loaders import with_profile, doctor_counts_by_department
+from .storage import read_query, icontains
+from .pagination import keyset_paginate, sort_clauses, APPOINTMENTS_RECENT_FIRST, by_user_name
 from datetime import datetime, date
 from sqlalchemy.exc import IntegrityError
 
@@ -38,27 +43,6 @@ def logout():
 
 ITEMS_PER_PAGE = 8  # tune as needed
 
-def paginate_query(query, page, per_page=ITEMS_PER_PAGE):
-    """Return (items, pagination dict) for a SQLAlchemy query."""
-    page = max(1, int(page or 1))
-    per_page = int(per_page)
-    total = query.order_by(None).count()  
-    total_pages = max(1, ceil(total / per_page))
-    if page > total_pages:
-        page = total_pages
-    items = query.offset((page - 1) * per_page).limit(per_page).all()
-    pagination = {
-        'page': page,
-        'per_page': per_page,
-        'total': total,
-        'total_pages': total_pages,
-        'has_prev': page > 1,
-        'has_next': page < total_pages,
-        'prev_page': page - 1 if page > 1 else None,
-        'next_page': page + 1 if page < total_pages else None
-    }
-    return items, pagination
-
 
 
 # ---------- ADMIN ----------
@@ -66,30 +50,30 @@ def paginate_query(query, page, per_page=ITEMS_PER_PAGE):
 @login_required
 @role_required('admin')
 def admin_dashboard():
-    total_doctors = DoctorProfile.query.count()
-    total_patients = PatientProfile.query.count()
-    total_appointments = Appointment.query.count()
-    total_departments = Department.query.count()
+    # totals are served from the in-memory statistics cache (app/stats.py)
+    totals = stats.get_stats()
 
-    
     # provide lists for quick admin actions (limit to last 50 to avoid huge pages)
-    doctors_list = DoctorProfile.query.order_by(DoctorProfile.id.desc()).limit(50).all()
-    patients_list = PatientProfile.query.order_by(PatientProfile.id.desc()).limit(50).all()
+    doctors_list = with_profile(DoctorProfile.query, 'doctor_card').order_by(DoctorProfile.id.desc()).limit(50).all()
+    patients_list = with_profile(PatientProfile.query, 'patient_row').order_by(PatientProfile.id.desc()).limit(50).all()
 
     return render_template('admin_dashboard.html',
-                           doctors=total_doctors,
-                           patients=total_patients,
-                           appointments=total_appointments,
-                           departments=total_departments,
+                           doctors=totals['doctors'],
+                           patients=totals['patients'],
+                           appointments=totals['appointments'],
+                           departments=totals['departments'],
+                           status_counts={s: totals[s] for s in stats.STATUSES},
                            doctors_list=doctors_list,
                            patients_list=patients_list)
 
 @main.route('/admin/departments')
 @login_required
 @role_required('admin')
+@conditional('departments', 'doctors', private=True)
 def list_departments():
     depts = Department.query.order_by(Department.name).all()
-    return render_template('department_list.html', departments=depts)
+    # one grouped COUNT instead of d.doctors.count() per row
+    return render_template('department_list.html', departments=depts, doctor_counts=doctor_counts_by_department())
 
 @main.route('/admin/departments/add', methods=['GET', 'POST'])
 @login_required
@@ -155,7 +139,7 @@ def delete_department(dept_id):
 @login_required
 @role_required('admin')
 def list_doctors():
-    doctors= DoctorProfile.query.order_by(DoctorProfile.id.desc()).all()
+    doctors = with_profile(read_query(DoctorProfile), 'doctor_row').order_by(DoctorProfile.id.desc()).all()
     return render_template('doctors_list.html', doctors=doctors)
 
 
@@ -184,16 +168,13 @@ def add_doctor():
 
         user = User(email=email, name=name, role='doctor')
         user.set_password('Doctor@123')
-        db.session.add(user)
-        db.session.commit()
-
-        doc = DoctorProfile(user_id=user.id, specialization=specialization,qualification=qualification, experience=experience, bio=bio)
+        doc = DoctorProfile(user=user, specialization=specialization,qualification=qualification, experience=experience, bio=bio)
         if dept_id:
             try:
                 doc.department_id = int(dept_id)
             except ValueError:
                 doc.department_id = None
-        db.session.add(doc)
+        db.session.add_all([user, doc])
         db.session.commit()
         flash('Doctor added successfully. Default password: Doctor@123', 'success')
         return redirect(url_for('main.admin_dashboard'))
@@ -251,7 +232,7 @@ def delete_doctor(doctor_id):
 @login_required
 @role_required('admin')
 def list_patients():
-    pats = PatientProfile.query.order_by(PatientProfile.id.desc()).all()
+    pats = with_profile(read_query(PatientProfile), 'patient_row').order_by(PatientProfile.id.desc()).all()
     return render_template('patients_list.html', patients=pats)
 
 @main.route('/admin/patients/add', methods=['GET', 'POST'])
@@ -274,11 +255,8 @@ def add_patient():
 
         user = User(email=email, name=name, role='patient')
         user.set_password('Patient@123')
-        db.session.add(user)
-        db.session.commit()
-
-        pat = PatientProfile(user_id=user.id, contact=contact)
-        db.session.add(pat)
+        pat = PatientProfile(user=user, contact=contact)
+        db.session.add_all([user, pat])
         db.session.commit()
 
         flash('Patient added with default password: Patient@123', 'success')
@@ -328,8 +306,8 @@ def delete_patient(patient_id):
 def admin_view_doctor(doctor_id):
     return_url = request.args.get('next') or request.referrer
 
-    # Determine page from querystring
-    page = request.args.get('page', 1, type=int)
+    # Cursor of the page to show (opaque token from the pager links)
+    cursor = request.args.get('cursor')
 
     # # Load doctor basic info
     # from .models import DoctorProfile, Appointment  # import inline to avoid circulars
@@ -342,11 +320,11 @@ def admin_view_doctor(doctor_id):
         doctor = DoctorProfile.query.get_or_404(doctor_id)
 
     # Build appointment query for this doctor (upcoming and past both)
-    appt_q = (Appointment.query
-              .filter_by(doctor_id=doctor.id)
-              .order_by(Appointment.date.desc(), Appointment.time.desc()))  # show recent first
+    appt_q = with_profile(Appointment.query, 'appointment_row').filter_by(doctor_id=doctor.id)
 
-    appointments, pagination = paginate_query(appt_q, page)
+    # show recent first; keyset pages keep deep history pages as cheap as the first
+    pagination = keyset_paginate(appt_q, APPOINTMENTS_RECENT_FIRST, cursor, ITEMS_PER_PAGE, total_mode='estimate')
+    appointments = pagination.items
 
     return render_template(
         'doctor_profile_view.html',
@@ -492,7 +470,7 @@ def admin_whitelist_patient(patient_id):
 @validate_csrf
 def admin_view_patient(patient_id):
     return_url = request.args.get('next') or request.referrer
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
 
     from .models import PatientProfile, Appointment
     try:
@@ -503,11 +481,10 @@ def admin_view_patient(patient_id):
         current_app.logger.exception("Failed patient eager-load; falling back.")
         patient = PatientProfile.query.get_or_404(patient_id)
 
-    appt_q = (Appointment.query
-              .filter_by(patient_id=patient.id)
-              .order_by(Appointment.date.desc(), Appointment.time.desc()))
+    appt_q = with_profile(Appointment.query, 'appointment_row').filter_by(patient_id=patient.id)
 
-    appointments, pagination = paginate_query(appt_q, page)
+    pagination = keyset_paginate(appt_q, APPOINTMENTS_RECENT_FIRST, cursor, ITEMS_PER_PAGE, total_mode='estimate')
+    appointments = pagination.items
 
     return render_template(
         'patient_profile_view.html',
@@ -518,18 +495,25 @@ def admin_view_patient(patient_id):
         csrf_token=getattr(g, 'csrf_token', None)
     )
 
+APPOINTMENTS_PER_PAGE = 50
+STREAM_CHUNK_SIZE = 200
+
 @main.route('/admin/appointments')
 @login_required
 @role_required('admin')
 @validate_csrf
 def admin_appointments():
-    q = Appointment.query
+    q = with_profile(read_query(Appointment), 'appointment_row')
     # filters
     qstr = request.args.get('q')
     status = request.args.get('status')
     date_f = request.args.get('date')
     if qstr:
-        q = q.join(PatientProfile).join(User).filter((User.name.ilike(f'%{qstr}%')) | (Appointment.id==qstr))
+        match = icontains(User.name, qstr)
+        # only compare ids for numeric input (PostgreSQL rejects integer = text)
+        if qstr.strip().isdigit():
+            match = match | (Appointment.id == int(qstr))
+        q = q.join(PatientProfile).join(User).filter(match)
     if status:
         q = q.filter(Appointment.status==status)
     if date_f:
@@ -538,8 +522,19 @@ def admin_appointments():
             q = q.filter(Appointment.date==d)
         except:
             pass
-    appointments = q.order_by(Appointment.date.desc(), Appointment.time.desc()).all()
-    return render_template('appointment_list.html', appointments=appointments)
+    filters = {'q': qstr, 'status': status, 'date': date_f}
+
+    if request.args.get('stream') == '1':
+        # Streamed mode: every matching row, fetched from the cursor in chunks
+        # while the template is being sent, so memory stays flat.
+        appointments = q.order_by(*sort_clauses(APPOINTMENTS_RECENT_FIRST)).yield_per(STREAM_CHUNK_SIZE)
+        return stream_template('appointment_list.html', appointments=appointments,
+                               pagination=None, filters=filters, streaming=True)
+
+    pagination = keyset_paginate(q, APPOINTMENTS_RECENT_FIRST, request.args.get('cursor'),
+                                 APPOINTMENTS_PER_PAGE, total_mode='estimate')
+    return render_template('appointment_list.html', appointments=pagination.items,
+                           pagination=pagination, filters=filters, streaming=False)
 
 # Helper to safely retrieve appointment and check permissions (optional)
 def get_appt_or_404(appt_id):
@@ -640,28 +635,16 @@ def admin_create_appointment():
             flash('Selected doctor not found.', 'danger')
             return render_template('admin_appointment_form.html',patients=patients, doctors=doctors,next=return_url)
         
-        # Conflict check: same doctor, same date & time, and not cancelled/deleted
-        conflict = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            date=appt_date,
-            time=appt_time
-        ).filter(Appointment.status != 'Cancelled').first()
-
-        if conflict:
-            flash('Selected doctor already has an appointment at that date/time.', 'danger')
-            return render_template('admin_appointment_form.html',patients=patients, doctors=doctors,next=return_url)
-        # Create appointment
-  
-        try:
-            appt = Appointment(patient_id=patient.id, doctor_id=doctor_id, date=appt_date, time=appt_time, status='Booked')
-            db.session.add(appt)
-            db.session.commit()
-            flash(f"Appointment #{appt.id} booked successfully.", 'success')
+        # Atomic insert; fails only if an active appointment holds the slot
+        result = booking.book(patient.id, doctor_id, appt_date, appt_time)
+        if result.ok:
+            flash(f"Appointment #{result.appointment_id} booked successfully.", 'success')
             return redirect(url_for('main.admin_appointments') )
-        except IntegrityError:
-            db.session.rollback()
-            flash('Failed to book. Possible conflict', 'danger')
-            return redirect('admin_appointment_form.html',patients=patients, doctors=doctors)
+        if result.status == booking.CONFLICT:
+            flash('Selected doctor already has an appointment at that date/time.', 'danger')
+        else:
+            flash(result.message, 'danger')
+        return render_template('admin_appointment_form.html',patients=patients, doctors=doctors,next=return_url)
 
     # GET -> render the form only. 
     return render_template('admin_appointment_form.html',patients=patients, doctors=doctors)
@@ -742,6 +725,23 @@ def admin_delete_appointment(appt_id):
     flash(f'Appointment #{appt_id} deleted.', 'danger')
     return redirect(url_for('main.admin_appointments'))
 
+@main.route('/admin/metrics')
+@login_required
+@role_required('admin')
+def admin_metrics():
+    snapshot = metrics.snapshot()
+    budgets = {ep: metrics.query_budget(current_app, ep) for ep in snapshot}
+    return render_template('admin_metrics.html', stats=snapshot, budgets=budgets)
+
+@main.route('/admin/metrics/reset', methods=['POST'])
+@login_required
+@role_required('admin')
+@validate_csrf
+def admin_metrics_reset():
+    metrics.reset()
+    flash('Metrics reset', 'info')
+    return redirect(url_for('main.admin_metrics'))
+
 # ---------- DOCTOR ----------
 @main.route('/doctor')
 @login_required
@@ -754,30 +754,9 @@ def doctor_dashboard():
         flash('Doctor profile missing', 'danger')
         return redirect(url_for('main.logout'))
 
-    now = datetime.now()
-
-    # Fetch all appointments for this doctor (ordered by date/time ascending)
-    all_appts = (
-        Appointment.query
-        .filter_by(doctor_id=doc.id)
-        .order_by(Appointment.date, Appointment.time)
-        .all()
-    )
-
-    upcoming_appts = [
-        a for a in all_appts
-        if (a.date > now.date() or (a.date == now.date() and a.time >= now.time()))
-           and a.status == 'Booked' 
-    ]
-
-    past_appts = [
-        a for a in all_appts
-        if (a.date < now.date() or (a.date == now.date() and a.time < now.time()) or a.status in ['Completed', 'Cancelled'])
-    ]
-
-    # Get last N past appointments (most recent first)
-    past_appts_sorted_desc = sorted(past_appts, key=lambda x: (x.date, x.time), reverse=True)
-    recent_appointments = past_appts_sorted_desc[:LAST_N]
+    # counts, upcoming window and last N past visits, all bounded in SQL
+    data = doctor_dashboard_data(doc.id)
+    recent_appointments = data['recent'][:LAST_N]
 
     today = date.today()
     dates = [today + timedelta(days=i) for i in range(7)]
@@ -798,8 +777,9 @@ def doctor_dashboard():
     return render_template(
         'doctor_dashboard.html',
         doctor=doc,
-        appointments=upcoming_appts,
-        all_appointments=all_appts,
+        appointments=data['upcoming'],
+        more_upcoming=data['more_upcoming'],
+        counts=data['counts'],
         recent_appointments=recent_appointments, 
         display_dates=display_dates,
         availability=availability
@@ -854,15 +834,6 @@ def doctor_cancel_appointment(appt_id):
     flash('Appointment cancelled', 'info')
     return redirect(url_for('main.doctor_dashboard'))
 
-TIME_RE = re.compile(r'^\d{2}:\d{2}$')
-
-def valid_time_str(s):
-    return bool(s and TIME_RE.match(s))
-
-def parse_time(s):
-    hh, mm = map(int, s.split(':'))
-    return time(hh, mm)
-
 @main.route('/doctor/availability', methods=['GET', 'POST'])
 @login_required
 @role_required('doctor')
@@ -879,13 +850,10 @@ def doctor_availability():
     date_keys = [d.isoformat() for d in dates]  # "YYYY-MM-DD"
 
     if request.method == 'POST':
-        # Clear all availability rows if requested
+        # Clear all availability rows if requested (days the weekly template covers become days off)
         if request.form.get("clear_all") == "1":
             try:
-                db.session.query(DoctorAvailability).filter(
-                    DoctorAvailability.doctor_id == doctor.id,
-                    DoctorAvailability.date.in_(dates)
-                ).delete(synchronize_session=False)
+                schedules.save_availability([(doctor.id, d, None) for d in dates])
                 db.session.commit()
                 flash("Cleared availability for the next 7 days.", "info")
                 return redirect(url_for('main.doctor_availability'))
@@ -895,43 +863,15 @@ def doctor_availability():
                 flash("Failed to clear availability. Try again.", "danger")
                 return redirect(url_for('main.doctor_availability'))
 
-        # Otherwise, read fields for each day and upsert or delete
-        errors = []
+        # Otherwise validate every day, then save the week in one bulk pass
         try:
-            for d in dates:
-                key = d.isoformat()
-                s = (request.form.get(f'{key}_start') or '').strip()
-                e = (request.form.get(f'{key}_end') or '').strip()
-
-                # If both empty => ensure deletion of any existing row for that date
-                if not s and not e:
-                    existing = DoctorAvailability.query.filter_by(doctor_id=doctor.id, date=d).first()
-                    if existing:
-                        db.session.delete(existing)
-                    continue
-
-                # validate times
-                if not (valid_time_str(s) and valid_time_str(e)):
-                    raise ValueError(f"Invalid time for {key}: use HH:MM (or leave empty).")
-
-                start_t = parse_time(s)
-                end_t = parse_time(e)
-                if start_t >= end_t:
-                    raise ValueError(f"For {d.strftime('%A %Y-%m-%d')}, start must be before end.")
-
-                # upsert
-                avail = DoctorAvailability.query.filter_by(doctor_id=doctor.id, date=d).first()
-                if not avail:
-                    avail = DoctorAvailability(doctor_id=doctor.id, date=d, start_time=start_t, end_time=end_t)
-                    db.session.add(avail)
-                else:
-                    avail.start_time = start_t
-                    avail.end_time = end_t
-                    avail.updated_at = datetime.utcnow()
-
+            entries = [(doctor.id, d, schedules.parse_window(d, request.form.get(f'{d.isoformat()}_start'),
+                                                             request.form.get(f'{d.isoformat()}_end')))
+                       for d in dates]
+            schedules.save_availability(entries)
             db.session.commit()
             flash("Availability for next 7 days saved.", "success")
-            return redirect(url_for('doctor.doctor_availability_next7'))
+            return redirect(url_for('main.doctor_availability'))
 
         except ValueError as ve:
             db.session.rollback()
@@ -960,71 +900,120 @@ def doctor_availability():
                             display_dates=display_dates,
                             form_values=form_values
                            )
+@main.route('/doctor/availability/weekly', methods=['GET', 'POST'])
+@login_required
+@role_required('doctor')
+@validate_csrf
+def doctor_weekly_availability():
+    """Recurring weekly template and days off, materialized into daily availability."""
+    doctor = DoctorProfile.query.filter_by(user_id=current_user.id).first()
+    if not doctor:
+        flash("Doctor profile not found.", "danger")
+        return redirect(url_for('main.index'))
+
+    templates = {t.weekday: t for t in AvailabilityTemplate.query.filter_by(doctor_id=doctor.id)}
+
+    if request.method == 'POST':
+        action = request.form.get('action') or 'save_template'
+        try:
+            if action == 'add_exception':
+                day = datetime.strptime(request.form.get('exception_date') or '', '%Y-%m-%d').date()
+                if not AvailabilityException.query.filter_by(doctor_id=doctor.id, date=day).first():
+                    db.session.add(AvailabilityException(doctor_id=doctor.id, date=day,
+                                                         reason=(request.form.get('reason') or '').strip() or None))
+            elif action == 'remove_exception':
+                exc = AvailabilityException.query.filter_by(id=request.form.get('exception_id', type=int),
+                                                            doctor_id=doctor.id).first()
+                if exc:
+                    db.session.delete(exc)
+            else:
+                for weekday in range(7):
+                    window = schedules.parse_weekday_window(weekday, request.form.get(f'w{weekday}_start'),
+                                                            request.form.get(f'w{weekday}_end'))
+                    existing = templates.get(weekday)
+                    if window is None:
+                        if existing:
+                            db.session.delete(existing)
+                        continue
+                    start_t, end_t = window
+                    if existing:
+                        existing.start_time, existing.end_time = start_t, end_t
+                    else:
+                        db.session.add(AvailabilityTemplate(doctor_id=doctor.id, weekday=weekday,
+                                                            start_time=start_t, end_time=end_t))
+            db.session.flush()
+            result = schedules.materialize([doctor.id])
+            db.session.commit()
+            flash(f"Weekly schedule saved; {result['written']} day(s) scheduled.", "success")
+            return redirect(url_for('main.doctor_weekly_availability'))
+        except ValueError as ve:
+            db.session.rollback()
+            flash(str(ve) if action == 'save_template' else 'Invalid date.', "danger")
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Failed to save weekly availability")
+            flash("Failed to save weekly schedule. Try again.", "danger")
+        templates = {t.weekday: t for t in AvailabilityTemplate.query.filter_by(doctor_id=doctor.id)}
+
+    week = [(i, name,
+             templates[i].start_time.strftime('%H:%M') if i in templates else '',
+             templates[i].end_time.strftime('%H:%M') if i in templates else '')
+            for i, name in enumerate(schedules.WEEKDAYS)]
+    exceptions = (AvailabilityException.query
+                  .filter(or_(AvailabilityException.doctor_id == doctor.id, AvailabilityException.doctor_id.is_(None)),
+                          AvailabilityException.date >= date.today())
+                  .order_by(AvailabilityException.date).all())
+    return render_template('doctor_weekly_availability.html', doctor=doctor, week=week,
+                           exceptions=exceptions, horizon=schedules.horizon_days())
+
 RESULTS_PER_PAGE = 10
 
 @main.route('/doctors/search')
 @login_required
+@conditional('doctors', private=True)
 def doctor_search():
  
     q = (request.args.get('q') or '').strip()
     specialty = (request.args.get('specialty') or '').strip()
-    try:
-        page = max(1, int(request.args.get('page', 1)))
-    except ValueError:
-        page = 1
+    cursor = request.args.get('cursor')
     try:
         per_page = max(5, min(50, int(request.args.get('per_page', RESULTS_PER_PAGE))))
     except ValueError:
         per_page = RESULTS_PER_PAGE
 
-    # Build base query
-    query = DoctorProfile.query.options(joinedload(DoctorProfile.user))
+    # Build base query; the join to User is needed for the name ordering anyway
+    query = (read_query(DoctorProfile)
+             .join(DoctorProfile.user)
+             .options(contains_eager(DoctorProfile.user)))
 
     # Exclude blacklisted doctors by default (optional)
     query = query.filter(DoctorProfile.is_blacklisted == False)
+    base_query = query
+
+    # fuzzy=1: typo-tolerant matches from the trigram directory (set when the
+    # exact search found nothing, and kept on the pager links)
+    fuzzy = bool(q) and request.args.get('fuzzy') == '1'
 
     # Apply search filters
-    if q:
-        # search across user.name and user.email
-        wildcard = f"%{q}%"
-        # join to user via relationship attribute; SQLAlchemy will join for us via filter on related column
-        query = query.join(DoctorProfile.user).filter(
-            or_(
-                User.name.ilike(wildcard),
-                User.email.ilike(wildcard),
-                DoctorProfile.specialization.ilike(wildcard)
-            )
-        )
+    if fuzzy:
+        query = query.filter(DoctorProfile.id.in_(directory.fuzzy_doctor_ids(q)))
+    elif q:
+        # name, email and specialization via the full-text index (prefix match per word)
+        query = query.filter(search_index.match_criterion('doctor', q))
     elif specialty:
-        wildcard = f"%{specialty}%"
-        query = query.filter(DoctorProfile.specialization.ilike(wildcard))
+        query = query.filter(icontains(DoctorProfile.specialization, specialty))
 
-    # total count for pagination (runs a COUNT query)
-    try:
-        total = query.order_by(None).count()
-    except Exception:
-        current_app.logger.exception("Count failed for doctor search")
-        total = 0
-
-    # ordering: by name
-    query = query.join(DoctorProfile.user).order_by(User.name.asc())
-
-    # pagination
-    offset = (page - 1) * per_page
-    results = query.offset(offset).limit(per_page).all()
-
-    # Prepare simple result summary for template
-    pages = (total + per_page - 1) // per_page if total else 1
-    pagination = {
-        'page': page,
-        'per_page': per_page,
-        'total': total,
-        'pages': pages,
-        'has_prev': page > 1,
-        'has_next': page < pages,
-        'prev_page': page - 1 if page > 1 else None,
-        'next_page': page + 1 if page < pages else None,
-    }
+    # keyset pagination ordered by name; the count is capped so it stays cheap
+    pagination = keyset_paginate(query, by_user_name(DoctorProfile), cursor, per_page, total_mode='estimate')
+
+    # Nothing found for the exact words: retry typo tolerant ("cardiolgy" -> Cardiology)
+    if q and not fuzzy and not cursor and not pagination.items:
+        ids = directory.fuzzy_doctor_ids(q)
+        if ids:
+            fuzzy = True
+            query = base_query.filter(DoctorProfile.id.in_(ids))
+            pagination = keyset_paginate(query, by_user_name(DoctorProfile), None, per_page, total_mode='estimate')
+    results = pagination.items
 
     # Render template
     return render_template(
@@ -1032,9 +1021,12 @@ def doctor_search():
         results=results,
         q=q,
         specialty=specialty,
-        pagination=pagination
+        pagination=pagination,
+        fuzzy=fuzzy
     )
 # ---------- PATIENT ----------
+EARLIEST_RESULTS = 8
+
 @main.route('/patient')
 @login_required
 @role_required('patient')
@@ -1046,72 +1038,37 @@ def patient_dashboard():
         flash('Patient profile missing', 'danger')
         return redirect(url_for('main.logout'))
 
-    # now and today for comparisons
-    now_dt = datetime.now()
-    today = now_dt.date()
-    now_time = now_dt.time()
-    total_count = db.session.query(func.count(Appointment.id)).filter(Appointment.patient_id == patient.id).scalar() or 0
-    completed_count = db.session.query(func.count(Appointment.id)).filter(
-        Appointment.patient_id == patient.id, Appointment.status == 'Completed').scalar() or 0
-    cancelled_count = db.session.query(func.count(Appointment.id)).filter(
-        Appointment.patient_id == patient.id, Appointment.status == 'Cancelled').scalar() or 0
-    booked_count = db.session.query(func.count(Appointment.id)).filter(
-        Appointment.patient_id == patient.id, Appointment.status == 'Booked').scalar() or 0
-
-    upcoming_filter = and_(
-        Appointment.patient_id == patient.id,
-        Appointment.status != 'Cancelled',
-        or_(
-            Appointment.date > today,
-            and_(Appointment.date == today, Appointment.time >= now_time)
-        )
-    )
-    upcoming = (
-        Appointment.query
-        .options(
-            joinedload(Appointment.doctor).joinedload(DoctorProfile.user)  # <- fixed
-        )
-        .filter(upcoming_filter)
-        .order_by(Appointment.date.asc(), Appointment.time.asc())
-        .all()
-    )
-
-    # Past appointments
-    past_filter = and_(
-        Appointment.patient_id == patient.id,
-        or_(
-            Appointment.date < today,
-            and_(Appointment.date == today, Appointment.time < now_time)
-        )
-    )
-    past = (
-        Appointment.query
-        .options(
-            joinedload(Appointment.doctor).joinedload(DoctorProfile.user)  # <- fixed
-        )
-        .filter(past_filter)
-        .order_by(Appointment.date.desc(), Appointment.time.desc())
-        .all()
-    )
-
-    # ------- Last 5 past (already ordered desc) -------
-    recent_appointments = past[:5]
+    # counts, upcoming window and one page of history in two queries
+    data = patient_dashboard_data(patient.id, past_cursor=request.args.get('past'))
 
     # ------- Departments (same data you were passing before) -------
     departments = Department.query.order_by(Department.name).all()
 
+    # ------- Earliest available slots across doctors (?dept=&spec=) -------
+    earliest_dept = request.args.get('dept', type=int)
+    earliest_spec = (request.args.get('spec') or '').strip()
+    earliest = None
+    if earliest_dept or earliest_spec:
+        earliest = slots.earliest_available(earliest_dept, earliest_spec, limit=EARLIEST_RESULTS)
+
     return render_template(
         'patient_dashboard.html',
         patient=patient,
-        upcoming=upcoming,
-        past=past,
-        recent_appointments=recent_appointments,
+        upcoming=data['upcoming'],
+        more_upcoming=data['more_upcoming'],
+        past=data['past'],
+        past_is_latest=data['past_is_latest'],
+        past_older_cursor=data['past_older_cursor'],
+        recent_appointments=data['recent'],
         all_appointments=None,
         departments=departments,
-        total=total_count,
-        completed=completed_count,
-        cancelled=cancelled_count,
-        booked=booked_count
+        earliest=earliest,
+        earliest_dept=earliest_dept,
+        earliest_spec=earliest_spec,
+        total=data['counts']['total'],
+        completed=data['counts']['Completed'],
+        cancelled=data['counts']['Cancelled'],
+        booked=data['counts']['Booked']
     )
 
 @main.route('/patient/book', methods=['GET', 'POST'])
@@ -1138,24 +1095,59 @@ def book_appointment():
             flash('Cannot book an appointment in the past', 'danger')
             return redirect(url_for('main.book_appointment'))
 
-        conflict = Appointment.query.filter_by(doctor_id=doctor_id, date=date_obj, time=time_obj).first()
-        if conflict:
-            flash('Selected slot already booked', 'danger')
-            return redirect(url_for('main.book_appointment'))
+        # must be one of the doctor's free slots (inside an availability window,
+        # not taken, not held by someone else)
+        if not slots.is_free(doctor_id, date_obj, time_obj, patient_id=current_user.patient.id):
+            flash('Selected slot is not available', 'danger')
+            return redirect(url_for('main.book_appointment', doctor_id=doctor_id, date=date_str))
 
-        appt = Appointment(patient_id=current_user.patient.id, doctor_id=doctor_id, date=date_obj, time=time_obj, status='Booked')
-        db.session.add(appt)
-        try:
-            db.session.commit()
-            flash('Appointment booked', 'success')
+        result = booking.book(current_user.patient.id, doctor_id, date_obj, time_obj)
+        if result.ok:
+            flash(result.message, 'success')
             return redirect(url_for('main.patient_dashboard'))
-        except IntegrityError:
-            db.session.rollback()
-            flash('Failed to book. Possible conflict', 'danger')
-            return redirect(url_for('main.book_appointment'))
+        flash(result.message, 'danger')
+        return redirect(url_for('main.book_appointment', doctor_id=doctor_id, date=date_str))
+
+    doctors = with_profile(DoctorProfile.query, 'doctor_row').all()
+
+    # ?doctor_id=&date= preselects a doctor/day and lists its free times
+    selected_doctor = request.args.get('doctor_id', type=int)
+    selected_date = request.args.get('date') or ''
+    free_times = None
+    if selected_doctor and selected_date:
+        try:
+            day = datetime.strptime(selected_date, '%Y-%m-%d').date()
+            free = slots.free_slots([selected_doctor], day, day, patient_id=current_user.patient.id)
+            free_times = [t.strftime('%H:%M') for _, t in free[selected_doctor]]
+        except ValueError:
+            selected_date = ''
+    return render_template('appointment_form.html', doctors=doctors, selected_doctor=selected_doctor,
+                           selected_date=selected_date, free_times=free_times)
+
+@main.route('/patient/hold', methods=['POST'])
+@login_required
+@role_required('patient')
+@validate_csrf
+def hold_slot():
+    """Hold doctor_id/date/time (JSON or form) while the patient finishes booking."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        doctor_id = int(data.get('doctor_id'))
+        date_obj = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
+        time_obj = datetime.strptime(data.get('time'), '%H:%M').time()
+    except (ValueError, TypeError):
+        return jsonify({'error': 'doctor_id, date (YYYY-MM-DD) and time (HH:MM) are required'}), 400
+    result = holds.place(current_user.patient.id, doctor_id, date_obj, time_obj)
+    code = 201 if result.ok else 409 if result.status == holds.CONFLICT else 503
+    return jsonify(result.as_dict()), code
 
-    doctors = DoctorProfile.query.all()
-    return render_template('appointment_form.html', doctors=doctors)
+@main.route('/patient/hold/<int:hold_id>/release', methods=['POST'])
+@login_required
+@role_required('patient')
+@validate_csrf
+def release_slot_hold(hold_id):
+    released = holds.release(hold_id, current_user.patient.id)
+    return jsonify({'released': released}), 200 if released else 404
 
 @main.route('/patient/appointment/<int:appt_id>/reschedule', methods=['POST'])
 @login_required
@@ -1177,22 +1169,8 @@ def reschedule_appointment(appt_id):
         flash('Invalid input for reschedule', 'danger')
         return redirect(url_for('main.patient_dashboard'))
 
-    conflict = Appointment.query.filter_by(doctor_id=doctor_id, date=date_obj, time=time_obj).first()
-    if conflict and conflict.id != appt.id:
-        flash('Selected slot already booked', 'danger')
-        return redirect(url_for('main.patient_dashboard'))
-
-    appt.date = date_obj
-    appt.time = time_obj
-    appt.doctor_id = doctor_id
-    appt.status = 'Booked'
-    try:
-        db.session.commit()
-        flash('Appointment rescheduled', 'success')
-    except IntegrityError:
-        db.session.rollback()
-        flash('Failed to reschedule due to conflict', 'danger')
-
+    result = booking.reschedule(appt, doctor_id, date_obj, time_obj)
+    flash(result.message, 'success' if result.ok else 'danger')
     return redirect(url_for('main.patient_dashboard'))
 
 @main.route('/patient/appointment/<int:appt_id>/cancel', methods=['POST'])
@@ -1210,6 +1188,9 @@ def cancel_appointment(appt_id):
     return redirect(url_for('main.patient_dashboard'))
 
 # ---------- SEARCH & VIEWS ----------
+SEARCH_LIMIT = 50
+SLOTS_MAX_DOCTORS = 500
+
 @main.route('/search')
 @login_required
 def search():
@@ -1219,25 +1200,30 @@ def search():
         flash('Enter search text', 'warning')
         return redirect(url_for('views.index'))
 
+    # best matches first, straight from the full-text index
     if by == 'doctor':
-        docs = DoctorProfile.query.join(User).filter(
-            (User.name.ilike(f'%{q}%')) | (DoctorProfile.specialization.ilike(f'%{q}%'))
-        ).all()
+        ids = search_index.ranked_ids('doctor', q, limit=SEARCH_LIMIT)
+        found = with_profile(DoctorProfile.query, 'doctor_row').filter(DoctorProfile.id.in_(ids)).all()
+        rank = {pid: i for i, pid in enumerate(ids)}
+        docs = sorted(found, key=lambda d: rank[d.id])
         return render_template('doctors_list.html', doctors=docs, q=q)
     else:
-        pats = PatientProfile.query.join(User).filter(
-            (User.name.ilike(f'%{q}%')) | (PatientProfile.contact.ilike(f'%{q}%'))
-        ).all()
+        ids = search_index.ranked_ids('patient', q, limit=SEARCH_LIMIT)
+        found = with_profile(PatientProfile.query, 'patient_row').filter(PatientProfile.id.in_(ids)).all()
+        rank = {pid: i for i, pid in enumerate(ids)}
+        pats = sorted(found, key=lambda p: rank[p.id])
         return render_template('patients_list.html', patients=pats, q=q)
 
 @main.route('/doctors')
 @login_required
+@conditional('doctors', private=True)
 def list_all_doctors():
-    docs = DoctorProfile.query.all()
+    docs = with_profile(read_query(DoctorProfile), 'doctor_row').all()
     return render_template('doctors_list.html', doctors=docs)
 
 @main.route('/doctors/<int:doctor_id>')
 @login_required
+@conditional('doctors', private=True)
 def view_doctor(doctor_id):
     doc = DoctorProfile.query.get_or_404(doctor_id)
     return render_template('doctor_profile_view.html', doctor=doc)
@@ -1245,7 +1231,7 @@ def view_doctor(doctor_id):
 @main.route('/patients')
 @login_required
 def list_all_patients():
-    patient_list = PatientProfile.query.all()
+    patient_list = with_profile(read_query(PatientProfile), 'patient_row').all()
     return render_template('patients_list.html', patients=patient_list)
 
 @main.route('/patients/<int:patient_id>')
@@ -1266,14 +1252,77 @@ def view_patient(patient_id):
 @main.route('/api/doctor/<int:doc_id>/appointments')
 @login_required
 def api_doctor_appointments(doc_id):
-    appts = Appointment.query.filter_by(doctor_id=doc_id).all()
-    out = []
-    for a in appts:
-        out.append({
-            'id': a.id,
-            'date': a.date.isoformat(),
-            'time': a.time.strftime('%H:%M'),
-            'status': a.status,
-            'patient_name': a.patient.user.name
-        })
+    # one SELECT with the patient name joined in, no ORM objects
+    rows = (read_query(Appointment.id, Appointment.date, Appointment.time, Appointment.status, User.name)
+            .select_from(Appointment)
+            .outerjoin(PatientProfile, PatientProfile.id == Appointment.patient_id)
+            .outerjoin(User, User.id == PatientProfile.user_id)
+            .filter(Appointment.doctor_id == doc_id)
+            .order_by(Appointment.date, Appointment.time)
+            .all())
+    out = [{
+        'id': appt_id,
+        'date': on_date.isoformat(),
+        'time': at_time.strftime('%H:%M'),
+        'status': status,
+        'patient_name': patient_name,
+    } for appt_id, on_date, at_time, status, patient_name in rows]
     return jsonify(out)
+
+
+@main.route('/api/doctors/autocomplete')
+@login_required
+def api_doctor_autocomplete():
+    """Search box suggestions for ?q=, typo tolerant; at most ?limit= (default 10)."""
+    q = (request.args.get('q') or '').strip()
+    try:
+        limit = max(1, min(directory.MAX_SUGGESTIONS, int(request.args.get('limit', directory.MAX_SUGGESTIONS))))
+    except ValueError:
+        limit = directory.MAX_SUGGESTIONS
+    return jsonify(directory.suggest(q, limit) if q else [])
+
+
+@main.route('/api/slots')
+@login_required
+def api_free_slots():
+    """
+    Free slots for ?doctor_id=1&doctor_id=2 (or doctor_ids=1,2) between
+    ?start= and ?end= (YYYY-MM-DD, default: the next 7 days).
+    """
+    try:
+        ids = [int(v) for raw in request.args.getlist('doctor_id') + request.args.getlist('doctor_ids')
+               for v in raw.split(',') if v.strip()]
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else date.today()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': 'doctor ids must be integers and dates YYYY-MM-DD'}), 400
+    if not ids:
+        return jsonify({'error': 'doctor_id is required'}), 400
+    if len(set(ids)) > SLOTS_MAX_DOCTORS:
+        return jsonify({'error': f'At most {SLOTS_MAX_DOCTORS} doctors per request'}), 400
+    try:
+        slots.check_range(start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # a patient's own hold still shows as free to them
+    patient_id = current_user.patient.id if current_user.role == 'patient' and current_user.patient else None
+    data = slots.slots_json(slots.free_slots(ids, start, end, patient_id=patient_id))
+    data.update(start=start.isoformat(), end=end.isoformat())
+    return jsonify(data)
+
+
+@main.route('/api/doctor/<int:doc_id>/calendar')
+@login_required
+def api_doctor_calendar(doc_id):
+    """Appointments and availability for ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: next 7 days)."""
+    is_owner = current_user.role == 'doctor' and current_user.doctor and current_user.doctor.id == doc_id
+    if current_user.role != 'admin' and not is_owner:
+        return jsonify({'error': 'Access denied'}), 403
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else date.today()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if end < start or (end - start).days >= CALENDAR_MAX_DAYS:
+        return jsonify({'error': f'Range must be 1 to {CALENDAR_MAX_DAYS} days'}), 400
+    return jsonify(doctor_calendar(doc_id, start, end))
@@ -0,0 +1,236 @@
+"""
+Recurring weekly availability, and bulk saves of daily availability.
+
+Doctors keep one window per weekday in AvailabilityTemplate, plus
+AvailabilityException days off (doctor_id NULL = holiday for everyone).
+materialize() turns them into DoctorAvailability rows for the next
+AVAILABILITY_HORIZON_DAYS days in one set-based pass:
+
+    1 SELECT of the templates, 1 SELECT of the exceptions,
+    1 batched INSERT ... ON CONFLICT (doctor_id, date) DO UPDATE,
+    1 DELETE of template rows that no longer apply,
+    1 DELETE of rows on days off (only when there are any).
+
+Rows the doctor edited by hand (source 'manual') are never overwritten by
+the template, but a day off removes them too. Run it for everyone with
+`flask materialize-availability` (e.g. nightly, so the horizon keeps rolling
+forward); saving a template re-materializes that doctor straight away.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, tuple_
+
+from .models import db, AvailabilityTemplate, AvailabilityException, DoctorAvailability
+from .storage import dialect_insert
+
+DEFAULT_HORIZON_DAYS = 28
+TIME_RE = re.compile(r'^\d{2}:\d{2}$')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def horizon_days():
+    return current_app.config.get('AVAILABILITY_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)
+
+
+def planned_rows(templates, exceptions, start, days, stamp):
+    """
+    DoctorAvailability rows (dicts) for start .. start + days - 1.
+
+    templates:  [(doctor_id, weekday, start_time, end_time)]
+    exceptions: [(doctor_id or None, date)]
+    """
+    weekly = {}
+    for doctor_id, weekday, start_time, end_time in templates:
+        weekly.setdefault(doctor_id, {})[weekday] = (start_time, end_time)
+    holidays = {d for doctor_id, d in exceptions if doctor_id is None}
+    days_off = {(doctor_id, d) for doctor_id, d in exceptions if doctor_id is not None}
+
+    rows = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day in holidays:
+            continue
+        weekday = day.weekday()
+        for doctor_id, week in weekly.items():
+            window = week.get(weekday)
+            if window is None or (doctor_id, day) in days_off:
+                continue
+            rows.append({
+                'doctor_id': doctor_id,
+                'date': day,
+                'start_time': window[0],
+                'end_time': window[1],
+                'source': 'template',
+                'created_at': stamp,
+                'updated_at': stamp,
+            })
+    return rows
+
+
+def materialize(doctor_ids=None, start=None, days=None):
+    """
+    Write the template windows of `doctor_ids` (default: every doctor with a
+    template) into DoctorAvailability. Runs on db.session; the caller commits.
+    Returns {'written': n, 'removed': n}.
+    """
+    start = start or date.today()
+    days = days or horizon_days()
+    end = start + timedelta(days=days - 1)
+    stamp = datetime.utcnow()
+
+    tq = db.session.query(AvailabilityTemplate.doctor_id, AvailabilityTemplate.weekday,
+                          AvailabilityTemplate.start_time, AvailabilityTemplate.end_time)
+    eq = (db.session.query(AvailabilityException.doctor_id, AvailabilityException.date)
+          .filter(AvailabilityException.date >= start, AvailabilityException.date <= end))
+    if doctor_ids is not None:
+        tq = tq.filter(AvailabilityTemplate.doctor_id.in_(doctor_ids))
+        eq = eq.filter(or_(AvailabilityException.doctor_id.is_(None),
+                           AvailabilityException.doctor_id.in_(doctor_ids)))
+    exceptions = eq.all()
+    rows = planned_rows(tq.all(), exceptions, start, days, stamp)
+
+    table = DoctorAvailability.__table__
+    conn = db.session.connection()
+    if rows:
+        stmt = dialect_insert(table, conn)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.doctor_id, table.c.date],
+            set_={
+                'start_time': stmt.excluded.start_time,
+                'end_time': stmt.excluded.end_time,
+                'updated_at': stmt.excluded.updated_at,
+            },
+            where=(table.c.source == 'template'),
+        )
+        conn.execute(stmt, rows)  # one executemany
+
+    # template rows in the horizon that this run did not touch no longer apply
+    stale = table.delete().where(
+        table.c.source == 'template',
+        table.c.date >= start, table.c.date <= end,
+        or_(table.c.updated_at.is_(None), table.c.updated_at < stamp),
+    )
+    if doctor_ids is not None:
+        stale = stale.where(table.c.doctor_id.in_(doctor_ids))
+    removed = conn.execute(stale).rowcount
+
+    # days off win over hand-edited rows as well
+    holidays = [d for doctor_id, d in exceptions if doctor_id is None]
+    days_off = [(doctor_id, d) for doctor_id, d in exceptions if doctor_id is not None]
+    conditions = []
+    if holidays:
+        conditions.append(table.c.date.in_(holidays))
+    if days_off:
+        conditions.append(tuple_(table.c.doctor_id, table.c.date).in_(days_off))
+    if conditions:
+        off = table.delete().where(or_(*conditions))
+        if doctor_ids is not None:
+            off = off.where(table.c.doctor_id.in_(doctor_ids))
+        removed += conn.execute(off).rowcount
+    return {'written': len(rows), 'removed': removed}
+
+
+# ----------------------
+# Daily availability, many rows at once
+# ----------------------
+def parse_window(day, start_str, end_str):
+    """
+    (start_time, end_time) from HH:MM strings, or None when both are blank
+    (= not available that day). Raises ValueError with a user-facing message.
+    """
+    return _window(start_str, end_str, day.isoformat(), day.strftime('%A %Y-%m-%d'))
+
+
+def parse_weekday_window(weekday, start_str, end_str):
+    """parse_window() for a weekday (0 = Monday) of the weekly template."""
+    return _window(start_str, end_str, WEEKDAYS[weekday], WEEKDAYS[weekday])
+
+
+def _window(start_str, end_str, name, long_name):
+    start_str = '' if start_str is None else str(start_str).strip()
+    end_str = '' if end_str is None else str(end_str).strip()
+    if not start_str and not end_str:
+        return None
+    try:
+        if not (TIME_RE.match(start_str) and TIME_RE.match(end_str)):
+            raise ValueError
+        start_t = time(*map(int, start_str.split(':')))
+        end_t = time(*map(int, end_str.split(':')))
+    except ValueError:
+        raise ValueError(f"Invalid time for {name}: use HH:MM (or leave empty).")
+    if start_t >= end_t:
+        raise ValueError(f"For {long_name}, start must be before end.")
+    return start_t, end_t
+
+
+def save_availability(entries):
+    """
+    Apply [(doctor_id, date, (start_time, end_time) or None)] to
+    DoctorAvailability: a window upserts the day, None clears it. Rows are
+    marked 'manual'; clearing a day on a weekday of the doctor's weekly
+    template also records a day off. One SELECT of the affected rows, then
+    one batched upsert of the changed windows and one DELETE of the cleared
+    days (each only when needed). Runs on db.session; the caller commits.
+    Returns {'saved': n, 'cleared': n, 'unchanged': n}.
+    """
+    wanted = {(doctor_id, day): window for doctor_id, day, window in entries}
+    result = {'saved': 0, 'cleared': 0, 'unchanged': 0}
+    if not wanted:
+        return result
+
+    table = DoctorAvailability.__table__
+    conn = db.session.connection()
+    existing = {
+        (r.doctor_id, r.date): (r.start_time, r.end_time)
+        for r in conn.execute(
+            table.select()
+            .with_only_columns(table.c.doctor_id, table.c.date, table.c.start_time, table.c.end_time)
+            .where(tuple_(table.c.doctor_id, table.c.date).in_(list(wanted))))
+    }
+
+    stamp = datetime.utcnow()
+    upserts, clears = [], []
+    for key, window in wanted.items():
+        current = existing.get(key)
+        if window is None:
+            if current is not None:
+                clears.append(key)
+            else:
+                result['unchanged'] += 1
+        elif current == window:
+            result['unchanged'] += 1
+        else:
+            upserts.append({'doctor_id': key[0], 'date': key[1], 'start_time': window[0],
+                            'end_time': window[1], 'source': 'manual',
+                            'created_at': stamp, 'updated_at': stamp})
+
+    if upserts:
+        stmt = dialect_insert(table, conn)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.doctor_id, table.c.date],
+            set_={
+                'start_time': stmt.excluded.start_time,
+                'end_time': stmt.excluded.end_time,
+                'source': stmt.excluded.source,
+                'updated_at': stmt.excluded.updated_at,
+            },
+        )
+        conn.execute(stmt, upserts)
+    if clears:
+        conn.execute(table.delete().where(tuple_(table.c.doctor_id, table.c.date).in_(clears)))
+        # a cleared day the template covers becomes a day off, or the next
+        # materialize() would refill it (whether the row came from the template or not)
+        tt = AvailabilityTemplate.__table__
+        weekly = {(r.doctor_id, r.weekday) for r in conn.execute(
+            tt.select().with_only_columns(tt.c.doctor_id, tt.c.weekday)
+            .where(tt.c.doctor_id.in_({doctor_id for doctor_id, _ in clears})))}
+        days_off = [(d, day) for d, day in clears if (d, day.weekday()) in weekly]
+        if days_off:
+            exc = AvailabilityException.__table__
+            stmt = dialect_insert(exc, conn).on_conflict_do_nothing(index_elements=[exc.c.doctor_id, exc.c.date])
+            conn.execute(stmt, [{'doctor_id': d, 'date': day, 'reason': 'Cleared', 'created_at': stamp}
+                                for d, day in days_off])
+    result['saved'], result['cleared'] = len(upserts), len(clears)
+    return result
@@ -0,0 +1,160 @@
+"""
+Schema upgrades for existing databases.
+
+db.create_all() only creates missing tables; it never touches tables that
+already exist. upgrade_schema() also adds missing columns and indexes so an
+old hms.db picks up schema changes made in app/models.py, and drops the
+unique constraints listed in RETIRED_CONSTRAINTS (on SQLite, which cannot
+drop a constraint, by rebuilding the table). It is idempotent and runs on
+every start (create_database) and via `flask upgrade-db`.
+Several workers starting at once are serialized: the whole upgrade runs in
+one transaction that first takes the write lock (BEGIN IMMEDIATE on SQLite,
+an advisory lock on PostgreSQL) and only then inspects the schema, so the
+first worker does the work and the others find nothing left to do.
+
+check_index_usage() runs the hot-path queries through EXPLAIN QUERY PLAN and
+reports any that do not use the index they were designed for.
+"""
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from . import db
+
+
+SCHEMA_LOCK_KEY = 7_001_007  # pg_advisory_xact_lock key
+
+# (table, constraint) pairs old databases may still have. uix_doctor_datetime
+# was a unique constraint on every appointment; it is now a partial unique
+# index over the appointments that are not cancelled.
+RETIRED_CONSTRAINTS = [('appointment', 'uix_doctor_datetime')]
+
+
+def _lock_schema(conn):
+    """Block concurrent upgrades until this transaction ends."""
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+
+
+def upgrade_schema(engine=None):
+    """Create missing tables, columns and indexes. Returns a list of actions."""
+    engine = engine or db.engine
+    with engine.connect() as conn, conn.begin():
+        _lock_schema(conn)
+        return _upgrade(conn)
+
+
+def _upgrade(conn):
+    actions = []
+    existing_tables = set(inspect(conn).get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(bind=conn)
+            actions.append(f'created table {table.name}')
+
+    insp = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        columns = {c['name'] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in columns:
+                continue
+            if not col.nullable and col.server_default is None:
+                raise RuntimeError(
+                    f'Cannot add NOT NULL column {table.name}.{col.name} without a server default')
+            ddl = CreateColumn(col).compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+            actions.append(f'added column {table.name}.{col.name}')
+
+    for table_name, name in RETIRED_CONSTRAINTS:
+        if name in {c['name'] for c in insp.get_unique_constraints(table_name)}:
+            if conn.dialect.name == 'sqlite':
+                _rebuild_sqlite_table(conn, db.metadata.tables[table_name])
+            else:
+                conn.execute(text(f'ALTER TABLE {preparer.quote(table_name)} '
+                                  f'DROP CONSTRAINT {preparer.quote(name)}'))
+            actions.append(f'dropped constraint {table_name}.{name}')
+
+    insp = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        indexes = {i['name'] for i in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=conn)
+                actions.append(f'created index {index.name}')
+    return actions
+
+
+def _rebuild_sqlite_table(conn, table):
+    """Recreate `table` from the model and copy its rows over. Indexes are
+    left to the caller; the columns must all exist already."""
+    meta = MetaData()
+    for t in db.metadata.sorted_tables:
+        t.to_metadata(meta)  # so the foreign keys of the copy resolve
+    new = table.to_metadata(meta, name=f'{table.name}_new')
+    preparer = conn.dialect.identifier_preparer
+    columns = ', '.join(preparer.quote(c.name) for c in table.columns)
+    conn.execute(CreateTable(new))
+    conn.execute(text(f'INSERT INTO {preparer.quote(new.name)} ({columns}) '
+                      f'SELECT {columns} FROM {preparer.quote(table.name)}'))
+    conn.execute(text(f'DROP TABLE {preparer.quote(table.name)}'))
+    conn.execute(text(f'ALTER TABLE {preparer.quote(new.name)} RENAME TO {preparer.quote(table.name)}'))
+
+
+# (description, SQL, index names any of which should appear in the plan).
+HOT_PATH_QUERIES = [
+    ('patient upcoming appointments',
+     "SELECT id FROM appointment WHERE patient_id = 1 AND status != 'Cancelled' "
+     "AND date >= '2025-01-01' ORDER BY date, time",
+     ('ix_appt_patient_date_time',)),
+    ('admin filter by status and date',
+     "SELECT id FROM appointment WHERE status = 'Booked' AND date = '2025-01-01'",
+     ('ix_appt_status_date',)),
+    ('admin recent-first listing',
+     "SELECT id FROM appointment ORDER BY date DESC, time DESC, id DESC LIMIT 51",
+     ('ix_appt_date_time',)),
+    ('doctor schedule for a day',
+     "SELECT id FROM appointment WHERE doctor_id = 1 AND date = '2025-01-01'",
+     ('ix_appt_doctor_date_time', 'uix_doctor_datetime')),
+    ('active appointment in a slot',
+     "SELECT id FROM appointment WHERE doctor_id = 1 AND date = '2025-01-01' "
+     "AND time = '09:00:00' AND status != 'Cancelled'",
+     ('uix_doctor_datetime', 'ix_appt_doctor_date_time')),
+    ('users ordered by name',
+     'SELECT id FROM "user" ORDER BY name LIMIT 10',
+     ('ix_user_name',)),
+    ('users by role',
+     "SELECT id FROM \"user\" WHERE role = 'doctor'",
+     ('ix_user_role',)),
+    ('doctor profile of a user',
+     'SELECT id FROM doctor_profile WHERE user_id = 1',
+     ('ix_doctor_profile_user_id',)),
+    ('patient profile of a user',
+     'SELECT id FROM patient_profile WHERE user_id = 1',
+     ('ix_patient_profile_user_id',)),
+    ('treatment of an appointment',
+     'SELECT id FROM treatment WHERE appointment_id = 1',
+     ('ix_treatment_appointment_id',)),
+]
+
+
+def explain_query_plan(sql, engine=None):
+    """EXPLAIN QUERY PLAN detail lines for `sql` (SQLite only)."""
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def check_index_usage(engine=None):
+    """Return [(description, expected indexes, plan lines)] for every hot-path
+    query whose plan does not mention its index. Empty list means all good."""
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError('Index checks use EXPLAIN QUERY PLAN and need SQLite')
+    failures = []
+    for desc, sql, indexes in HOT_PATH_QUERIES:
+        plan = explain_query_plan(sql, engine)
+        if not any(name in line for line in plan for name in indexes):
+            failures.append((desc, indexes, plan))
+    return failures
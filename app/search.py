@@ -0,0 +1,386 @@
+"""
+Full-text search index for doctors and patients.
+
+On SQLite the index is a pair of FTS5 tables (doctor_fts, patient_fts) whose
+rowid is the profile id; everything else uses an in-process inverted index
+built from the same tokenizer. Either way:
+
+    match_criterion('doctor', q)   -> WHERE clause for DoctorProfile queries
+    ranked_ids('doctor', q, limit) -> profile ids, best match first
+    count_matches('doctor', q)     -> number of matching profiles
+
+Every word of the query must match, and each word matches as a prefix
+("car" finds "Cardiology"). Model events re-index the affected profiles in
+the same transaction as the change (FTS5) or on commit (in-process index).
+Existing databases are filled by create_database and `flask rebuild-search`.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, select, text, literal
+from sqlalchemy.orm import Session, object_session
+
+from . import db
+from .models import User, DoctorProfile, PatientProfile
+
+DEFAULT_TTL = 600  # seconds before the in-process index is rebuilt
+FTS_TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# kind -> (profile model, FTS table, indexed columns besides the user's name and email)
+INDEXES = {
+    'doctor': (DoctorProfile, 'doctor_fts', ('specialization',)),
+    'patient': (PatientProfile, 'patient_fts', ('contact',)),
+}
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(value):
+    """Lowercase words with accents stripped, like FTS5's unicode61 tokenizer."""
+    if not value:
+        return []
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return _WORD.findall(value.lower())
+
+
+def _documents(conn, kind, profile_ids=None, user_ids=None):
+    """(profile id, [indexed values]) rows for the given profiles/users (all when both None)."""
+    model, _, extra = INDEXES[kind]
+    query = (select(model.id, User.name, User.email, *[getattr(model, c) for c in extra])
+             .join(User, User.id == model.user_id))
+    if profile_ids is not None or user_ids is not None:
+        query = query.where(model.id.in_(profile_ids or []) | User.id.in_(user_ids or []))
+    return [(row[0], list(row[1:])) for row in conn.execute(query)]
+
+
+# ----------------------
+# FTS5 backend
+# ----------------------
+class FTSIndex:
+    name = 'fts5'
+
+    def create(self, conn):
+        """Create the FTS tables; returns True when any of them was missing."""
+        created = False
+        for kind, (_, table, extra) in INDEXES.items():
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :t"),
+                                  {'t': table}).first()
+            if exists:
+                continue
+            columns = ', '.join(('name', 'email') + extra)
+            conn.execute(text(f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, tokenize='{FTS_TOKENIZER}')"))
+            created = True
+        return created
+
+    def rebuild(self, conn):
+        self.create(conn)
+        counts = {}
+        for kind, (_, table, _) in INDEXES.items():
+            conn.execute(text(f'DELETE FROM {table}'))
+            docs = _documents(conn, kind)
+            self._insert(conn, kind, docs)
+            counts[kind] = len(docs)
+        return counts
+
+    def _insert(self, conn, kind, docs):
+        _, table, extra = INDEXES[kind]
+        if not docs:
+            return
+        columns = ('name', 'email') + extra
+        sql = text(f"INSERT INTO {table} (rowid, {', '.join(columns)}) "
+                   f"VALUES (:rowid, {', '.join(':' + c for c in columns)})")
+        conn.execute(sql, [dict(zip(columns, values), rowid=pid) for pid, values in docs])
+
+    def reindex(self, conn, kind, profile_ids, user_ids):
+        _, table, _ = INDEXES[kind]
+        docs = _documents(conn, kind, profile_ids, user_ids)
+        stale = set(profile_ids) | {pid for pid, _ in docs}
+        if stale:
+            conn.execute(text(f'DELETE FROM {table} WHERE rowid IN ({", ".join(str(int(i)) for i in stale)})'))
+        self._insert(conn, kind, docs)
+
+    def forget(self, conn, kind, profile_ids):
+        _, table, _ = INDEXES[kind]
+        conn.execute(text(f'DELETE FROM {table} WHERE rowid IN ({", ".join(str(int(i)) for i in profile_ids)})'))
+
+    @staticmethod
+    def _match(q):
+        # every word as a quoted prefix term; tokens are alphanumeric so quoting is safe.
+        # '' when q has no words: FTS5 rejects an empty MATCH, so callers skip the query
+        return ' '.join(f'"{t}"*' for t in tokenize(q))
+
+    def match_criterion(self, kind, q):
+        model, table, _ = INDEXES[kind]
+        match = self._match(q)
+        if not match:
+            return literal(False)
+        ids = text(f'SELECT rowid FROM {table} WHERE {table} MATCH :q').bindparams(q=match)
+        return model.id.in_(ids.columns(rowid=db.Integer))
+
+    def ranked_ids(self, kind, q, limit=None, session=None):
+        _, table, _ = INDEXES[kind]
+        match = self._match(q)
+        if not match:
+            return []
+        sql = f'SELECT rowid FROM {table} WHERE {table} MATCH :q ORDER BY bm25({table})'
+        params = {'q': match}
+        if limit:
+            sql += ' LIMIT :limit'
+            params['limit'] = int(limit)
+        return [r[0] for r in (session or db.session).execute(text(sql), params)]
+
+    def count_matches(self, kind, q, session=None):
+        _, table, _ = INDEXES[kind]
+        match = self._match(q)
+        if not match:
+            return 0
+        return (session or db.session).execute(
+            text(f'SELECT count(*) FROM {table} WHERE {table} MATCH :q'), {'q': match}).scalar()
+
+
+# ----------------------
+# In-process backend
+# ----------------------
+class MemoryIndex:
+    """Inverted index per kind: token -> profile ids, with a sorted token list
+    for prefix lookups. Built lazily from the database and refreshed after
+    SEARCH_INDEX_TTL so writes from other processes show up eventually."""
+    name = 'memory'
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._docs = None  # kind -> {profile id: tokens}
+        self._postings = {}
+        self._tokens = {}
+        self._loaded_at = 0.0
+
+    def create(self, conn):
+        return False
+
+    def rebuild(self, conn):
+        docs = {kind: {pid: self._doc_tokens(values) for pid, values in _documents(conn, kind)}
+                for kind in INDEXES}
+        with self._lock:
+            self._docs = docs
+            self._postings = {kind: {} for kind in INDEXES}
+            for kind, by_id in docs.items():
+                for pid, tokens in by_id.items():
+                    self._add(kind, pid, tokens)
+            self._tokens = {kind: sorted(p) for kind, p in self._postings.items()}
+            self._loaded_at = time.monotonic()
+        return {kind: len(by_id) for kind, by_id in docs.items()}
+
+    @staticmethod
+    def _doc_tokens(values):
+        return set(t for v in values for t in tokenize(v))
+
+    def _add(self, kind, pid, tokens):
+        postings = self._postings[kind]
+        for t in tokens:
+            postings.setdefault(t, set()).add(pid)
+
+    def _remove(self, kind, pid):
+        tokens = self._docs[kind].pop(pid, ())
+        postings = self._postings[kind]
+        for t in tokens:
+            ids = postings.get(t)
+            if ids is not None:
+                ids.discard(pid)
+                if not ids:
+                    del postings[t]
+
+    def apply(self, changes):
+        """changes: [(kind, profile id, values or None to remove)], applied on commit."""
+        with self._lock:
+            if self._docs is None:
+                return
+            for kind, pid, values in changes:
+                self._remove(kind, pid)
+                if values is not None:
+                    tokens = self._doc_tokens(values)
+                    self._docs[kind][pid] = tokens
+                    self._add(kind, pid, tokens)
+            self._tokens = {kind: sorted(p) for kind, p in self._postings.items()}
+
+    def _ensure_loaded(self):
+        stale = self._docs is None or time.monotonic() - self._loaded_at >= self.ttl
+        if stale:
+            with db.engine.connect() as conn:
+                self.rebuild(conn)
+
+    def _scores(self, kind, q):
+        """{profile id: score}; exact word matches score higher than prefix matches."""
+        terms = tokenize(q)
+        if not terms:
+            return {}
+        self._ensure_loaded()
+        with self._lock:
+            postings, tokens = self._postings[kind], self._tokens[kind]
+            scores = None
+            for term in terms:
+                hits = {}
+                i = bisect.bisect_left(tokens, term)
+                while i < len(tokens) and tokens[i].startswith(term):
+                    weight = 1.0 if tokens[i] == term else 0.5
+                    for pid in postings[tokens[i]]:
+                        hits[pid] = max(hits.get(pid, 0), weight)
+                    i += 1
+                if scores is None:
+                    scores = hits
+                else:
+                    scores = {pid: s + hits[pid] for pid, s in scores.items() if pid in hits}
+                if not scores:
+                    return {}
+            return scores
+
+    def match_criterion(self, kind, q):
+        model = INDEXES[kind][0]
+        ids = list(self._scores(kind, q))
+        return model.id.in_(ids) if ids else literal(False)
+
+    def ranked_ids(self, kind, q, limit=None, session=None):
+        scores = self._scores(kind, q)
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], pid))
+        return ranked[:limit] if limit else ranked
+
+    def count_matches(self, kind, q, session=None):
+        return len(self._scores(kind, q))
+
+    def reindex(self, conn, kind, profile_ids, user_ids):
+        # read now (inside the flush), apply after commit
+        docs = _documents(conn, kind, profile_ids, user_ids)
+        found = {pid for pid, _ in docs}
+        return [(kind, pid, values) for pid, values in docs] + \
+               [(kind, pid, None) for pid in profile_ids if pid not in found]
+
+    def forget(self, conn, kind, profile_ids):
+        return [(kind, pid, None) for pid in profile_ids]
+
+
+_index = None
+
+
+def get_index():
+    return _index
+
+
+def fts5_available(engine):
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+# ----------------------
+# Public helpers
+# ----------------------
+def match_criterion(kind, q):
+    return _index.match_criterion(kind, q)
+
+
+def ranked_ids(kind, q, limit=None, session=None):
+    return _index.ranked_ids(kind, q, limit, session)
+
+
+def count_matches(kind, q, session=None):
+    return _index.count_matches(kind, q, session)
+
+
+def ensure_index(engine=None):
+    """Create the index if needed and fill it when it was just created."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        if _index.create(conn):
+            _index.rebuild(conn)
+
+
+def rebuild_index(engine=None):
+    """Re-index every doctor and patient. Returns {kind: documents indexed}."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        return _index.rebuild(conn)
+
+
+# ----------------------
+# Event hooks
+# ----------------------
+def _pending(target):
+    sess = object_session(target)
+    if sess is None:
+        return None
+    return sess.info.setdefault('search_dirty', {'profiles': set(), 'users': set(), 'deleted': set()})
+
+
+def _profile_kind(model):
+    return 'doctor' if model is DoctorProfile else 'patient'
+
+
+def _profile_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['profiles'].add((_profile_kind(mapper.class_), target.id))
+
+
+def _profile_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['deleted'].add((_profile_kind(mapper.class_), target.id))
+
+
+def _user_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['users'].add(target.id)
+
+
+def _after_flush(session, flush_context):
+    dirty = session.info.pop('search_dirty', None)
+    if not dirty:
+        return
+    conn = session.connection()
+    changes = []
+    for kind in INDEXES:
+        deleted = [pid for k, pid in dirty['deleted'] if k == kind]
+        profile_ids = [pid for k, pid in dirty['profiles'] if k == kind and pid not in deleted]
+        if deleted:
+            changes += _index.forget(conn, kind, deleted) or []
+        if profile_ids or dirty['users']:
+            changes += _index.reindex(conn, kind, profile_ids, list(dirty['users'])) or []
+    if changes:
+        session.info.setdefault('search_changes', []).extend(changes)
+
+
+def _after_commit(session):
+    changes = session.info.pop('search_changes', None)
+    if changes and isinstance(_index, MemoryIndex):
+        _index.apply(changes)
+
+
+def _after_rollback(session):
+    session.info.pop('search_dirty', None)
+    session.info.pop('search_changes', None)
+
+
+def init_search(app):
+    """Pick the backend for the app's database and register the sync hooks."""
+    global _index
+    ttl = app.config.setdefault('SEARCH_INDEX_TTL', DEFAULT_TTL)
+    with app.app_context():
+        use_fts = app.config.setdefault('SEARCH_FTS5', fts5_available(db.engine))
+    _index = FTSIndex() if use_fts else MemoryIndex(ttl)
+
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    for model in (DoctorProfile, PatientProfile):
+        event.listen(model, 'after_insert', _profile_changed)
+        event.listen(model, 'after_update', _profile_changed)
+        event.listen(model, 'after_delete', _profile_deleted)
+    event.listen(User, 'after_update', _user_changed)
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,131 @@
+"""
+Row-oriented JSON for the REST list and export endpoints.
+
+flask_restful's marshal() walks every ORM object field by field, and the
+doctor/patient `name` lambdas lazy-load `user` per row. Here a list is one
+SELECT of exactly the requested columns (rows come back as tuples, nothing
+enters the identity map), zipped into dicts and encoded in one call:
+orjson when it is installed, the standard json module otherwise. Dates and
+times come out as 'YYYY-MM-DD' / 'HH:MM:SS' either way, the same strings
+marshal() produced.
+
+`flask bench-serializers` times both paths on the same rows.
+"""
+import json
+import time as _time
+
+from flask import current_app
+from flask_restful import marshal
+
+from .models import db, User, DoctorProfile, PatientProfile, Appointment, Treatment
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# output field -> column, per resource; built on call like loaders.PROFILES
+COLUMNS = {
+    'doctors': lambda: {
+        'id': DoctorProfile.id,
+        'name': User.name,
+        'specialization': DoctorProfile.specialization,
+    },
+    'patients': lambda: {
+        'id': PatientProfile.id,
+        'name': User.name,
+        'contact': PatientProfile.contact,
+    },
+    'appointments': lambda: {
+        'id': Appointment.id,
+        'patient_id': Appointment.patient_id,
+        'doctor_id': Appointment.doctor_id,
+        'date': Appointment.date,
+        'time': Appointment.time,
+        'status': Appointment.status,
+    },
+    'treatments': lambda: {
+        'id': Treatment.id,
+        'appointment_id': Treatment.appointment_id,
+        'diagnosis': Treatment.diagnosis,
+        'prescription': Treatment.prescription,
+        'notes': Treatment.notes,
+    },
+}
+
+# FROM clause of each resource (User is joined for the names and the name sort)
+SOURCES = {
+    'doctors': lambda q: q.select_from(DoctorProfile).join(User, User.id == DoctorProfile.user_id),
+    'patients': lambda q: q.select_from(PatientProfile).join(User, User.id == PatientProfile.user_id),
+    'appointments': lambda q: q.select_from(Appointment),
+    'treatments': lambda q: q.select_from(Treatment),
+}
+
+
+def field_names(kind):
+    return list(COLUMNS[kind]())
+
+
+def row_query(session, kind, names=None):
+    """Query of the `names` columns (default: all) of a resource; yields tuples."""
+    columns = COLUMNS[kind]()
+    names = names or list(columns)
+    return SOURCES[kind](session.query(*[columns[n].label(n) for n in names]))
+
+
+def rows_to_dicts(rows, names):
+    return [dict(zip(names, row)) for row in rows]
+
+
+def _default(value):
+    return str(value)  # date, time, datetime, Decimal
+
+
+def dumps(obj):
+    """JSON bytes of `obj`, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+
+def json_response(obj, status=200, headers=None):
+    return current_app.response_class(dumps(obj), status=status, headers=headers,
+                                      mimetype='application/json')
+
+
+# ----------------------
+# Benchmark
+# ----------------------
+MODELS = {'doctors': DoctorProfile, 'patients': PatientProfile, 'appointments': Appointment}
+
+
+def benchmark(kind, marshal_fields, n_rows):
+    """
+    Serialize the first `n_rows` rows of a resource both ways. Returns
+    {'resource', 'rows', 'marshal_ms', 'rows_ms', 'speedup', 'encoder'}.
+    """
+    model = MODELS[kind]
+
+    db.session.expunge_all()
+    started = _time.perf_counter()
+    objects = model.query.order_by(model.id).limit(n_rows).all()
+    legacy = json.dumps(marshal(objects, marshal_fields)).encode()
+    marshal_s = _time.perf_counter() - started
+    db.session.expunge_all()
+
+    names = field_names(kind)
+    started = _time.perf_counter()
+    rows = row_query(db.session, kind, names).order_by(model.id).limit(n_rows).all()
+    fast = dumps(rows_to_dicts(rows, names))
+    rows_s = _time.perf_counter() - started
+
+    if json.loads(legacy) != json.loads(fast):
+        current_app.logger.warning('bench-serializers: %s output differs between the two paths', kind)
+    return {
+        'resource': kind,
+        'rows': len(rows),
+        'marshal_ms': round(marshal_s * 1000, 1),
+        'rows_ms': round(rows_s * 1000, 1),
+        'speedup': round(marshal_s / rows_s, 1) if rows_s else None,
+        'encoder': 'orjson' if orjson is not None else 'json',
+    }
@@ -0,0 +1,187 @@
+"""
+Slot engine: free appointment slots from DoctorAvailability windows.
+
+Each doctor/day is a row of fixed-length slots (SLOT_MINUTES, 30 by default)
+in a NumPy boolean grid of shape (doctors, days, slots per day). Availability
+windows are painted in with one difference-array + cumsum pass, then every
+appointment row and everything before `now` is masked out. A slot is offered
+only when it fits entirely inside a window.
+
+The whole doctor/date range costs three queries (windows, appointments and
+slot holds), however many doctors and days are asked for.
+
+Cancelled appointments do not block a slot: booking.book() adds a new row
+next to the cancelled one. An unexpired SlotHold blocks it for everyone but the patient
+holding it (see holds.py).
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+import numpy as np
+from flask import current_app
+
+from .models import db, User, Appointment, DoctorAvailability, DoctorProfile, SlotHold
+from .storage import icontains
+
+DEFAULT_SLOT_MINUTES = 30
+MINUTES_PER_DAY = 24 * 60
+SLOTS_MAX_DAYS = 62  # widest date range served by the slots API
+EARLIEST_DEFAULT_DAYS = 14
+EARLIEST_MAX_RESULTS = 50
+
+
+def slot_minutes():
+    return current_app.config.get('SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def check_range(start, end):
+    """Raise ValueError unless start..end (inclusive) spans 1 to SLOTS_MAX_DAYS days."""
+    if end < start or (end - start).days >= SLOTS_MAX_DAYS:
+        raise ValueError(f'Range must be 1 to {SLOTS_MAX_DAYS} days')
+
+
+def slot_grid(n_doctors, n_days, slot, windows, booked, now_index=None):
+    """
+    Boolean grid [doctor, day, slot] of free slots.
+
+    windows: (doctor idx, day idx, start minute, end minute) int arrays
+    booked:  (doctor idx, day idx, minute) int arrays
+    now_index: (day idx, first slot idx still in the future) or None
+    """
+    per_day = MINUTES_PER_DAY // slot
+    diff = np.zeros((n_doctors, n_days, per_day + 1), dtype=np.int16)
+
+    w_doc, w_day, w_start, w_end = windows
+    first = -(-w_start // slot)        # first slot starting inside the window
+    last = np.minimum(w_end // slot, per_day)  # slots must end by the window end
+    ok = last > first
+    np.add.at(diff, (w_doc[ok], w_day[ok], first[ok]), 1)
+    np.add.at(diff, (w_doc[ok], w_day[ok], last[ok]), -1)
+    free = np.cumsum(diff, axis=2)[:, :, :per_day] > 0
+
+    b_doc, b_day, b_minute = booked
+    free[b_doc, b_day, b_minute // slot] = False
+
+    if now_index is not None:
+        day, first_slot = now_index
+        if day >= n_days:
+            free[:] = False
+        elif day >= 0:
+            free[:, :day, :] = False
+            free[:, day, :first_slot] = False
+    return free
+
+
+def free_slots(doctor_ids, start, end, now=None, slot=None, patient_id=None):
+    """
+    {doctor id: [(date, time), ...]} of free slots between the dates start
+    and end (inclusive), in time order. Doctors without a free slot map to [].
+    Slots held by `patient_id` still count as free. The grid grows with the
+    range, so anything outside check_range() raises ValueError.
+    """
+    check_range(start, end)
+    slot = slot or slot_minutes()
+    doctor_ids = sorted(set(doctor_ids))
+    n_days = (end - start).days + 1
+    if not doctor_ids:
+        return {}
+    now = now or datetime.now()
+    doc_index = {d: i for i, d in enumerate(doctor_ids)}
+
+    window_rows = (db.session.query(DoctorAvailability.doctor_id, DoctorAvailability.date,
+                                    DoctorAvailability.start_time, DoctorAvailability.end_time)
+                   .filter(DoctorAvailability.doctor_id.in_(doctor_ids),
+                           DoctorAvailability.date >= start, DoctorAvailability.date <= end)
+                   .all())
+    booked_rows = (db.session.query(Appointment.doctor_id, Appointment.date, Appointment.time)
+                   .filter(Appointment.doctor_id.in_(doctor_ids),
+                           Appointment.date >= start, Appointment.date <= end,
+                           Appointment.status != 'Cancelled')
+                   .all())
+    held_rows = (db.session.query(SlotHold.doctor_id, SlotHold.date, SlotHold.time)
+                 .filter(SlotHold.doctor_id.in_(doctor_ids),
+                         SlotHold.date >= start, SlotHold.date <= end,
+                         SlotHold.expires_at > datetime.utcnow()))
+    if patient_id is not None:
+        held_rows = held_rows.filter(SlotHold.patient_id != patient_id)
+    booked_rows += held_rows.all()
+
+    def arrays(rows, *columns):
+        return tuple(np.fromiter(col(rows), dtype=np.int64, count=len(rows)) for col in columns)
+
+    windows = arrays(window_rows,
+                     lambda rows: (doc_index[r[0]] for r in rows),
+                     lambda rows: ((r[1] - start).days for r in rows),
+                     lambda rows: (_minutes(r[2]) for r in rows),
+                     lambda rows: (_minutes(r[3]) for r in rows))
+    booked = arrays(booked_rows,
+                    lambda rows: (doc_index[r[0]] for r in rows),
+                    lambda rows: ((r[1] - start).days for r in rows),
+                    lambda rows: (_minutes(r[2]) for r in rows))
+    now_index = ((now.date() - start).days, -(-(_minutes(now) + (now.second > 0)) // slot))
+
+    free = slot_grid(len(doctor_ids), n_days, slot, windows, booked, now_index)
+
+    result = {d: [] for d in doctor_ids}
+    days = [start + timedelta(days=i) for i in range(n_days)]
+    times = [time(m // 60, m % 60) for m in range(0, MINUTES_PER_DAY, slot)]
+    for d_idx, day_idx, s_idx in zip(*np.nonzero(free)):  # row-major: doctor, day, slot
+        result[doctor_ids[d_idx]].append((days[day_idx], times[s_idx]))
+    return result
+
+
+def is_free(doctor_id, on_date, at_time, now=None, patient_id=None):
+    """True when (on_date, at_time) is one of the doctor's free slots."""
+    return (on_date, at_time) in free_slots([doctor_id], on_date, on_date, now,
+                                            patient_id=patient_id)[doctor_id]
+
+
+def slots_json(slots, slot=None):
+    """JSON-ready form of free_slots(): {doctor id: {'YYYY-MM-DD': ['HH:MM', ...]}}."""
+    out = {}
+    for doctor_id, items in slots.items():
+        days = out.setdefault(str(doctor_id), {})
+        for d, t in items:
+            days.setdefault(d.isoformat(), []).append(t.strftime('%H:%M'))
+    return {'slot_minutes': slot or slot_minutes(), 'doctors': out}
+
+
+def earliest_available(department_id=None, specialization=None, start=None, end=None,
+                       limit=10, now=None):
+    """
+    First `limit` free slots across all non-blacklisted doctors of a
+    department and/or specialization, soonest first, as JSON-ready dicts.
+
+    Four queries in total: the doctors, then free_slots() for all of them
+    at once. Each doctor's slot list is already in time order, so a
+    heapq.merge of the lists yields the overall order lazily and stops
+    after `limit` slots. Raises ValueError for a range check_range() rejects.
+    """
+    start = start or datetime.now().date()
+    end = end or start + timedelta(days=EARLIEST_DEFAULT_DAYS - 1)
+    check_range(start, end)
+    query = (db.session.query(DoctorProfile.id, User.name, DoctorProfile.specialization)
+             .join(User, User.id == DoctorProfile.user_id)
+             .filter(DoctorProfile.is_blacklisted == False, User.active.isnot(False)))
+    if department_id:
+        query = query.filter(DoctorProfile.department_id == department_id)
+    if specialization:
+        query = query.filter(icontains(DoctorProfile.specialization, specialization))
+    doctors = {row[0]: row for row in query.all()}
+    if not doctors:
+        return []
+
+    free = free_slots(doctors, start, end, now)
+    merged = heapq.merge(*[[(d, t, doctor_id) for d, t in items] for doctor_id, items in free.items()])
+    return [{
+        'doctor_id': doctor_id,
+        'doctor_name': doctors[doctor_id][1],
+        'specialization': doctors[doctor_id][2],
+        'date': d.isoformat(),
+        'time': t.strftime('%H:%M'),
+    } for d, t, doctor_id in islice(merged, limit)]
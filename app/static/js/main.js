@@ -142,6 +142,35 @@ function bindLiveSearch(inputEl, resultsEl, fetchUrl) {
   inputEl.addEventListener('input', doSearch);
 }
 
+/* ---------- Autocomplete into a <datalist> (calls /api/doctors/autocomplete) ---------- */
+function bindAutocomplete(inputEl, datalistEl, fetchUrl) {
+  if (!inputEl || !datalistEl) return;
+  const suggest = debounce(async () => {
+    const q = inputEl.value.trim();
+    if (q.length < 2) { datalistEl.innerHTML = ''; return; }
+    try {
+      const resp = await fetch(`${fetchUrl}?q=${encodeURIComponent(q)}`, {credentials:'same-origin'});
+      if (!resp.ok) return;
+      const rows = await resp.json();
+      datalistEl.innerHTML = '';
+      const seen = new Set();
+      rows.forEach(r => {
+        // offer the doctor's name and specialization as completions
+        [r.name, r.specialization].forEach(v => {
+          if (!v || seen.has(v)) return;
+          seen.add(v);
+          const opt = document.createElement('option');
+          opt.value = v;
+          datalistEl.appendChild(opt);
+        });
+      });
+    } catch(e) {
+      datalistEl.innerHTML = '';
+    }
+  }, 200);
+  inputEl.addEventListener('input', suggest);
+}
+
 /* ---------- Check appointment availability (calls /api/check_slot) ---------- */
 async function checkAvailability(doctorId, dateStr, timeStr) {
   if (!doctorId || !dateStr || !timeStr) return {ok:false, conflict:false};
@@ -172,5 +201,5 @@ function enhanceFormValidation(formEl) {
 /* ---------- Exports to global for inline use ---------- */
 window.hospitalApp = {
   getCSRFToken, showToast, showDeleteModal, ajaxDeleteRow, debounce,
-  bindLiveSearch, checkAvailability, enhanceFormValidation
+  bindLiveSearch, bindAutocomplete, checkAvailability, enhanceFormValidation
 };
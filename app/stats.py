@@ -0,0 +1,200 @@
+"""
+Cached admin dashboard statistics.
+
+Totals (doctors, patients, appointments, departments and appointments per
+status) are computed once and then kept current in memory: mapper events on
+the models record +1/-1 deltas on the session during flush, and the deltas are
+applied when that session commits (dropped on rollback). Changes that bypass
+the ORM (bulk UPDATE/DELETE, Core inserts) or come from other worker
+processes are picked up by the STATS_TTL refresh.
+
+invalidate() / `flask recompute-stats` reach every process: they bump the
+'stats' row of DataVersion (see conditional.py), and get_stats() compares
+that version with the one its snapshot was taken at (one primary-key
+SELECT). A snapshot is only cached when no session with counted changes
+was in flight while it was computed, since its delta might already be in
+the SELECT and would then be applied twice.
+"""
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, func, select, case, inspect
+from sqlalchemy.orm import Session, object_session, scoped_session
+
+from .models import db, DoctorProfile, PatientProfile, Appointment, Department
+from .conditional import bump, current
+
+DEFAULT_TTL = 300  # seconds
+STATUSES = ('Booked', 'Completed', 'Cancelled')
+VERSION_KEY = 'stats'  # DataVersion row shared by every process
+
+# commits: sessions whose deltas were applied; pending: sessions holding deltas
+_cache = {'values': None, 'loaded_at': 0.0, 'ttl': DEFAULT_TTL, 'version': None, 'commits': 0}
+_pending = weakref.WeakSet()
+_lock = threading.Lock()
+
+# model -> counter it contributes to
+COUNTED_MODELS = {
+    DoctorProfile: 'doctors',
+    PatientProfile: 'patients',
+    Appointment: 'appointments',
+    Department: 'departments',
+}
+
+
+def compute_stats():
+    """All totals in a single SELECT of scalar subqueries."""
+    def total(model):
+        return select(func.count()).select_from(model).scalar_subquery()
+
+    def by_status(status):
+        return (select(func.coalesce(func.sum(case((Appointment.status == status, 1), else_=0)), 0))
+                .scalar_subquery())
+
+    row = db.session.execute(select(
+        total(DoctorProfile), total(PatientProfile), total(Appointment), total(Department),
+        *[by_status(s) for s in STATUSES]
+    )).one()
+    keys = ('doctors', 'patients', 'appointments', 'departments') + STATUSES
+    return dict(zip(keys, (int(v or 0) for v in row)))
+
+
+def shared_version():
+    (version,), _ = current([VERSION_KEY])
+    return version
+
+
+def get_stats():
+    """Cached totals, recomputed when missing, older than the TTL or invalidated elsewhere."""
+    version = shared_version()
+    with _lock:
+        values = _cache['values']
+        fresh = (values is not None and _cache['version'] == version
+                 and time.monotonic() - _cache['loaded_at'] < _cache['ttl'])
+        if fresh:
+            return dict(values)
+    return recompute(version)
+
+
+def recompute(version=None):
+    if version is None:
+        version = shared_version()
+    with _lock:
+        commits, settled = _cache['commits'], not _pending
+    values = compute_stats()
+    with _lock:
+        if settled and not _pending and _cache['commits'] == commits:
+            _cache.update(values=values, loaded_at=time.monotonic(), version=version)
+        else:
+            # a commit raced the SELECT; its delta may or may not be in `values`
+            _cache['values'] = None
+    return dict(values)
+
+
+def invalidate():
+    """Force a recompute on the next get_stats() of every process."""
+    with db.engine.begin() as conn:
+        bump(conn, [VERSION_KEY])
+    _forget()
+
+
+def _forget():
+    with _lock:
+        _cache['values'] = None
+
+
+def _apply(session, deltas):
+    with _lock:
+        _pending.discard(session)
+        if not deltas:
+            return
+        _cache['commits'] += 1
+        values = _cache['values']
+        if values is None:
+            return
+        for key, n in deltas.items():
+            values[key] = values.get(key, 0) + n
+
+
+# ----------------------
+# Event hooks
+# ----------------------
+def record_changes(session, changes):
+    """
+    Queue [(counter, +n/-n)] on `session`, applied when it commits. For
+    Core statements that mapper events do not see.
+    """
+    if isinstance(session, scoped_session):
+        session = session()
+    pending = session.info.setdefault('stats_deltas', {})
+    with _lock:
+        _pending.add(session)
+    for key, n in changes:
+        if key:
+            pending[key] = pending.get(key, 0) + n
+
+
+def _record(target, changes):
+    sess = object_session(target)
+    if sess is not None:
+        record_changes(sess, changes)
+
+
+def _after_insert(mapper, connection, target):
+    changes = [(COUNTED_MODELS[mapper.class_], 1)]
+    if isinstance(target, Appointment):
+        changes.append((target.status if target.status in STATUSES else None, 1))
+    _record(target, changes)
+
+
+def _before_delete(mapper, connection, target):
+    # before_delete so an expired status can still be loaded from the row
+    changes = [(COUNTED_MODELS[mapper.class_], -1)]
+    if isinstance(target, Appointment):
+        hist = inspect(target).attrs.status.history
+        old = hist.deleted[0] if hist.deleted else target.status
+        changes.append((old if old in STATUSES else None, -1))
+    _record(target, changes)
+
+
+def _after_update_appointment(mapper, connection, target):
+    hist = inspect(target).attrs.status.history
+    if not hist.has_changes():
+        return
+    old = hist.deleted[0] if hist.deleted else None
+    new = target.status
+    if old == new:
+        return
+    _record(target, [(old if old in STATUSES else None, -1),
+                     (new if new in STATUSES else None, 1)])
+
+
+def _status_set(target, value, oldvalue, initiator):
+    # no-op; registered with active_history=True so the previous status is
+    # loaded on assignment and shows up in the attribute history at flush
+    return None
+
+
+def _after_commit(session):
+    _apply(session, session.info.pop('stats_deltas', None))
+
+
+def _after_rollback(session):
+    session.info.pop('stats_deltas', None)
+    with _lock:
+        _pending.discard(session)
+
+
+def init_stats(app):
+    _cache['ttl'] = app.config.setdefault('STATS_TTL', DEFAULT_TTL)
+    _forget()  # a new app may point at another database
+    if event.contains(Session, 'after_commit', _after_commit):
+        return
+    for model in COUNTED_MODELS:
+        event.listen(model, 'after_insert', _after_insert)
+        event.listen(model, 'before_delete', _before_delete)
+    event.listen(Appointment, 'after_update', _after_update_appointment)
+    event.listen(Appointment.status, 'set', _status_set, active_history=True)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,252 @@
+"""
+Database storage profile.
+
+The database URI and engine options come from the environment:
+
+    DATABASE_URL            SQLAlchemy URI; overrides DATABASE_BACKEND
+    DATABASE_BACKEND        'sqlite' (default: hms.db in the instance folder) or
+                            'postgresql' (built from PGHOST, PGPORT, PGUSER,
+                            PGPASSWORD, PGDATABASE)
+    DATABASE_READ_URL       URI for read-only connections (default: same as DATABASE_URL)
+    STORAGE_PROFILE         'production' (default) or 'default' (plain SQLite settings)
+    SQLITE_JOURNAL_MODE     e.g. WAL
+    SQLITE_SYNCHRONOUS      e.g. NORMAL
+    SQLITE_BUSY_TIMEOUT_MS  wait this long on a locked database instead of failing
+    SQLITE_MMAP_SIZE        bytes of the file to memory-map
+    SQLITE_CACHE_SIZE       page cache size (negative = KiB)
+    SQLITE_TEMP_STORE       DEFAULT / FILE / MEMORY
+
+Connection pool (server backends only):
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+
+The SQLite settings are applied as PRAGMAs on every new connection. Heavy list
+pages read through a separate 'readonly' bind whose connections are marked
+read-only (query_only on SQLite, default_transaction_read_only on PostgreSQL),
+so they never take write locks and can point at a replica.
+"""
+import os
+from urllib.parse import quote_plus
+
+from flask import g, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from . import db
+from .constants import DB_NAME
+
+READONLY_BIND = 'readonly'
+BACKENDS = ('sqlite', 'postgresql')
+
+# QueuePool settings for server backends: setting -> (env var, default, type)
+POOL_SETTINGS = {
+    'pool_size': ('DB_POOL_SIZE', 10, int),
+    'max_overflow': ('DB_MAX_OVERFLOW', 20, int),
+    'pool_timeout': ('DB_POOL_TIMEOUT', 30, int),
+    'pool_recycle': ('DB_POOL_RECYCLE', 1800, int),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', True, lambda v: str(v).lower() in ('1', 'true', 'yes', 'on')),
+}
+
+# PRAGMA values per profile; None means "leave SQLite's default"
+STORAGE_PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,
+        'temp_store': 'MEMORY',
+    },
+    'default': {
+        'journal_mode': None,
+        'synchronous': None,
+        'busy_timeout': 5000,
+        'mmap_size': None,
+        'cache_size': None,
+        'temp_store': None,
+    },
+}
+
+# pragma name -> environment variable overriding it
+PRAGMA_ENV = {
+    'journal_mode': 'SQLITE_JOURNAL_MODE',
+    'synchronous': 'SQLITE_SYNCHRONOUS',
+    'busy_timeout': 'SQLITE_BUSY_TIMEOUT_MS',
+    'mmap_size': 'SQLITE_MMAP_SIZE',
+    'cache_size': 'SQLITE_CACHE_SIZE',
+    'temp_store': 'SQLITE_TEMP_STORE',
+}
+
+
+def sqlite_pragmas(environ=None):
+    """PRAGMAs for the selected STORAGE_PROFILE, with per-pragma env overrides."""
+    environ = os.environ if environ is None else environ
+    profile = environ.get('STORAGE_PROFILE', 'production')
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f'Unknown STORAGE_PROFILE: {profile}')
+    pragmas = dict(STORAGE_PROFILES[profile])
+    for name, var in PRAGMA_ENV.items():
+        if environ.get(var):
+            pragmas[name] = environ[var]
+    return pragmas
+
+
+def database_url(environ=None):
+    """Primary database URI from DATABASE_URL or DATABASE_BACKEND."""
+    environ = os.environ if environ is None else environ
+    url = environ.get('DATABASE_URL')
+    if url:
+        # Some hosting platforms still hand out the old postgres:// scheme
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        return url
+    backend = environ.get('DATABASE_BACKEND', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown DATABASE_BACKEND: {backend}')
+    if backend == 'postgresql':
+        user = quote_plus(environ.get('PGUSER', 'postgres'))
+        password = environ.get('PGPASSWORD')
+        auth = f'{user}:{quote_plus(password)}' if password else user
+        host = environ.get('PGHOST', 'localhost')
+        port = environ.get('PGPORT', '5432')
+        name = environ.get('PGDATABASE', 'hms')
+        return f'postgresql://{auth}@{host}:{port}/{name}'
+    return f'sqlite:///{DB_NAME}'
+
+
+def pool_options(environ=None):
+    """QueuePool engine options for server backends."""
+    environ = os.environ if environ is None else environ
+    opts = {'poolclass': QueuePool}
+    for option, (var, default, cast) in POOL_SETTINGS.items():
+        opts[option] = cast(environ[var]) if environ.get(var) else default
+    return opts
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def is_memory_sqlite(uri):
+    return is_sqlite(uri) and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+
+def configure_storage(app):
+    """
+    Fill the SQLAlchemy config from the environment (call before db.init_app).
+    Settings already in app.config win; a SQLALCHEMY_DATABASE_URI given there
+    also stands for the read-only bind unless SQLALCHEMY_BINDS is given too.
+    """
+    configured_uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    uri = configured_uri or database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas() if is_sqlite(uri) else {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {} if is_sqlite(uri) else pool_options())
+    if 'SQLALCHEMY_BINDS' in app.config:
+        return
+
+    # An in-memory database only exists on its own connection, so a second
+    # engine would see an empty database; read through the primary one then.
+    read_uri = (None if configured_uri else os.environ.get('DATABASE_READ_URL')) or uri
+    binds = {}
+    if is_sqlite(read_uri):
+        if not is_memory_sqlite(read_uri):
+            binds[READONLY_BIND] = read_uri
+    else:
+        read_opts = pool_options()
+        if read_uri.startswith('postgresql'):
+            read_opts['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+        binds[READONLY_BIND] = {'url': read_uri, **read_opts}
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def _pragma_listener(pragmas, readonly):
+    def set_pragmas(dbapi_conn, connection_record):
+        cur = dbapi_conn.cursor()
+        # busy_timeout first so the journal_mode switch itself can wait for locks
+        if pragmas.get('busy_timeout') is not None:
+            cur.execute(f"PRAGMA busy_timeout={int(pragmas['busy_timeout'])}")
+        for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store'):
+            value = pragmas.get(name)
+            if value is None:
+                continue
+            if name in ('mmap_size', 'cache_size'):
+                value = int(value)
+            elif not str(value).isalnum():
+                raise ValueError(f'Invalid value for PRAGMA {name}: {value!r}')
+            cur.execute(f'PRAGMA {name}={value}')
+        if readonly:
+            cur.execute('PRAGMA query_only=ON')
+        cur.close()
+    return set_pragmas
+
+
+def install_pragmas(app):
+    """Attach the connect-time PRAGMAs to every SQLite engine of the app."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            event.listen(engine, 'connect', _pragma_listener(pragmas, key == READONLY_BIND))
+
+
+# ----------------------
+# Read-only session
+# ----------------------
+def read_session():
+    """
+    Session on the read-only bind for the current request (closed at teardown).
+    Falls back to db.session when no read-only bind is configured.
+    """
+    if READONLY_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        return db.session
+    sess = g.get('_read_session')
+    if sess is None:
+        sess = Session(bind=db.engines[READONLY_BIND])
+        g._read_session = sess
+    return sess
+
+
+def read_query(*entities):
+    """Query on the read-only session, e.g. read_query(DoctorProfile)."""
+    return read_session().query(*entities)
+
+
+def close_read_session(exc=None):
+    sess = g.pop('_read_session', None)
+    if sess is not None:
+        sess.close()
+
+
+# ----------------------
+# Portability helpers
+# ----------------------
+def dialect_insert(table, bind=None):
+    """
+    INSERT construct of the active backend, for .on_conflict_do_update() /
+    .on_conflict_do_nothing() upserts (SQLite >= 3.24 and PostgreSQL).
+    """
+    name = (bind or db.engine).dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f'Upserts are not supported on {name}')
+    return insert(table)
+
+
+def like_escape(text):
+    """Escape LIKE wildcards in user input (used with escape='\\')."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def icontains(column, text):
+    """
+    Case-insensitive substring match that behaves the same on every backend:
+    ILIKE on PostgreSQL, lower() LIKE lower() on SQLite, with the user's
+    % and _ treated literally.
+    """
+    return column.ilike(f'%{like_escape(text)}%', escape='\\')
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import session, request, flash, redirect, url_for
+from flask import session, request, flash, redirect, url_for, current_app, Response, stream_with_context
 
 def validate_csrf(func):
     """
@@ -18,3 +18,17 @@ def validate_csrf(func):
                 return redirect(url_for('views.index'))
         return func(*args, **kwargs)
     return wrapper
+
+
+def stream_template(template_name, buffer_size=20, **context):
+    """
+    Render a template as a streamed response so the first rows reach the
+    client before the whole context (e.g. a large query) has been consumed.
+    Output is flushed every `buffer_size` template chunks.
+    """
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(buffer_size)
+    return Response(stream_with_context(stream), mimetype='text/html')
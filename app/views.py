@@ -137,11 +137,8 @@ def register_patient():
 
         user = User(email=email, name=name, role='patient')
         user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-
-        patient = PatientProfile(user_id=user.id, contact=contact, dob=dob)
-        db.session.add(patient)
+        patient = PatientProfile(user=user, contact=contact, dob=dob)
+        db.session.add_all([user, patient])
         db.session.commit()
 
         flash('Registration successful. Please login.', 'success')
@@ -168,11 +165,8 @@ def register_doctor():
 
         user = User(email=email, name=name, role='doctor')
         user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-
-        doctor = DoctorProfile(user_id=user.id, specialization=specialization)
-        db.session.add(doctor)
+        doctor = DoctorProfile(user=user, specialization=specialization)
+        db.session.add_all([user, doctor])
         db.session.commit()
 
         flash('Doctor registration successful. Please login.', 'success')
@@ -0,0 +1,124 @@
+"""
+Shared fixtures: a fresh app on a temporary SQLite file per test, a small
+seeded hospital (one department, doctors, patients, availability) and
+clients logged in as admin, doctor and patient.
+"""
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.constants import DEFAULT_ADMIN
+from app.models import (User, Department, DoctorProfile, PatientProfile, Appointment,
+                        DoctorAvailability)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def seed(app):
+    """Cardiology department, doctors d0-d2, patients p0-p2, 9:00-12:00 availability for a week."""
+    with app.app_context():
+        dep = Department(name='Cardiology', description='Heart')
+        db.session.add(dep)
+        doctors, patients = [], []
+        for i, (name, spec) in enumerate([('Alice Heart', 'Cardiology'), ('Bob Brain', 'Neurology'),
+                                          ('Carol Pulse', 'Cardiology')]):
+            user = User(email=f'd{i}@x.com', name=name, role='doctor')
+            user.set_password('pw')
+            doctors.append(DoctorProfile(user=user, specialization=spec, department=dep))
+        for i, name in enumerate(['Pat Adams', 'Pat Brown', 'Pat Clark']):
+            user = User(email=f'p{i}@x.com', name=name, role='patient')
+            user.set_password('pw')
+            patients.append(PatientProfile(user=user, contact=f'555{i}'))
+        db.session.add_all(doctors + patients)
+        db.session.flush()
+        today = date.today()
+        for doc in doctors:
+            for k in range(7):
+                db.session.add(DoctorAvailability(doctor_id=doc.id, date=today + timedelta(days=k),
+                                                  start_time=time(9), end_time=time(12)))
+        db.session.commit()
+        admin_id = User.query.filter_by(email=DEFAULT_ADMIN).one().id
+        return SimpleNamespace(
+            department_id=dep.id,
+            doctor_ids=[d.id for d in doctors], doctor_user_ids=[d.user_id for d in doctors],
+            patient_ids=[p.id for p in patients], patient_user_ids=[p.user_id for p in patients],
+            admin_id=admin_id, today=today, tomorrow=today + timedelta(days=1),
+        )
+
+
+def login(client, user_id):
+    """Log the test client in as `user_id` and return its CSRF token."""
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+        sess.setdefault('csrf_token', 'test-csrf-token')
+        return sess['csrf_token']
+
+
+def csrf_headers(client):
+    """X-CSRF-Token header for JSON writes from a logged-in client."""
+    with client.session_transaction() as sess:
+        return {'X-CSRF-Token': sess.get('csrf_token', '')}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(app, seed):
+    client = app.test_client()
+    login(client, seed.admin_id)
+    return client
+
+
+@pytest.fixture
+def doctor(app, seed):
+    client = app.test_client()
+    login(client, seed.doctor_user_ids[0])
+    return client
+
+
+@pytest.fixture
+def patient(app, seed):
+    client = app.test_client()
+    login(client, seed.patient_user_ids[0])
+    return client
+
+
+def add_appointment(doctor_id, patient_id, on_date, at_time, status='Booked'):
+    appt = Appointment(doctor_id=doctor_id, patient_id=patient_id, date=on_date, time=at_time, status=status)
+    db.session.add(appt)
+    db.session.commit()
+    return appt.id
+
+
+class count_queries:
+    """Context manager counting the SQL statements run on `engine`."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _inc(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._inc)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._inc)
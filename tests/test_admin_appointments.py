@@ -0,0 +1,38 @@
+from datetime import time
+
+from app import routes
+
+from .conftest import add_appointment
+
+
+def _seed_appointments(app, seed, n):
+    with app.app_context():
+        return [add_appointment(seed.doctor_ids[0], seed.patient_ids[k % 3], seed.today, time(8 + k // 60, k % 60))
+                for k in range(n)]
+
+
+def test_paged_list_links_to_next_page(app, seed, admin, monkeypatch):
+    monkeypatch.setattr(routes, 'APPOINTMENTS_PER_PAGE', 3)
+    ids = _seed_appointments(app, seed, 5)
+    r = admin.get('/admin/appointments')
+    assert r.status_code == 200
+    body = r.get_data(as_text=True)
+    # recent first: the three latest slots, then a link to the rest
+    assert [i for i in ids if f'/admin/appointment/{i}/view' in body] == ids[2:]
+    assert 'cursor=' in body
+
+
+def test_streamed_list_has_every_row(app, seed, admin):
+    ids = _seed_appointments(app, seed, 12)
+    r = admin.get('/admin/appointments?stream=1')
+    assert r.status_code == 200 and r.is_streamed
+    body = r.get_data(as_text=True)
+    assert all(f'/admin/appointment/{i}/view' in body for i in ids)
+
+
+def test_filters_and_non_admin(app, seed, admin, patient):
+    _seed_appointments(app, seed, 2)
+    r = admin.get('/admin/appointments?status=Cancelled&q=nobody&date=not-a-date')
+    assert r.status_code == 200
+    assert '/view' not in r.get_data(as_text=True)
+    assert patient.get('/admin/appointments').status_code == 302
@@ -0,0 +1,56 @@
+from datetime import time, timedelta
+
+from .conftest import add_appointment
+
+
+def _walk(client, url):
+    """Every item of a list endpoint, following X-Next-Cursor."""
+    items, cursor = [], None
+    while True:
+        resp = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert resp.status_code == 200
+        items += resp.get_json()
+        cursor = resp.headers.get('X-Next-Cursor')
+        if not cursor:
+            return items
+
+
+def test_doctor_list_pages_by_name_with_links(app, seed, client):
+    resp = client.get('/api/doctors?limit=2')
+    assert [d['name'] for d in resp.get_json()] == ['Alice Heart', 'Bob Brain']
+    assert 'rel="next"' in resp.headers['Link'] and resp.headers['X-Next-Cursor']
+    assert [d['name'] for d in _walk(client, '/api/doctors?limit=2')] == ['Alice Heart', 'Bob Brain', 'Carol Pulse']
+
+
+def test_list_fields_sort_and_filters(app, seed, client):
+    resp = client.get('/api/doctors?fields=id,specialization&sort=-specialization,-id')
+    assert resp.get_json() == [
+        {'id': seed.doctor_ids[1], 'specialization': 'Neurology'},
+        {'id': seed.doctor_ids[2], 'specialization': 'Cardiology'},
+        {'id': seed.doctor_ids[0], 'specialization': 'Cardiology'},
+    ]
+    assert len(client.get('/api/doctors?specialization=cardio').get_json()) == 2
+    assert [p['contact'] for p in client.get('/api/patients?sort=-name').get_json()] == ['5552', '5551', '5550']
+
+
+def test_appointment_list_date_filters_walk_every_row(app, seed, client):
+    d0, p0 = seed.doctor_ids[0], seed.patient_ids[0]
+    with app.app_context():
+        for k in range(5):
+            add_appointment(d0, p0, seed.today + timedelta(days=k), time(9))
+    items = _walk(client, f'/api/appointments?limit=2&date_from={seed.tomorrow}&sort=-date')
+    assert [i['date'] for i in items] == [(seed.today + timedelta(days=k)).isoformat() for k in (4, 3, 2, 1)]
+    assert items[0]['time'] == '09:00:00'
+
+
+def test_list_rejects_bad_arguments(app, seed, client):
+    assert client.get('/api/doctors?fields=id,password_hash').status_code == 400
+    assert client.get('/api/doctors?sort=email').status_code == 400
+    assert client.get('/api/appointments?date_from=tomorrow').status_code == 400
+
+
+def test_list_clamps_limit_and_ignores_tampered_cursors(app, seed, client, monkeypatch):
+    monkeypatch.setattr('app.api.resources.MAX_PAGE_SIZE', 2)
+    assert len(client.get('/api/patients?limit=500').get_json()) == 2
+    assert len(client.get('/api/patients?limit=0').get_json()) == 1
+    assert len(client.get('/api/patients?cursor=not-a-cursor').get_json()) == 2
@@ -0,0 +1,72 @@
+import gzip
+import json
+import shutil
+
+import pytest
+
+from app import assets, compression
+from app.assets import minify_css, minify_js
+
+
+def test_minify_css_keeps_selector_colons():
+    css = '/* c */\na :hover , b > i {\n  color : red ;\n  margin: 0 ;\n}\n@media (max-width: 600px) { p { top : 0 } }\n'
+    assert minify_css(css) == 'a :hover,b>i{color:red;margin:0}@media (max-width: 600px){p{top:0}}\n'
+
+
+def test_minify_js_drops_comment_lines_only():
+    assert minify_js('  // note\n  var a = "//x";\n\n  f();\n') == 'var a = "//x";\nf();\n'
+
+
+def test_minify_js_keeps_multiline_template_literals():
+    js = '  el.innerHTML = `<p>  \n\n    // not a comment\n    <b>${x}</b>`;\n  // note\n  f(`a`);\n'
+    assert minify_js(js) == 'el.innerHTML = `<p>  \n\n    // not a comment\n    <b>${x}</b>`;\nf(`a`);\n'
+
+
+@pytest.fixture
+def built(app, tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('dist'))
+    original = app.static_folder
+    app.static_folder = str(static)
+    yield assets.build_assets(str(static))
+    app.static_folder = original
+    assets.load_manifest(original)
+
+
+def test_build_writes_hashed_files_and_manifest(app, built, tmp_path):
+    hashed = built['css/style.css']
+    assert hashed.startswith('dist/css/style.') and hashed.endswith('.css')
+    dist = tmp_path / 'static'
+    assert json.loads((dist / 'dist' / 'manifest.json').read_text()) == built
+    assert gzip.decompress((dist / (hashed + '.gz')).read_bytes()) == (dist / hashed).read_bytes()
+    with app.test_request_context():
+        assert assets.url_for('static', filename='css/style.css') == f'/static/{hashed}'
+
+
+def test_hashed_assets_are_immutable_and_precompressed(app, built, client):
+    hashed = built['js/main.js']
+    resp = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200 and resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.mimetype in ('text/javascript', 'application/javascript')
+    assert 'immutable' in resp.headers['Cache-Control'] and 'Accept-Encoding' in resp.headers['Vary']
+    plain = client.get('/static/js/main.js')
+    assert 'Content-Encoding' not in plain.headers and 'immutable' not in plain.headers.get('Cache-Control', '')
+    plain.close()
+    resp.close()
+
+
+def test_json_is_compressed_but_html_is_not(app, seed, admin):
+    app.config['COMPRESS_MIN_SIZE'] = 10
+    resp = admin.get('/api/doctors', headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(resp.data))[0]['name'] == 'Alice Heart'
+    page = admin.get('/admin/appointments', headers={'Accept-Encoding': 'gzip'})
+    assert page.status_code == 200 and 'Content-Encoding' not in page.headers
+    assert 'text/html' not in compression.DEFAULT_MIMETYPES
+
+
+def test_small_bodies_and_no_accept_encoding_stay_plain(app, seed, client):
+    resp = client.get('/api/doctors?limit=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in resp.headers and 'Accept-Encoding' in resp.headers['Vary']
+    app.config['COMPRESS_MIN_SIZE'] = 10
+    assert 'Content-Encoding' not in client.get('/api/doctors').headers
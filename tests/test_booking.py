@@ -0,0 +1,84 @@
+import threading
+from datetime import time
+
+from app import db
+from app import booking
+from app.models import Appointment, Treatment
+
+from .conftest import add_appointment, login
+
+
+def test_book_claims_a_free_slot_once(app, seed):
+    d0, (p0, p1, _) = seed.doctor_ids[0], seed.patient_ids
+    with app.app_context():
+        first = booking.book(p0, d0, seed.tomorrow, time(9))
+        second = booking.book(p1, d0, seed.tomorrow, time(9))
+    assert first.status == booking.BOOKED and first.appointment_id
+    assert second.status == booking.CONFLICT and not second.ok
+
+
+def test_rebook_after_cancel_adds_a_new_row(app, seed):
+    d0, (p0, p1, _) = seed.doctor_ids[0], seed.patient_ids
+    with app.app_context():
+        old_id = add_appointment(d0, p0, seed.tomorrow, time(9), status='Cancelled')
+        db.session.add(Treatment(appointment_id=old_id, diagnosis='private'))
+        db.session.commit()
+        result = booking.book(p1, d0, seed.tomorrow, time(9))
+        assert result.ok and result.appointment_id != old_id
+        old, new = db.session.get(Appointment, old_id), db.session.get(Appointment, result.appointment_id)
+        assert (old.patient_id, old.status, old.treatment.diagnosis) == (p0, 'Cancelled', 'private')
+        assert (new.patient_id, new.status, new.treatment) == (p1, 'Booked', None)
+        assert booking.book(p0, d0, seed.tomorrow, time(9)).status == booking.CONFLICT
+
+
+def test_concurrent_bookings_leave_one_active_row(app, seed):
+    d0 = seed.doctor_ids[0]
+    with app.app_context():
+        add_appointment(d0, seed.patient_ids[2], seed.tomorrow, time(10), status='Cancelled')
+    barrier = threading.Barrier(len(seed.patient_ids))
+    results = []
+
+    def run(patient_id):
+        barrier.wait()
+        with app.app_context():
+            results.append(booking.book(patient_id, d0, seed.tomorrow, time(10)).status)
+            db.session.remove()
+
+    threads = [threading.Thread(target=run, args=(p,)) for p in seed.patient_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == [booking.BOOKED, booking.CONFLICT, booking.CONFLICT]
+    with app.app_context():
+        statuses = sorted(s for (s,) in db.session.query(Appointment.status).filter_by(doctor_id=d0))
+    assert statuses == ['Booked', 'Cancelled']
+
+
+def test_reschedule_keeps_the_cancelled_row_on_the_target_slot(app, seed):
+    d0, (p0, p1, _) = seed.doctor_ids[0], seed.patient_ids
+    with app.app_context():
+        cancelled_id = add_appointment(d0, p0, seed.tomorrow, time(11), status='Cancelled')
+        appt = db.session.get(Appointment, add_appointment(d0, p1, seed.tomorrow, time(9)))
+        result = booking.reschedule(appt, d0, seed.tomorrow, time(11))
+        assert result.ok
+        assert db.session.get(Appointment, cancelled_id).status == 'Cancelled'
+        other = db.session.get(Appointment, add_appointment(d0, p0, seed.tomorrow, time(10)))
+        assert booking.reschedule(other, d0, seed.tomorrow, time(11)).status == booking.CONFLICT
+
+
+def test_api_update_ignores_cancelled_rows_but_not_active_ones(app, seed):
+    d0, (p0, p1, _) = seed.doctor_ids[0], seed.patient_ids
+    with app.app_context():
+        add_appointment(d0, p0, seed.tomorrow, time(11), status='Cancelled')
+        appt_id = add_appointment(d0, p1, seed.tomorrow, time(9))
+        cancelled_id = add_appointment(d0, p1, seed.tomorrow, time(10), status='Cancelled')
+        add_appointment(d0, p0, seed.tomorrow, time(10))
+    client = app.test_client()
+    login(client, seed.admin_id)
+    body = {'patient_id': p1, 'doctor_id': d0, 'date': seed.tomorrow.isoformat(), 'time': '11:00',
+            'status': 'Booked'}
+    assert client.put(f'/api/appointments/{appt_id}', json=body).status_code == 200
+    body = dict(body, time='10:00')
+    assert client.put(f'/api/appointments/{cancelled_id}', json=body).status_code == 400
+
@@ -0,0 +1,54 @@
+from app import db
+from app.models import DoctorProfile, PatientProfile
+
+from .conftest import count_queries, login
+
+
+def test_api_etag_answers_304_with_one_query(app, seed, client):
+    first = client.get('/api/doctors')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag.startswith('W/') and first.headers['Last-Modified']
+    with app.app_context(), count_queries(db.engine) as counter:
+        again = client.get('/api/doctors', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert counter.count == 1  # the version row, no ORM objects
+    since = client.get('/api/doctors', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+
+
+def test_doctor_changes_bump_the_etag_but_patient_changes_do_not(app, seed, client):
+    etag = client.get(f'/api/doctors/{seed.doctor_ids[0]}').headers['ETag']
+    with app.app_context():
+        db.session.get(PatientProfile, seed.patient_ids[0]).contact = '999'
+        db.session.commit()
+    assert client.get(f'/api/doctors/{seed.doctor_ids[0]}', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.get(DoctorProfile, seed.doctor_ids[0]).specialization = 'Surgery'
+        db.session.rollback()
+    assert client.get(f'/api/doctors/{seed.doctor_ids[0]}', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.get(DoctorProfile, seed.doctor_ids[0]).specialization = 'Surgery'
+        db.session.commit()
+    resp = client.get(f'/api/doctors/{seed.doctor_ids[0]}', headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and resp.headers['ETag'] != etag
+
+
+def test_private_pages_are_validated_per_user(app, seed, patient):
+    resp = patient.get('/doctors')
+    etag = resp.headers['ETag']
+    assert resp.status_code == 200 and resp.headers['Cache-Control'] == 'private, no-cache'
+    assert patient.get('/doctors', headers={'If-None-Match': etag}).status_code == 304
+    # If-Modified-Since alone is not enough for a per-user page
+    assert patient.get('/doctors', headers={'If-Modified-Since': resp.headers['Last-Modified']}).status_code == 200
+    other = app.test_client()
+    login(other, seed.patient_user_ids[1])
+    assert other.get('/doctors', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_doctor_renames_invalidate_the_departments_page(app, seed, admin):
+    etag = admin.get('/admin/departments').headers['ETag']
+    assert admin.get('/admin/departments', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.get(DoctorProfile, seed.doctor_ids[1]).user.name = 'Bob Brainy'
+        db.session.commit()
+    assert admin.get('/admin/departments', headers={'If-None-Match': etag}).status_code == 200
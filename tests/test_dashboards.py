@@ -0,0 +1,78 @@
+from datetime import datetime, time, timedelta
+
+from app import db, dashboards
+from app.dashboards import patient_dashboard_data
+
+from .conftest import add_appointment, count_queries
+
+
+def test_patient_dashboard_in_two_queries(app, seed):
+    with app.app_context():
+        now = datetime.combine(seed.today, time(12))
+        doc, pat = seed.doctor_ids[0], seed.patient_ids[0]
+        future = add_appointment(doc, pat, seed.tomorrow, time(9))
+        add_appointment(doc, pat, seed.tomorrow, time(10), status='Cancelled')  # not upcoming
+        past = [add_appointment(doc, pat, seed.today - timedelta(days=k), time(9), status='Completed')
+                for k in range(1, 4)]
+        add_appointment(seed.doctor_ids[1], seed.patient_ids[1], seed.tomorrow, time(9))  # someone else's
+        db.session.expunge_all()
+
+        with count_queries(db.engine) as q:
+            data = patient_dashboard_data(pat, now=now)
+            assert [a.id for a in data['upcoming']] == [future]
+            assert [a.id for a in data['past']] == past  # most recent first
+            [a.doctor.user.name for a in data['past']]  # eager-loaded
+        assert q.count == 2
+        assert data['counts'] == {'Booked': 1, 'Completed': 3, 'Cancelled': 1, 'total': 5}
+        assert data['past_older_cursor'] is None
+
+
+def test_patient_history_pages(app, seed, monkeypatch):
+    monkeypatch.setattr(dashboards, 'PAST_PAGE_SIZE', 2)
+    with app.app_context():
+        now = datetime.combine(seed.today, time(12))
+        past = [add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.today - timedelta(days=k), time(9))
+                for k in range(1, 6)]
+        first = patient_dashboard_data(seed.patient_ids[0], now=now)
+        second = patient_dashboard_data(seed.patient_ids[0], now=now, past_cursor=first['past_older_cursor'])
+        third = patient_dashboard_data(seed.patient_ids[0], now=now, past_cursor=second['past_older_cursor'])
+        assert [a.id for d in (first, second, third) for a in d['past']] == past
+        assert third['past_older_cursor'] is None and not second['past_is_latest']
+
+
+def test_patient_without_appointments(app, seed, patient):
+    with app.app_context():
+        data = patient_dashboard_data(seed.patient_ids[2])
+        assert data['counts']['total'] == 0 and data['upcoming'] == [] and data['past'] == []
+    assert patient.get('/patient').status_code == 200
+    assert patient.get('/patient?past=garbage').status_code == 200
+
+
+def test_doctor_dashboard_bounds_upcoming_and_recent(app, seed, monkeypatch):
+    monkeypatch.setattr(dashboards, 'UPCOMING_LIMIT', 3)
+    with app.app_context():
+        now = datetime.combine(seed.today, time(12))
+        doc = seed.doctor_ids[0]
+        upcoming = [add_appointment(doc, seed.patient_ids[k % 3], seed.tomorrow, time(9, k)) for k in range(5)]
+        done = add_appointment(doc, seed.patient_ids[0], seed.tomorrow, time(11), status='Completed')
+        old = add_appointment(doc, seed.patient_ids[1], seed.today - timedelta(days=2), time(9))
+        with count_queries(db.engine) as q:
+            data = dashboards.doctor_dashboard_data(doc, now=now)
+        assert q.count == 2
+        assert [a.id for a in data['upcoming']] == upcoming[:3] and data['more_upcoming']
+        assert [a.id for a in data['recent']] == [done, old]
+
+
+def test_doctor_calendar_access_and_range(app, seed, doctor, patient, admin):
+    with app.app_context():
+        appt = add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.tomorrow, time(9))
+    url = f'/api/doctor/{seed.doctor_ids[0]}/calendar'
+    body = doctor.get(url).get_json()
+    assert [a['id'] for a in body['appointments']] == [appt] and len(body['availability']) == 7
+    assert admin.get(url).status_code == 200
+    assert patient.get(url).status_code == 403
+    assert doctor.get(f'/api/doctor/{seed.doctor_ids[1]}/calendar').status_code == 403
+    assert doctor.get(url + '?start=2030-01-01&end=2030-12-31').status_code == 400
+    assert doctor.get(url + '?start=2030-01-02&end=2030-01-01').status_code == 400
+    assert doctor.get(url + '?end=bogus').status_code == 400
+    assert doctor.get('/doctor').status_code == 200
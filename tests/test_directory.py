@@ -0,0 +1,35 @@
+from app import db, directory
+from app.models import DoctorProfile
+
+
+def test_typo_prefix_and_exact_lookups(app, seed):
+    with app.app_context():
+        assert directory.fuzzy_doctor_ids('neurolgy') == [seed.doctor_ids[1]]
+        assert directory.fuzzy_doctor_ids('neuro') == [seed.doctor_ids[1]]
+        # every doctor is in the Cardiology department
+        assert set(directory.fuzzy_doctor_ids('cardiolgy')) == set(seed.doctor_ids)
+        assert directory.fuzzy_doctor_ids('carol cardiology') == [seed.doctor_ids[2]]
+        assert directory.fuzzy_doctor_ids('zzzz') == []
+        assert directory.fuzzy_doctor_ids('@@') == []
+
+
+def test_blacklisted_doctors_are_hidden_after_commit(app, seed):
+    with app.app_context():
+        doc = db.session.get(DoctorProfile, seed.doctor_ids[1])
+        doc.is_blacklisted = True
+        db.session.commit()
+        assert directory.fuzzy_doctor_ids('neurology') == []
+        assert directory.fuzzy_doctor_ids('neurology', include_blacklisted=True) == [seed.doctor_ids[1]]
+
+
+def test_autocomplete_endpoint(patient, client, seed):
+    rows = patient.get('/api/doctors/autocomplete?q=alise&limit=1').get_json()
+    assert [r['id'] for r in rows] == [seed.doctor_ids[0]]
+    assert patient.get('/api/doctors/autocomplete?q=').get_json() == []
+    assert patient.get('/api/doctors/autocomplete?q=a&limit=x').status_code == 200
+    assert client.get('/api/doctors/autocomplete?q=alice').status_code == 302
+
+
+def test_search_page_binds_autocomplete_once(patient):
+    body = patient.get('/doctors/search?q=cardio').get_data(as_text=True)
+    assert body.count('bindAutocomplete') == 1
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from datetime import time
+
+from app import db, exports
+from app.models import Treatment
+
+from .conftest import add_appointment, login
+
+
+def _add_treatment(app, seed, diagnosis):
+    with app.app_context():
+        appt_id = add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.tomorrow, time(9), 'Completed')
+        db.session.add(Treatment(appointment_id=appt_id, diagnosis=diagnosis, prescription='-5 mg'))
+        db.session.commit()
+        return appt_id
+
+
+def test_ndjson_export_streams_every_row(app, seed, admin):
+    resp = admin.get('/api/export/doctors?fields=id,name')
+    assert resp.status_code == 200 and resp.mimetype == 'application/x-ndjson'
+    assert 'attachment; filename=doctors-' in resp.headers['Content-Disposition']
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert rows == [{'id': i, 'name': n} for i, n in zip(seed.doctor_ids, ['Alice Heart', 'Bob Brain', 'Carol Pulse'])]
+
+
+def test_csv_export_neutralises_formulas(app, seed, admin):
+    appt_id = _add_treatment(app, seed, '=HYPERLINK("http://x","click")')
+    resp = admin.get('/api/export/treatments?format=csv&fields=appointment_id,diagnosis,prescription,notes')
+    assert resp.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+    assert rows == [['appointment_id', 'diagnosis', 'prescription', 'notes'],
+                    [str(appt_id), '\'=HYPERLINK("http://x","click")', "'-5 mg", '']]
+
+
+def test_csv_chunks_split_rows_and_keep_numbers():
+    rows = [(1, '@SUM(A1)'), (-2, 'plain'), (3, None)]
+    chunks = list(exports.csv_chunks(rows, ['id', 'note'], 2))
+    assert len(chunks) == 2
+    assert ''.join(chunks).splitlines() == ['id,note', "1,'@SUM(A1)", '-2,plain', '3,']
+
+
+def test_exports_are_admin_only(app, seed, client, doctor):
+    _add_treatment(app, seed, 'private')
+    assert client.get('/api/export/treatments').status_code == 401
+    assert doctor.get('/api/export/treatments').status_code == 403
+    patient = app.test_client()
+    login(patient, seed.patient_user_ids[0])
+    assert patient.get('/api/export/appointments?format=csv').status_code == 403
+
+
+def test_export_rejects_unknown_kind_and_format(app, seed, admin):
+    assert admin.get('/api/export/users').status_code == 404
+    assert admin.get('/api/export/doctors?format=xml').status_code == 400
+
+
+def test_doctor_feed_joins_patient_names(app, seed, doctor):
+    appt_id = _add_treatment(app, seed, 'x')
+    assert doctor.get(f'/api/doctor/{seed.doctor_ids[0]}/appointments').get_json() == [{
+        'id': appt_id, 'date': seed.tomorrow.isoformat(), 'time': '09:00', 'status': 'Completed',
+        'patient_name': 'Pat Adams'}]
@@ -0,0 +1,56 @@
+import os
+from datetime import time
+
+from app import create_app, db, holds
+from app.models import SlotHold
+
+from .conftest import login, csrf_headers
+
+
+def _hold_body(seed, at='09:00'):
+    return {'doctor_id': seed.doctor_ids[0], 'date': seed.tomorrow.isoformat(), 'time': at}
+
+
+def test_patient_holds_and_releases_own_slot(app, seed, patient):
+    resp = patient.post('/api/holds', json=_hold_body(seed), headers=csrf_headers(patient))
+    assert resp.status_code == 201
+    hold_id = resp.get_json()['hold_id']
+    with app.app_context():
+        hold = db.session.get(SlotHold, hold_id)
+        assert (hold.patient_id, hold.time) == (seed.patient_ids[0], time(9))
+    assert patient.delete(f'/api/holds/{hold_id}', headers=csrf_headers(patient)).status_code == 200
+
+
+def test_holds_need_a_patient_session(app, seed, client, doctor):
+    assert client.post('/api/holds', json=_hold_body(seed)).status_code == 401
+    assert doctor.post('/api/holds', json=_hold_body(seed), headers=csrf_headers(doctor)).status_code == 403
+    patient = app.test_client()
+    login(patient, seed.patient_user_ids[0])
+    assert patient.post('/api/holds', json=_hold_body(seed)).status_code == 403  # no CSRF token
+
+
+def test_patient_cannot_release_anothers_hold(app, seed, patient):
+    hold_id = patient.post('/api/holds', json=_hold_body(seed), headers=csrf_headers(patient)).get_json()['hold_id']
+    other = app.test_client()
+    login(other, seed.patient_user_ids[1])
+    assert other.delete(f'/api/holds/{hold_id}', headers=csrf_headers(other)).status_code == 404
+    assert app.test_client().delete(f'/api/holds/{hold_id}').status_code == 401
+
+
+def test_sweeper_starts_on_first_request_once_per_process(tmp_path, monkeypatch):
+    started = []
+    monkeypatch.setattr(holds.HoldSweeper, 'start', lambda self: started.append(self))
+    monkeypatch.setattr(holds, '_sweeper', None)
+    monkeypatch.setattr(holds, '_sweeper_pid', None)
+    app = create_app({'SLOT_HOLD_SWEEP_INTERVAL': 30,
+                      'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'sweep.db'}"})
+    assert started == []  # not at import/create time, so a forked worker starts its own
+    client = app.test_client()
+    client.get('/login')
+    client.get('/login')
+    assert len(started) == 1 and holds._sweeper_pid == os.getpid()
+    monkeypatch.setattr(holds, '_sweeper_pid', -1)  # as seen from a forked child
+    client.get('/login')
+    assert len(started) == 2
+    with app.app_context():
+        db.engine.dispose()
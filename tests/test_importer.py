@@ -0,0 +1,84 @@
+from datetime import time
+
+from sqlalchemy.exc import OperationalError
+
+from app import db, importer
+from app.models import Appointment
+
+from .conftest import add_appointment, csrf_headers, login
+
+
+def _row(seed, patient=0, at='09:00', **extra):
+    return dict({'patient_id': seed.patient_ids[patient], 'doctor_id': seed.doctor_ids[0],
+                 'date': seed.tomorrow.isoformat(), 'time': at}, **extra)
+
+
+def test_import_creates_rows_and_reports_per_row_errors(app, seed):
+    rows = [_row(seed), _row(seed, 1, at='09:00'), _row(seed, at='10:00', status=1),
+            _row(seed, at='11:00', status='Completed'), 'Invalid JSON']
+    with app.app_context():
+        summary = importer.import_appointments(rows, chunk=2)
+        assert (summary['created'], summary['failed']) == (2, 3)
+        statuses = [r['status'] for r in summary['results']]
+        assert statuses == ['created', 'error', 'error', 'created', 'error']
+        assert summary['results'][2]['error'].startswith('status must be one of')
+        assert Appointment.query.count() == 2
+
+
+def test_import_books_a_cancelled_slot_as_a_new_row(app, seed):
+    with app.app_context():
+        cancelled_id = add_appointment(seed.doctor_ids[0], seed.patient_ids[2], seed.tomorrow, time(9),
+                                       status='Cancelled')
+        summary = importer.import_appointments([_row(seed)])
+        assert summary['created'] == 1 and summary['results'][0]['id'] != cancelled_id
+        assert db.session.get(Appointment, cancelled_id).patient_id == seed.patient_ids[2]
+
+
+
+
+def test_import_chunk_inserts_against_the_partial_index(app, seed):
+    d0, (p0, p1, _) = seed.doctor_ids[0], seed.patient_ids
+    with app.app_context():
+        add_appointment(d0, p0, seed.tomorrow, time(9), status='Cancelled')
+        rows = [{'patient_id': p, 'doctor_id': d0, 'date': seed.tomorrow.isoformat(), 'time': at}
+                for p, at in [(p1, '09:00'), (p1, '10:00')]]
+        assert importer.import_appointments(rows)['created'] == 2
+
+
+def test_import_reports_a_failed_chunk_and_keeps_going(app, seed, monkeypatch):
+    write_chunk = importer._write_chunk
+
+    def flaky(inserts, stamp):
+        if inserts[0][0] == 2:
+            raise OperationalError('INSERT', {}, Exception('database is locked'))
+        return write_chunk(inserts, stamp)
+
+    monkeypatch.setattr(importer, '_write_chunk', flaky)
+    rows = [_row(seed, at='09:00'), _row(seed, at='10:00'), _row(seed, at='11:00')]
+    with app.app_context():
+        summary = importer.import_appointments(rows, chunk=1)
+        assert (summary['created'], summary['failed']) == (2, 1)
+        assert summary['results'][1] == {'row': 2, 'status': 'error', 'error': importer.CHUNK_FAILED}
+        assert Appointment.query.count() == 2
+
+def test_import_dry_run_writes_nothing(app, seed):
+    with app.app_context():
+        summary = importer.import_appointments([_row(seed), _row(seed, at='bad')], dry_run=True)
+        assert (summary['valid'], summary['failed']) == (1, 1)
+        assert Appointment.query.count() == 0
+
+
+def test_import_api_is_admin_only(app, seed, client, admin, doctor):
+    body = {'appointments': [_row(seed)]}
+    assert client.post('/api/appointments/import', json=body).status_code == 401
+    assert doctor.post('/api/appointments/import', json=body, headers=csrf_headers(doctor)).status_code == 403
+    assert admin.post('/api/appointments/import', json=body).status_code == 403  # no CSRF token
+    resp = admin.post('/api/appointments/import', json=body, headers=csrf_headers(admin))
+    assert resp.status_code == 200 and resp.get_json()['created'] == 1
+
+
+def test_import_api_accepts_csv_upload(app, seed, admin):
+    text = f'patient_id,doctor_id,date,time\n{seed.patient_ids[0]},{seed.doctor_ids[0]},{seed.tomorrow},09:30\n'
+    resp = admin.post('/api/appointments/import?dry_run=1', data=text, content_type='text/csv',
+                      headers=csrf_headers(admin))
+    assert resp.status_code == 200 and resp.get_json()['valid'] == 1
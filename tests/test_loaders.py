@@ -0,0 +1,36 @@
+from datetime import time
+
+import pytest
+
+from app import db
+from app.loaders import with_profile
+from app.models import Appointment
+
+from .conftest import add_appointment, count_queries
+
+
+def _queries(app, client, url):
+    with app.app_context():
+        engine = db.engine
+    with count_queries(engine) as counter:
+        assert client.get(url).status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize('page', ['appointments', 'doctor_history', 'patient_history'])
+def test_appointment_rows_do_not_lazy_load(app, seed, admin, page):
+    url = {'appointments': '/admin/appointments',
+           'doctor_history': f'/admin/doctor/{seed.doctor_ids[0]}/view',
+           'patient_history': f'/admin/patient/{seed.patient_ids[0]}/view'}[page]
+    with app.app_context():
+        add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.today, time(9))
+    few = _queries(app, admin, url)
+    with app.app_context():
+        for k in range(12):
+            add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.tomorrow, time(10, k))
+    assert _queries(app, admin, url) == few
+
+
+def test_unknown_profile(app):
+    with app.app_context(), pytest.raises(ValueError):
+        with_profile(Appointment.query, 'no_such_profile')
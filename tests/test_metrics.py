@@ -0,0 +1,30 @@
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db, metrics
+
+
+def test_server_timing_and_endpoint_stats(app, seed, admin):
+    metrics.reset()
+    r = admin.get('/admin/appointments')
+    assert re.search(r'db;dur=[\d.]+;desc="\d+ queries, \d+ rows"', r.headers['Server-Timing'])
+    assert metrics.snapshot()['main.admin_appointments']['requests'] == 1
+
+
+def test_query_budget_is_strict_in_tests(app, seed, admin):
+    app.config['QUERY_BUDGETS'] = {'main.admin_appointments': 1}
+    with pytest.raises(metrics.QueryBudgetExceeded):
+        admin.get('/admin/appointments')
+
+
+def test_failed_statement_does_not_leak_its_start_time(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            assert conn.info.get('_query_start') == []
+            conn.execute(text('SELECT 1'))
+            assert conn.info['_query_start'] == []
@@ -0,0 +1,67 @@
+from sqlalchemy.orm import Session
+
+from app import db, onboarding
+from app.models import User, DoctorProfile
+
+from .conftest import csrf_headers
+
+
+def _users(seed):
+    return [
+        {'role': 'doctor', 'name': 'Dan Derm', 'email': 'dan@x.com', 'password': 'secret1',
+         'department_id': seed.department_id, 'specialization': 'Dermatology'},
+        {'role': 'patient', 'name': 'Quinn Doe', 'email': 'QUINN@x.com', 'dob': '1990-05-01'},
+        {'role': 'nurse', 'name': 'Nope', 'email': 'n@x.com'},
+        {'role': 'patient', 'name': 'Dup', 'email': 'p0@x.com'},
+        {'role': 'patient', 'name': 'Num', 'email': 'num@x.com', 'password': 1234567},
+        {'role': 'doctor', 'name': 'Bad Dept', 'email': 'bd@x.com', 'department_id': [1]},
+    ]
+
+
+def test_onboard_creates_users_and_reports_row_errors(app, seed):
+    with app.app_context():
+        summary = onboarding.onboard(_users(seed), workers=1)
+        assert (summary['created'], summary['failed']) == (2, 4)
+        errors = [r.get('error') for r in summary['results'][2:]]
+        assert errors == ['role must be doctor or patient', 'Email already exists',
+                          'password must be a string', 'department_id must be an integer']
+        doctor = DoctorProfile.query.get(summary['results'][0]['id'])
+        assert (doctor.user.email, doctor.department_id) == ('dan@x.com', seed.department_id)
+        assert doctor.user.check_password('secret1')
+        assert User.query.filter_by(email='quinn@x.com').one().role == 'patient'
+
+
+def test_onboard_rolls_back_only_the_failing_chunk(app, seed, monkeypatch):
+    hash_passwords = onboarding.hash_passwords
+
+    def hash_while_someone_registers(passwords, workers=None):
+        with Session(db.engine) as other:  # takes the second email after validation
+            user = User(email='quinn@x.com', name='Early Quinn', role='patient')
+            user.set_password('pw')
+            other.add(user)
+            other.commit()
+        return hash_passwords(passwords, workers)
+
+    monkeypatch.setattr(onboarding, 'hash_passwords', hash_while_someone_registers)
+    with app.app_context():
+        summary = onboarding.onboard(_users(seed)[:2], chunk=1, workers=1)
+        assert (summary['created'], summary['failed']) == (1, 1)
+        assert summary['results'][1] == {'row': 2, 'status': 'error', 'error': onboarding.CHUNK_FAILED}
+        assert User.query.filter_by(email='dan@x.com').one().role == 'doctor'
+        assert User.query.filter_by(email='quinn@x.com').one().name == 'Early Quinn'
+
+def test_onboard_dry_run_writes_nothing(app, seed):
+    with app.app_context():
+        summary = onboarding.onboard(_users(seed)[:2], dry_run=True)
+        assert (summary['valid'], summary['failed']) == (2, 0)
+        assert User.query.filter_by(email='dan@x.com').first() is None
+
+
+def test_onboarding_api_is_admin_only(app, seed, client, admin, patient):
+    body = {'users': _users(seed)[1:2]}
+    assert client.post('/api/onboarding', json=body).status_code == 401
+    assert patient.post('/api/onboarding', json=body, headers=csrf_headers(patient)).status_code == 403
+    assert admin.post('/api/onboarding', json=body).status_code == 403  # no CSRF token
+    resp = admin.post('/api/onboarding?dry_run=1', json=body, headers=csrf_headers(admin))
+    assert resp.status_code == 200 and resp.get_json()['valid'] == 1
+    assert admin.post('/api/onboarding', json={'users': 'x'}, headers=csrf_headers(admin)).status_code == 400
@@ -0,0 +1,53 @@
+from datetime import time, timedelta
+
+from app import db
+from app.models import Appointment, DoctorProfile
+from app.pagination import keyset_paginate, APPOINTMENTS_RECENT_FIRST, by_user_name
+
+from .conftest import add_appointment
+
+
+def _all_pages(query, keys, per_page):
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(query, keys, cursor, per_page)
+        pages.append(page)
+        if not page.has_next:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_walks_every_row_once_in_order(app, seed):
+    with app.app_context():
+        for n in range(23):
+            add_appointment(seed.doctor_ids[n % 3], seed.patient_ids[0],
+                            seed.today + timedelta(days=n % 5), time(9, n))
+        pages = _all_pages(Appointment.query, APPOINTMENTS_RECENT_FIRST, 5)
+        ids = [a.id for p in pages for a in p.items]
+        expected = [a.id for a in Appointment.query.order_by(
+            Appointment.date.desc(), Appointment.time.desc(), Appointment.id.desc())]
+        assert ids == expected
+        assert [len(p.items) for p in pages] == [5, 5, 5, 5, 3]
+
+        back = keyset_paginate(Appointment.query, APPOINTMENTS_RECENT_FIRST, pages[2].prev_cursor, 5)
+        assert [a.id for a in back.items] == [a.id for a in pages[1].items]
+        assert back.has_prev and back.has_next
+
+
+def test_column_query_and_name_order(app, seed):
+    with app.app_context():
+        query = db.session.query(DoctorProfile.id).join(DoctorProfile.user)
+        page = keyset_paginate(query, by_user_name(DoctorProfile), None, 2)
+        assert len(page.items) == 2 and page.has_next
+        rest = keyset_paginate(query, by_user_name(DoctorProfile), page.next_cursor, 2)
+        assert page.items + rest.items == seed.doctor_ids  # Alice, Bob, Carol
+
+
+def test_empty_and_tampered_cursor(app, seed):
+    with app.app_context():
+        empty = keyset_paginate(Appointment.query, APPOINTMENTS_RECENT_FIRST, None, 5, total_mode='exact')
+        assert empty.items == [] and not empty.has_next and not empty.has_prev and empty.total == 0
+
+        add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.today, time(9))
+        page = keyset_paginate(Appointment.query, APPOINTMENTS_RECENT_FIRST, 'not-a-cursor', 5)
+        assert len(page.items) == 1 and not page.has_prev
@@ -0,0 +1,136 @@
+from datetime import date, datetime, time, timedelta
+
+from app import db, schedules
+from app.models import AvailabilityTemplate, AvailabilityException, DoctorAvailability
+
+from .conftest import csrf_headers
+
+MONDAY = date(2030, 1, 7)
+
+
+def _windows(doctor_id):
+    return {(a.date, a.start_time, a.source) for a in
+            DoctorAvailability.query.filter(DoctorAvailability.doctor_id == doctor_id,
+                                            DoctorAvailability.date >= MONDAY)}
+
+
+def test_planned_rows_skip_holidays_and_days_off():
+    templates = [(1, 0, time(9), time(12)), (1, 2, time(13), time(17)), (2, 0, time(8), time(10))]
+    exceptions = [(None, MONDAY + timedelta(days=7)), (2, MONDAY)]
+    rows = schedules.planned_rows(templates, exceptions, MONDAY, 14, datetime(2030, 1, 1))
+    assert [(r['doctor_id'], r['date'].day) for r in rows] == [(1, 7), (1, 9), (1, 16)]
+    assert schedules.planned_rows([], [], MONDAY, 14, None) == []
+
+
+def test_materialize_keeps_manual_rows_and_drops_stale_ones(app, seed):
+    doc = seed.doctor_ids[0]
+    with app.app_context():
+        db.session.add_all([AvailabilityTemplate(doctor_id=doc, weekday=0, start_time=time(9), end_time=time(12)),
+                            AvailabilityTemplate(doctor_id=doc, weekday=1, start_time=time(9), end_time=time(12))])
+        db.session.add(DoctorAvailability(doctor_id=doc, date=MONDAY + timedelta(days=1), start_time=time(14),
+                                          end_time=time(15), source='manual'))
+        db.session.commit()
+        assert schedules.materialize([doc], start=MONDAY, days=7) == {'written': 2, 'removed': 0}
+        db.session.commit()
+        assert _windows(doc) == {(MONDAY, time(9), 'template'), (MONDAY + timedelta(days=1), time(14), 'manual')}
+
+        AvailabilityTemplate.query.filter_by(doctor_id=doc, weekday=0).delete()
+        db.session.add(AvailabilityException(doctor_id=doc, date=MONDAY + timedelta(days=1)))
+        result = schedules.materialize([doc], start=MONDAY, days=7)
+        db.session.commit()
+        assert result['removed'] == 2 and _windows(doc) == set()
+
+
+def test_weekly_form_validates_before_writing(app, seed, doctor):
+    with doctor.session_transaction() as sess:
+        token = sess['csrf_token']
+    form = {'csrf_token': token, 'w0_start': '09:00', 'w0_end': '08:00'}
+    assert doctor.post('/doctor/availability/weekly', data=form).status_code == 200
+    with app.app_context():
+        assert AvailabilityTemplate.query.count() == 0
+    form.update(w0_end='12:00')
+    assert doctor.post('/doctor/availability/weekly', data=form).status_code == 302
+    with app.app_context():
+        assert AvailabilityTemplate.query.filter_by(doctor_id=seed.doctor_ids[0]).count() == 1
+
+
+
+def test_weekly_form_rejects_out_of_range_times_with_a_readable_message(app, seed, doctor):
+    with doctor.session_transaction() as sess:
+        token = sess['csrf_token']
+    form = {'csrf_token': token, 'w0_start': '09:00', 'w0_end': '25:00'}
+    body = doctor.post('/doctor/availability/weekly', data=form).get_data(as_text=True)
+    assert 'Invalid time for Monday: use HH:MM' in body and 'hour must be' not in body
+    with app.app_context():
+        assert AvailabilityTemplate.query.count() == 0
+
+def test_save_availability_upserts_clears_and_skips(app, seed):
+    doc, day = seed.doctor_ids[0], seed.tomorrow
+    with app.app_context():
+        result = schedules.save_availability([
+            (doc, day, (time(14), time(16))),                   # changed window
+            (doc, seed.today, (time(9), time(12))),             # same as before
+            (doc, day + timedelta(days=1), None),               # cleared
+            (doc, day + timedelta(days=30), None),              # nothing to clear
+        ])
+        db.session.commit()
+        assert result == {'saved': 1, 'cleared': 1, 'unchanged': 2}
+        row = DoctorAvailability.query.filter_by(doctor_id=doc, date=day).one()
+        assert (row.start_time, row.source) == (time(14), 'manual')
+
+
+def test_clearing_a_manual_day_on_a_template_weekday_stays_cleared(app, seed):
+    doc = seed.doctor_ids[0]
+    with app.app_context():
+        db.session.add(AvailabilityTemplate(doctor_id=doc, weekday=0, start_time=time(9), end_time=time(12)))
+        schedules.materialize([doc], start=MONDAY, days=7)
+        schedules.save_availability([(doc, MONDAY, (time(14), time(16)))])   # hand edit: now 'manual'
+        db.session.commit()
+        assert _windows(doc) == {(MONDAY, time(14), 'manual')}
+        schedules.save_availability([(doc, MONDAY, None)])
+        schedules.materialize([doc], start=MONDAY, days=7)
+        db.session.commit()
+        assert _windows(doc) == set()
+        assert AvailabilityException.query.filter_by(doctor_id=doc, date=MONDAY).count() == 1
+
+
+def test_clear_all_records_days_off_for_template_days(app, seed, doctor):
+    doc = seed.doctor_ids[0]
+    with app.app_context():
+        db.session.add(AvailabilityTemplate(doctor_id=doc, weekday=seed.tomorrow.weekday(),
+                                            start_time=time(9), end_time=time(12)))
+        db.session.commit()
+    with doctor.session_transaction() as sess:
+        token = sess['csrf_token']
+    assert doctor.post('/doctor/availability', data={'csrf_token': token, 'clear_all': '1'}).status_code == 302
+    with app.app_context():
+        assert DoctorAvailability.query.filter_by(doctor_id=doc).count() == 0
+        assert [e.date for e in AvailabilityException.query.filter_by(doctor_id=doc)] == [seed.tomorrow]
+
+def _bulk(client, items, headers=None):
+    return client.post('/api/availability', json={'availability': items}, headers=headers or {})
+
+
+def test_bulk_availability_requires_a_doctor_or_admin(app, seed, client, patient, doctor, admin):
+    item = {'doctor_id': seed.doctor_ids[1], 'date': seed.tomorrow.isoformat(), 'start': '10:00', 'end': '11:00'}
+    assert _bulk(client, [item]).status_code == 401
+    assert _bulk(patient, [item], csrf_headers(patient)).status_code == 403
+    assert _bulk(admin, [item]).status_code == 403                       # no CSRF token
+    # a doctor may only write their own days
+    assert _bulk(doctor, [item], csrf_headers(doctor)).status_code == 403
+    own = {k: v for k, v in item.items() if k != 'doctor_id'}
+    assert _bulk(doctor, [own], csrf_headers(doctor)).get_json()['saved'] == 1
+    assert _bulk(admin, [item], csrf_headers(admin)).get_json()['saved'] == 1
+    with app.app_context():
+        assert DoctorAvailability.query.filter_by(date=seed.tomorrow, start_time=time(10)).count() == 2
+
+
+def test_bulk_availability_validates_everything_first(admin, seed):
+    items = [{'doctor_id': seed.doctor_ids[0], 'date': seed.tomorrow.isoformat(), 'start': '10:00', 'end': '11:00'},
+             {'doctor_id': 999, 'date': seed.tomorrow.isoformat(), 'start': '10:00', 'end': '11:00'},
+             {'doctor_id': seed.doctor_ids[0], 'date': 'soon'},
+             {'doctor_id': seed.doctor_ids[0], 'date': seed.tomorrow.isoformat(), 'start': 9, 'end': '08:00'},
+             ['not', 'an', 'object']]
+    r = _bulk(admin, items, csrf_headers(admin))
+    assert r.status_code == 400
+    assert [e['index'] for e in r.get_json()['errors']] == [2, 3, 4, 1]
@@ -0,0 +1,72 @@
+import threading
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import db
+from app.schema import upgrade_schema, check_index_usage
+
+
+def test_hot_path_queries_use_their_indexes(app):
+    with app.app_context():
+        assert check_index_usage() == []
+
+
+def test_upgrade_adds_missing_columns_and_indexes(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE department (id INTEGER PRIMARY KEY, name VARCHAR(120) NOT NULL UNIQUE)'))
+    with app.app_context():
+        actions = upgrade_schema(engine)
+        assert 'added column department.description' in actions
+        assert any(a.startswith('created table appointment') for a in actions)
+        assert upgrade_schema(engine) == []
+    assert 'description' in {c['name'] for c in inspect(engine).get_columns('department')}
+
+
+def test_concurrent_upgrades_do_not_collide(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={'timeout': 30})
+    workers = 6
+    barrier = threading.Barrier(workers)
+    results, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            with app.app_context():
+                results.append(upgrade_schema(engine))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sum(1 for r in results if r) == 1  # exactly one worker did the work
+    assert set(db.metadata.tables) <= set(inspect(engine).get_table_names())
+
+
+def test_upgrade_replaces_the_old_slot_constraint(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with app.app_context():
+        db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE appointment'))
+        conn.execute(text(
+            'CREATE TABLE appointment (id INTEGER PRIMARY KEY, patient_id INTEGER, doctor_id INTEGER, '
+            'date DATE NOT NULL, time TIME NOT NULL, status VARCHAR(20), '
+            'CONSTRAINT uix_doctor_datetime UNIQUE (doctor_id, date, time))'))
+        conn.execute(text("INSERT INTO appointment VALUES (7, 1, 1, '2030-01-07', '09:00:00.000000', 'Cancelled')"))
+        conn.execute(text("INSERT INTO treatment (appointment_id, diagnosis) VALUES (7, 'flu')"))
+    with app.app_context():
+        actions = upgrade_schema(engine)
+        assert 'dropped constraint appointment.uix_doctor_datetime' in actions
+        assert 'created index uix_doctor_datetime' in actions
+        assert upgrade_schema(engine) == []
+    assert inspect(engine).get_unique_constraints('appointment') == []
+    with engine.begin() as conn:
+        assert conn.execute(text('SELECT id, status FROM appointment')).all() == [(7, 'Cancelled')]
+        conn.execute(text("INSERT INTO appointment (patient_id, doctor_id, date, time, status) "
+                          "VALUES (2, 1, '2030-01-07', '09:00:00.000000', 'Booked')"))
+        assert conn.execute(text('SELECT appointment_id FROM treatment')).scalar() == 7
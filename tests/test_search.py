@@ -0,0 +1,49 @@
+import pytest
+
+from app import db, search
+from app.models import DoctorProfile, User
+
+
+@pytest.fixture(params=['fts5', 'memory'])
+def index(request, app, seed):
+    """Each test runs against both backends."""
+    previous = search._index
+    if request.param == 'memory':
+        search._index = search.MemoryIndex()
+    elif not isinstance(previous, search.FTSIndex):
+        pytest.skip('SQLite built without FTS5')
+    with app.app_context():
+        search.rebuild_index()
+    yield search._index
+    search._index = previous
+
+
+def test_prefix_words_and_ranking(app, seed, index):
+    with app.app_context():
+        assert set(search.ranked_ids('doctor', 'card')) == {seed.doctor_ids[0], seed.doctor_ids[2]}
+        assert search.ranked_ids('doctor', 'alice card') == [seed.doctor_ids[0]]
+        assert search.count_matches('patient', 'pat') == 3
+        ids = [d.id for d in DoctorProfile.query.filter(search.match_criterion('doctor', 'BRAIN'))]
+        assert ids == [seed.doctor_ids[1]]
+
+
+def test_index_follows_committed_changes(app, seed, index):
+    with app.app_context():
+        user = db.session.get(User, seed.doctor_user_ids[1])
+        user.name = 'Bob Zephyr'
+        db.session.commit()
+        assert search.ranked_ids('doctor', 'zeph') == [seed.doctor_ids[1]]
+        assert search.ranked_ids('doctor', 'brain') == []
+
+
+@pytest.mark.parametrize('q', ['', '   ', '@@', '"*', '-+()'])
+def test_query_without_words_matches_nothing(app, seed, index, q):
+    with app.app_context():
+        assert search.ranked_ids('doctor', q) == []
+        assert search.count_matches('patient', q) == 0
+        assert DoctorProfile.query.filter(search.match_criterion('doctor', q)).count() == 0
+
+
+@pytest.mark.parametrize('url', ['/doctors/search?q=@@', '/search?q=@@&by=doctor', '/search?q=@@&by=patient'])
+def test_symbol_only_search_pages(admin, url):
+    assert admin.get(url).status_code == 200
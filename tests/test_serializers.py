@@ -0,0 +1,33 @@
+from datetime import date, time
+
+from flask_restful import marshal
+
+from app import db, serializers
+from app.api.resources import appointment_fields
+from app.models import Appointment
+
+from .conftest import add_appointment
+
+
+def test_rows_match_marshal_output(app, seed):
+    with app.app_context():
+        add_appointment(seed.doctor_ids[0], seed.patient_ids[0], date(2030, 1, 7), time(9, 30))
+        names = serializers.field_names('appointments')
+        rows = serializers.row_query(db.session, 'appointments', names).all()
+        fast = serializers.dumps(serializers.rows_to_dicts(rows, names))
+        legacy = marshal(Appointment.query.all(), appointment_fields)
+        assert fast == serializers.dumps(legacy)
+        assert b'"date":"2030-01-07","time":"09:30:00"' in fast
+
+
+def test_row_query_selects_only_the_requested_columns(app, seed):
+    with app.app_context():
+        query = serializers.row_query(db.session, 'doctors', ['name'])
+        assert [c['name'] for c in query.column_descriptions] == ['name']
+        assert sorted(r.name for r in query) == ['Alice Heart', 'Bob Brain', 'Carol Pulse']
+        assert len(db.session.identity_map) == 0
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert serializers.dumps({'d': date(2030, 1, 7), 'n': None}) == b'{"d":"2030-01-07","n":null}'
@@ -0,0 +1,76 @@
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+from app import slots
+
+from .conftest import add_appointment
+
+
+def _ints(*values):
+    return tuple(np.array(v, dtype=np.int64) for v in values)
+
+
+def test_slot_grid_windows_bookings_and_now():
+    # one doctor, two days; windows 9:00-10:15 and 14:00-15:00
+    windows = _ints([0, 0], [0, 1], [540, 840], [615, 900])
+    booked = _ints([0], [0], [570])  # 9:30 on day 0
+    free = slots.slot_grid(1, 2, 30, windows, booked)
+    assert list(np.nonzero(free[0, 0])[0]) == [18]        # 9:00 (10:00 would end after 10:15)
+    assert list(np.nonzero(free[0, 1])[0]) == [28, 29]    # 14:00, 14:30
+    past = slots.slot_grid(1, 2, 30, windows, _ints([], [], []), now_index=(1, 29))
+    assert not past[0, 0].any() and list(np.nonzero(past[0, 1])[0]) == [29]
+
+
+def test_free_slots_skip_active_appointments_only(app, seed):
+    with app.app_context():
+        doc, day = seed.doctor_ids[0], seed.tomorrow
+        add_appointment(doc, seed.patient_ids[0], day, time(9))
+        add_appointment(doc, seed.patient_ids[1], day, time(9, 30), status='Cancelled')
+        now = datetime.combine(seed.today, time(0))
+        free = slots.free_slots([doc], day, day, now=now)[doc]
+        assert free == [(day, time(9, 30)), (day, time(10)), (day, time(10, 30)), (day, time(11)), (day, time(11, 30))]
+        assert slots.is_free(doc, day, time(9, 30), now=now) and not slots.is_free(doc, day, time(9), now=now)
+        assert slots.free_slots([], day, day) == {}
+
+
+def test_slots_api(app, seed, patient):
+    body = patient.get(f'/api/slots?doctor_id={seed.doctor_ids[0]}&start={seed.tomorrow}&end={seed.tomorrow}').get_json()
+    assert body['doctors'][str(seed.doctor_ids[0])][seed.tomorrow.isoformat()][0] == '09:00'
+    assert patient.get('/api/slots').status_code == 400
+    assert patient.get(f'/api/slots?doctor_id=x').status_code == 400
+
+
+def test_earliest_available_across_doctors(app, seed):
+    with app.app_context():
+        now = datetime.combine(seed.today, time(23, 59))
+        add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.tomorrow, time(9))
+        rows = slots.earliest_available(specialization='cardio', limit=3, now=now)
+        assert [(r['doctor_id'], r['time']) for r in rows] == [
+            (seed.doctor_ids[2], '09:00'), (seed.doctor_ids[0], '09:30'), (seed.doctor_ids[2], '09:30')]
+        assert slots.earliest_available(specialization='dermatology') == []
+
+
+def test_ranges_are_bounded_for_every_caller(app, seed):
+    with app.app_context():
+        far = seed.today + timedelta(days=slots.SLOTS_MAX_DAYS)
+        with pytest.raises(ValueError):
+            slots.earliest_available(specialization='card', end=datetime(9999, 12, 31).date())
+        with pytest.raises(ValueError):
+            slots.free_slots(seed.doctor_ids, seed.today, far)
+        with pytest.raises(ValueError):
+            slots.free_slots(seed.doctor_ids, seed.tomorrow, seed.today)
+
+
+def test_earliest_api_range_checks(client, seed):
+    url = '/api/slots/earliest?specialization=Card'
+    assert client.get(url).status_code == 200
+    assert client.get(url + '&end=9999-12-31').status_code == 400      # end only, after the default start
+    assert client.get(url + '&start=2030-01-10&end=2030-01-01').status_code == 400
+    assert client.get(url + '&start=2030-01-01').status_code == 200     # end defaults inside the limit
+    assert client.get('/api/slots/earliest').status_code == 400
+
+
+def test_slots_api_end_only(patient, seed):
+    assert patient.get(f'/api/slots?doctor_id={seed.doctor_ids[0]}&end=9999-12-31').status_code == 400
@@ -0,0 +1,78 @@
+from datetime import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import db, stats, conditional
+from app.models import Appointment, Department
+
+from .conftest import add_appointment
+
+
+def test_cached_totals_follow_commits(app, seed):
+    with app.app_context():
+        before = stats.get_stats()
+        assert before['doctors'] == 3 and before['patients'] == 3 and before['appointments'] == 0
+
+        appt_id = add_appointment(seed.doctor_ids[0], seed.patient_ids[0], seed.today, time(9))
+        appt = db.session.get(Appointment, appt_id)
+        appt.status = 'Cancelled'
+        db.session.commit()
+        after = stats.get_stats()
+        assert (after['appointments'], after['Booked'], after['Cancelled']) == (1, 0, 1)
+        assert after == stats.compute_stats()
+
+
+def test_rolled_back_changes_are_not_counted(app, seed):
+    with app.app_context():
+        before = stats.get_stats()
+        db.session.add(Department(name='Oncology'))
+        db.session.flush()
+        db.session.rollback()
+        assert stats.get_stats() == before == stats.compute_stats()
+
+
+def test_admin_dashboard_uses_the_cache(app, seed, admin):
+    r = admin.get('/admin')
+    assert r.status_code == 200
+    with app.app_context():
+        assert stats._cache['values'] is not None
+
+
+def test_invalidation_is_shared_through_the_database(app, seed):
+    with app.app_context():
+        before = stats.get_stats()
+        db.session.execute(insert(Department), [{'name': 'Oncology'}])  # Core: no events
+        db.session.commit()
+        assert stats.get_stats() == before
+        with db.engine.begin() as conn:  # what invalidate() in another process does
+            conditional.bump(conn, [stats.VERSION_KEY])
+        assert stats.get_stats()['departments'] == before['departments'] + 1
+
+
+def test_snapshot_taken_during_a_commit_is_not_cached(app, seed, monkeypatch):
+    with app.app_context():
+        before = stats.get_stats()
+        compute = stats.compute_stats
+
+        def compute_then_commit():
+            values = compute()
+            with Session(db.engine) as other:  # another request committing meanwhile
+                other.add(Department(name='Oncology'))
+                other.commit()
+            return values
+
+        monkeypatch.setattr(stats, 'compute_stats', compute_then_commit)
+        stats.recompute()
+        monkeypatch.setattr(stats, 'compute_stats', compute)
+        assert stats.get_stats()['departments'] == before['departments'] + 1
+
+
+def test_recompute_with_uncommitted_changes_does_not_double_count(app, seed):
+    with app.app_context():
+        before = stats.get_stats()
+        db.session.add(Department(name='Oncology'))
+        db.session.flush()
+        stats.recompute()  # this session's SELECT already sees the new row
+        db.session.commit()
+        assert stats.get_stats()['departments'] == before['departments'] + 1
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.storage import (sqlite_pragmas, database_url, pool_options, read_session, READONLY_BIND,
+                         _pragma_listener)
+
+
+def test_pragmas_profile_and_overrides():
+    assert sqlite_pragmas({})['journal_mode'] == 'WAL'
+    assert sqlite_pragmas({'STORAGE_PROFILE': 'default'})['journal_mode'] is None
+    assert sqlite_pragmas({'SQLITE_BUSY_TIMEOUT_MS': '100'})['busy_timeout'] == '100'
+    with pytest.raises(ValueError):
+        sqlite_pragmas({'STORAGE_PROFILE': 'fast'})
+
+
+def test_pragmas_are_applied_per_connection(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+
+def test_invalid_pragma_value_is_rejected():
+    import sqlite3
+    listener = _pragma_listener({'journal_mode': 'WAL; DROP TABLE user'}, readonly=False)
+    with pytest.raises(ValueError):
+        listener(sqlite3.connect(':memory:'), None)
+
+
+def test_read_session_is_read_only(app, seed):
+    with app.app_context():
+        assert READONLY_BIND in app.config['SQLALCHEMY_BINDS']
+        sess = read_session()
+        assert sess.execute(text('SELECT count(*) FROM user')).scalar() > 0
+        with pytest.raises(OperationalError):
+            sess.execute(text("UPDATE user SET name = 'x'"))
+
+
+def test_database_url_from_environment():
+    assert database_url({'DATABASE_URL': 'postgres://u@h/db'}) == 'postgresql://u@h/db'
+    assert database_url({}).startswith('sqlite:///')
+    url = database_url({'DATABASE_BACKEND': 'postgresql', 'PGUSER': 'hms', 'PGPASSWORD': 'p@ss',
+                        'PGHOST': 'db', 'PGDATABASE': 'hms'})
+    assert url == 'postgresql://hms:p%40ss@db:5432/hms'
+    with pytest.raises(ValueError):
+        database_url({'DATABASE_BACKEND': 'oracle'})
+
+
+def test_pool_options_from_environment():
+    opts = pool_options({'DB_POOL_SIZE': '3', 'DB_POOL_PRE_PING': 'off'})
+    assert opts['pool_size'] == 3 and opts['pool_pre_ping'] is False and opts['max_overflow'] == 20
+
+
+def test_configured_uri_wins_over_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://u@nowhere/db')
+    monkeypatch.setenv('DATABASE_READ_URL', 'postgresql://u@replica/db')
+    uri = f"sqlite:///{tmp_path / 'own.db'}"
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': uri})
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == uri
+    assert app.config['SQLALCHEMY_BINDS'] == {READONLY_BIND: uri}
+    with app.app_context():
+        db.engine.dispose()